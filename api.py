@@ -21,8 +21,12 @@ from src.queue.worker import handle_merge_request_event, handle_push_event, hand
 from src.service.review_service import ReviewService
 from src.utils.messaging import notifier
 from src.utils.log import logger
-from src.utils.queue import handle_queue
+from src.utils.queue import handle_queue, replay_pending_jobs, start_worker_pool
+from src.utils.dedup import get_delivery_id
+from src.utils.error import QueueFullError
 from src.utils.reporter import Reporter
+from src.utils.review_cache import ReviewCache
+from src.llm.metrics import llm_metrics
 from src.service.report_service import ReportService
 
 from src.utils.config_checker import check_config
@@ -33,6 +37,16 @@ api_app = Flask(__name__, static_folder='web', static_url_path='')
 push_review_enabled = os.environ.get('PUSH_REVIEW_ENABLED', '0') == '1'
 
 
+@api_app.errorhandler(QueueFullError)
+def handle_queue_full(e: QueueFullError):
+    # 队列饱和时返回 503，并通过 Retry-After 提示 Git 平台稍后重试
+    logger.warn(f'Webhook rejected: {e}')
+    response = jsonify({'message': e.message})
+    response.status_code = 503
+    response.headers['Retry-After'] = os.getenv('QUEUE_RETRY_AFTER', '60')
+    return response
+
+
 @api_app.route('/')
 def home():
     return "<h2>The server is running.</h2>"
@@ -198,6 +212,26 @@ def get_review_stats():
         return jsonify({'error': str(e)}), 500
 
 
+@api_app.route('/api/review/cache_stats', methods=['GET'])
+def get_review_cache_stats():
+    """获取审查结果缓存的命中统计"""
+    try:
+        return jsonify(ReviewCache().stats())
+    except Exception as e:
+        logger.error(f"Failed to get review cache stats: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@api_app.route('/api/llm/stats', methods=['GET'])
+def get_llm_stats():
+    """获取各 LLM 供应商的调用统计：平均首 token 延迟、输出速度、提示词缓存命中率和健康状态"""
+    try:
+        return jsonify(llm_metrics.snapshot())
+    except Exception as e:
+        logger.error(f"Failed to get LLM stats: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
 @api_app.route('/review/daily_report', methods=['GET'])
 def daily_report():
     # 获取当前日期0点和23点59分59秒的时间戳（转换为整数）
@@ -314,6 +348,11 @@ def handle_webhook():
         return handle_gitlab_webhook(data)
 
 
+def duplicate_delivery_response():
+    # 重复投递（平台重试或同一 head SHA 的重复事件）直接返回成功，避免平台继续重试
+    return jsonify({'message': 'Duplicate webhook delivery, ignored.'}), 200
+
+
 def handle_github_webhook(event_type, data):
     # 获取GitHub配置
     github_token = os.getenv('GITHUB_ACCESS_TOKEN') or request.headers.get('X-GitHub-Token')
@@ -329,13 +368,17 @@ def handle_github_webhook(event_type, data):
 
     if event_type == "pull_request":
         # 使用handle_queue进行异步处理
-        handle_queue(handle_github_pull_request_event, data, github_token, github_url, github_url_slug)
+        if not handle_queue(handle_github_pull_request_event, data, github_token, github_url, github_url_slug,
+                            delivery_id=get_delivery_id(request.headers)):
+            return duplicate_delivery_response()
         # 立马返回响应
         return jsonify(
             {'message': f'GitHub request received(event_type={event_type}), will process asynchronously.'}), 200
     elif event_type == "push":
         # 使用handle_queue进行异步处理
-        handle_queue(handle_github_push_event, data, github_token, github_url, github_url_slug)
+        if not handle_queue(handle_github_push_event, data, github_token, github_url, github_url_slug,
+                            delivery_id=get_delivery_id(request.headers)):
+            return duplicate_delivery_response()
         # 立马返回响应
         return jsonify(
             {'message': f'GitHub request received(event_type={event_type}), will process asynchronously.'}), 200
@@ -378,14 +421,18 @@ def handle_gitlab_webhook(data):
     # 处理Merge Request Hook
     if object_kind == "merge_request":
         # 创建一个新进程进行异步处理
-        handle_queue(handle_merge_request_event, data, gitlab_token, gitlab_url, gitlab_url_slug)
+        if not handle_queue(handle_merge_request_event, data, gitlab_token, gitlab_url, gitlab_url_slug,
+                            delivery_id=get_delivery_id(request.headers)):
+            return duplicate_delivery_response()
         # 立马返回响应
         return jsonify(
             {'message': f'Request received(object_kind={object_kind}), will process asynchronously.'}), 200
     elif object_kind == "push":
         # 创建一个新进程进行异步处理
         # TODO check if PUSH_REVIEW_ENABLED is needed here
-        handle_queue(handle_push_event, data, gitlab_token, gitlab_url, gitlab_url_slug)
+        if not handle_queue(handle_push_event, data, gitlab_token, gitlab_url, gitlab_url_slug,
+                            delivery_id=get_delivery_id(request.headers)):
+            return duplicate_delivery_response()
         # 立马返回响应
         return jsonify(
             {'message': f'Request received(object_kind={object_kind}), will process asynchronously.'}), 200
@@ -438,7 +485,9 @@ def handle_gitea_webhook(event_type, data):
 
     # Push 事件优先级更高，先处理 Push
     if event_type == "push":
-        handle_queue(handle_gitea_push_event, data, gitea_token, gitea_url, gitea_url_slug)
+        if not handle_queue(handle_gitea_push_event, data, gitea_token, gitea_url, gitea_url_slug,
+                            delivery_id=get_delivery_id(request.headers)):
+            return duplicate_delivery_response()
         return jsonify(
             {'message': f'Gitea request received(event_type={event_type}), will process asynchronously.'}), 200
     elif event_type == "pull_request":
@@ -449,7 +498,9 @@ def handle_gitea_webhook(event_type, data):
             logger.info(f"Gitea Pull Request event, action={action}, ignored.")
             return jsonify(
                 {'message': f'Gitea Pull Request event with action={action} is ignored, only opened and synchronize are supported.'}), 200
-        handle_queue(handle_gitea_pull_request_event, data, gitea_token, gitea_url, gitea_url_slug)
+        if not handle_queue(handle_gitea_pull_request_event, data, gitea_token, gitea_url, gitea_url_slug,
+                            delivery_id=get_delivery_id(request.headers)):
+            return duplicate_delivery_response()
         return jsonify(
             {'message': f'Gitea request received(event_type={event_type}), will process asynchronously.'}), 200
     elif event_type == "issue_comment":
@@ -475,9 +526,13 @@ if __name__ == '__main__':
         missing = ConfigValidator.get_missing_configs(git_service_type)
         logger.warning(f"配置验证未通过，缺失项: {', '.join(missing)}")
     
+    # 在配置检查（LLM 事件循环线程）、调度器和 Flask 线程启动之前创建工作进程池
+    start_worker_pool()
     check_config()
     # 启动定时任务调度器
     setup_scheduler()
+    # 重放上次退出时未完成的审查任务
+    replay_pending_jobs()
 
     # 启动Flask API服务
     port = int(os.environ.get('SERVER_PORT', 5001))
@@ -6,6 +6,7 @@ import fnmatch
 import requests
 
 from biz.utils.log import logger
+from src.utils.diff_parser import split_diff_by_file
 
 
 def filter_changes(changes: list):
@@ -311,45 +312,14 @@ class PushHandler:
     
     def _extract_file_diff_from_full_diff(self, full_diff: str, filename: str) -> str:
         """
-        从完整的 diff 文本中提取特定文件的 diff
+        从完整的 diff 文本中提取特定文件的 diff（按文件头中的完整路径匹配）
         """
-        try:
-            lines = full_diff.split('\n')
-            file_diff_lines = []
-            in_target_file = False
-            
-            logger.debug(f"Extracting diff for {filename} from full diff ({len(lines)} lines)")
-            
-            for i, line in enumerate(lines):
-                # 检查是否是目标文件的 diff 开始
-                # diff --git a/path/to/file b/path/to/file
-                if line.startswith('diff --git'):
-                    # 检查是否包含目标文件名（支持 a/ 和 b/ 前缀）
-                    # 例如：diff --git a/2.js b/2.js 或 diff --git a/src/2.js b/src/2.js
-                    if f"a/{filename}" in line or f"b/{filename}" in line or f"/{filename}" in line:
-                        in_target_file = True
-                        file_diff_lines.append(line)
-                        logger.debug(f"Found diff start for {filename} at line {i}: {line[:100]}")
-                    elif in_target_file:
-                        # 如果已经在目标文件中，遇到下一个文件的 diff 开始，停止
-                        logger.debug(f"Found next file diff at line {i}, stopping extraction")
-                        break
-                elif in_target_file:
-                    # 收集目标文件的所有 diff 行
-                    file_diff_lines.append(line)
-            
-            if file_diff_lines:
-                result = '\n'.join(file_diff_lines)
-                logger.debug(f"Extracted {len(file_diff_lines)} lines for {filename}, total length: {len(result)}")
-                return result
-            else:
-                logger.warn(f"No diff lines extracted for {filename} from full diff")
-        except Exception as e:
-            logger.error(f"Failed to extract file diff for {filename}: {str(e)}")
-            import traceback
-            logger.debug(traceback.format_exc())
-        return ""
-    
+        file_diff = split_diff_by_file(full_diff).get(filename)
+        if file_diff is None:
+            logger.warn(f"No diff lines extracted for {filename} from full diff")
+            return ""
+        return file_diff.diff
+
     def _get_file_content(self, filename: str, commit_sha: str) -> str:
         """
         获取文件在特定提交中的内容
@@ -1123,34 +1093,13 @@ class PullRequestHandler:
 
     def _extract_file_diff_from_full_diff(self, full_diff: str, filename: str) -> str:
         """
-        从完整的 diff 文本中提取特定文件的 diff
+        从完整的 diff 文本中提取特定文件的 diff（按文件头中的完整路径匹配）
         """
-        try:
-            lines = full_diff.split('\n')
-            file_diff_lines = []
-            in_target_file = False
-            
-            for i, line in enumerate(lines):
-                # 检查是否是目标文件的 diff 开始
-                if line.startswith('diff --git'):
-                    # 检查是否包含目标文件名
-                    if f"a/{filename}" in line or f"b/{filename}" in line or f"/{filename}" in line:
-                        in_target_file = True
-                        file_diff_lines.append(line)
-                    elif in_target_file:
-                        # 如果已经在目标文件中，遇到下一个文件的 diff 开始，停止
-                        break
-                elif in_target_file:
-                    # 收集目标文件的所有 diff 行
-                    file_diff_lines.append(line)
-            
-            if file_diff_lines:
-                result = '\n'.join(file_diff_lines)
-                logger.debug(f"Extracted {len(file_diff_lines)} lines for {filename}")
-                return result
-        except Exception as e:
-            logger.error(f"Failed to extract file diff for {filename}: {str(e)}")
-        return ""
+        file_diff = split_diff_by_file(full_diff).get(filename)
+        if file_diff is None:
+            logger.warn(f"No diff lines extracted for {filename} from full diff")
+            return ""
+        return file_diff.diff
 
     def get_pull_request_commits(self) -> list:
         # 检查是否为 Pull Request Hook 事件
@@ -4,7 +4,8 @@ from abc import abstractmethod
 from typing import List, Dict, Any
 
 from src.llm.factory import Factory
-from src.utils.token_util import count_tokens, truncate_text_by_tokens
+from src.llm.output import normalize_output
+from src.utils.token_util import count_and_truncate
 
 
 class BaseReviewFunc(abc.ABC):
@@ -59,7 +60,7 @@ class LLMReviewFunc(BaseReviewFunc):
     DEFAULT_REVIEW_MAX_TOKENS = 800000
 
     def __init__(self):
-        self.client = Factory().getClient()
+        self.client = Factory.getClient()
         self.review_max_tokens = int(os.getenv('REVIEW_MAX_TOKENS', self.DEFAULT_REVIEW_MAX_TOKENS))
 
     def call_llm(self, messages: List[Dict[str, Any]]) -> str:
@@ -75,15 +76,10 @@ class LLMReviewFunc(BaseReviewFunc):
             return '内容为空，无法进行评审。'
 
         # 计算tokens数量，如果超过REVIEW_MAX_TOKENS，截断changes_text
-        tokens_count = count_tokens(text)
-        if tokens_count > self.review_max_tokens:
-            text = truncate_text_by_tokens(text, self.review_max_tokens)
+        text = count_and_truncate(text, self.review_max_tokens)[1]
 
         messages = self.get_prompts(text)
-        review_result = self.call_llm(messages).strip()
-        if review_result.startswith("```markdown") and review_result.endswith("```"):
-            return review_result[11:-3].strip()
-        return review_result
+        return normalize_output(self.call_llm(messages).strip())
 
     @abstractmethod
     def get_prompts(self, text: str) -> List[Dict[str, Any]]:
@@ -1,7 +1,7 @@
 class MergeRequestReviewEntity:
     def __init__(self, project_name: str, author: str, source_branch: str, target_branch: str, updated_at: int,
                  commits: list, score: float, url: str, review_result: str, url_slug: str, webhook_data: dict,
-                 additions: int, deletions: int):
+                 additions: int, deletions: int, dimension_scores: dict = None, issues: list = None):
         self.project_name = project_name
         self.author = author
         self.source_branch = source_branch
@@ -15,6 +15,9 @@ class MergeRequestReviewEntity:
         self.webhook_data = webhook_data
         self.additions = additions
         self.deletions = deletions
+        # 结构化审查结果：各维度得分和问题列表
+        self.dimension_scores = dimension_scores or {}
+        self.issues = issues or []
 
     @property
     def commit_messages(self):
@@ -24,7 +27,8 @@ class MergeRequestReviewEntity:
 
 class PushReviewEntity:
     def __init__(self, project_name: str, author: str, branch: str, updated_at: int, commits: list, score: float,
-                 review_result: str, url_slug: str, webhook_data: dict, additions: int, deletions: int):
+                 review_result: str, url_slug: str, webhook_data: dict, additions: int, deletions: int,
+                 dimension_scores: dict = None, issues: list = None):
         self.project_name = project_name
         self.author = author
         self.branch = branch
@@ -36,6 +40,9 @@ class PushReviewEntity:
         self.webhook_data = webhook_data
         self.additions = additions
         self.deletions = deletions
+        # 结构化审查结果：各维度得分和问题列表
+        self.dimension_scores = dimension_scores or {}
+        self.issues = issues or []
 
     @property
     def commit_messages(self):
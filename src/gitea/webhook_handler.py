@@ -1,11 +1,13 @@
 import os
-import re
 import time
 from urllib.parse import urljoin
 import fnmatch
 import requests
 
+from src.utils.diff_parser import split_diff_by_file, parse_file_diff
+from src.utils.http_session import http_get, http_get_all_pages, http_post
 from src.utils.log import logger
+from src.utils.token_util import count_tokens
 
 
 def filter_changes(changes: list):
@@ -39,20 +41,33 @@ def filter_changes(changes: list):
         # 如果没有提供，尝试从 diff 中计算
         diff_content = item.get('diff', '')
         if additions == 0 and deletions == 0 and diff_content:
-            additions = len(re.findall(r'^\+(?!\+\+)', diff_content, re.MULTILINE))
-            deletions = len(re.findall(r'^-(?!--)', diff_content, re.MULTILINE))
+            file_diff = parse_file_diff(diff_content)
+            additions, deletions = file_diff.additions, file_diff.deletions
         
         filtered_changes.append({
             'diff': diff_content,
             'new_path': new_path,
             'additions': additions,
-            'deletions': deletions
+            'deletions': deletions,
+            # 每个文件的 token 数只计算一次，供审查预算、分片和降级策略直接使用
+            'tokens': count_tokens(diff_content),
         })
     
     logger.debug(f"filter_changes: filtered {len(filtered_changes)} files from {len(changes)} changes")
     return filtered_changes
 
 
+
+def _find_file_patch(files: list, filename: str) -> str:
+    """在 Gitea 返回的文件列表中查找指定文件的 patch"""
+    for file in files or []:
+        if file.get('filename') == filename:
+            patch = file.get('patch', '') or file.get('diff', '')
+            if patch:
+                return patch
+    return ''
+
+
 class PushHandler:
     def __init__(self, webhook_data: dict, gitea_token: str, gitea_url: str):
         self.webhook_data = webhook_data
@@ -62,6 +77,9 @@ class PushHandler:
         self.repo_full_name = None
         self.branch_name = None
         self.commit_list = []
+        # 同一次推送中各文件共享的请求结果：提交的完整 diff（按 commit_sha）和 JSON 响应（按 API 路径）
+        self._commit_diffs = {}
+        self._api_json = {}
         self.parse_event_type()
 
     def parse_event_type(self):
@@ -142,7 +160,7 @@ class PushHandler:
         
         for url_path in possible_urls:
             url = urljoin(f"{self.gitea_url}/", url_path)
-            response = requests.post(url, headers=headers, json=data, verify=False)
+            response = http_post(url, headers=headers, json=data, verify=False)
             logger.debug(f"Add comment to commit {last_commit_id} (trying {url_path}): {response.status_code}, {response.text[:200] if response.text else 'No response'}")
             if response.status_code == 201:
                 logger.info("Comment successfully added to push commit.")
@@ -167,130 +185,118 @@ class PushHandler:
                    f"Gitea may not support commit comments in this version. "
                    f"Review results will still be saved to database and sent via IM notification.")
 
-    def _get_file_diff(self, filename: str, commit_sha: str, parent_sha: str = None) -> str:
+    def _get_commit_diff(self, commit_sha: str) -> dict:
         """
-        获取特定文件在某个提交中的 diff
-        Gitea 的 compare API 可能不返回 patch，需要单独获取
-        :param filename: 文件名
-        :param commit_sha: 当前提交 SHA
-        :param parent_sha: 父提交 SHA（可选，如果不提供会尝试获取）
+        流式下载提交的完整 diff 并按文件拆分，返回 {文件路径: FileDiff}，获取失败时为空字典。
+        结果按 commit_sha 缓存（包括获取失败的情况），同一次推送的所有文件共享，不再为每个文件重复下载和扫描完整 diff。
         """
-        try:
-            logger.debug(f"_get_file_diff called for {filename}, commit_sha={commit_sha}, parent_sha={parent_sha}")
-            
-            # 方法1: 优先尝试使用 commit diff API（最直接、最可靠的方法，不需要 parent_sha）
-            # 注意：Gitea API 可能不支持 .diff 扩展名，需要尝试不同的格式
-            # 尝试格式1: GET /api/v1/repos/{owner}/{repo}/git/commits/{sha}.diff
-            url = urljoin(f"{self.gitea_url}/", f"api/v1/repos/{self.repo_full_name}/git/commits/{commit_sha}.diff")
-            headers = {
-                'Authorization': f'token {self.gitea_token}'
-            }
-            response = requests.get(url, headers=headers, verify=False)
-            logger.debug(f"Getting diff from git/commits/{commit_sha}.diff API: {response.status_code}, URL: {url}")
-            
-            # 如果 .diff 格式失败，尝试使用 Accept header 指定格式
-            if response.status_code != 200:
-                # 尝试格式2: 使用 Accept: text/plain header
-                headers['Accept'] = 'text/plain'
-                response = requests.get(url, headers=headers, verify=False)
-                logger.debug(f"Retrying with Accept: text/plain header: {response.status_code}")
-            
-            # 如果还是失败，尝试格式3: 使用 patch 参数
-            if response.status_code != 200:
-                url = urljoin(f"{self.gitea_url}/", f"api/v1/repos/{self.repo_full_name}/git/commits/{commit_sha}")
-                params = {'diff': 'true'}
-                response = requests.get(url, headers=headers, params=params, verify=False)
-                logger.debug(f"Trying with diff=true parameter: {response.status_code}, URL: {url}")
-            
+        if commit_sha in self._commit_diffs:
+            return self._commit_diffs[commit_sha]
+
+        file_diffs = {}
+        # 注意：Gitea API 可能不支持 .diff 扩展名，需要尝试不同的格式
+        # 尝试格式1: GET /api/v1/repos/{owner}/{repo}/git/commits/{sha}.diff
+        url = urljoin(f"{self.gitea_url}/", f"api/v1/repos/{self.repo_full_name}/git/commits/{commit_sha}.diff")
+        headers = {
+            'Authorization': f'token {self.gitea_token}'
+        }
+        response = http_get(url, headers=headers, verify=False, stream=True)
+        logger.debug(f"Getting diff from git/commits/{commit_sha}.diff API: {response.status_code}, URL: {url}")
+
+        # 如果 .diff 格式失败，尝试使用 Accept header 指定格式
+        if response.status_code != 200:
+            response.close()
+            # 尝试格式2: 使用 Accept: text/plain header
+            headers['Accept'] = 'text/plain'
+            response = http_get(url, headers=headers, verify=False, stream=True)
+            logger.debug(f"Retrying with Accept: text/plain header: {response.status_code}")
+
+        # 如果还是失败，尝试格式3: 使用 patch 参数
+        if response.status_code != 200:
+            response.close()
+            url = urljoin(f"{self.gitea_url}/", f"api/v1/repos/{self.repo_full_name}/git/commits/{commit_sha}")
+            params = {'diff': 'true'}
+            response = http_get(url, headers=headers, params=params, verify=False, stream=True)
+            logger.debug(f"Trying with diff=true parameter: {response.status_code}, URL: {url}")
+
+        with response:
             if response.status_code == 200:
-                # diff API 返回的是纯文本 diff 格式
-                diff_text = response.text
-                logger.debug(f"Got diff text from commit diff API, length: {len(diff_text)}, first 500 chars: {diff_text[:500] if diff_text else 'empty'}")
-                if diff_text and not diff_text.strip().startswith('{'):
-                    # 确保不是 JSON 错误响应
-                    # 从完整的 diff 中提取特定文件的部分
-                    file_diff = self._extract_file_diff_from_full_diff(diff_text, filename)
-                    if file_diff:
-                        logger.info(f"✅ Extracted diff for {filename} from commit diff API, length: {len(file_diff)}")
-                        return file_diff
-                    else:
-                        logger.warn(f"Could not extract diff for {filename} from full diff (diff text exists but extraction failed)")
-                        # 如果提取失败，尝试直接返回完整 diff（如果只有一个文件或 diff 不太大）
-                        if len(diff_text) < 50000:  # 如果 diff 不太大，直接返回
-                            logger.debug(f"Returning full diff as fallback for {filename} (extraction failed)")
-                            return diff_text
+                # diff API 返回的是纯文本 diff 格式，边下载边解析；JSON 错误响应中没有文件头，解析结果为空
+                file_diffs = split_diff_by_file(response.iter_content(chunk_size=65536))
+                if file_diffs:
+                    logger.debug(f"Got diff for commit {commit_sha}, files: {len(file_diffs)}")
                 else:
                     logger.warn(f"Diff API returned empty or invalid text for commit {commit_sha}")
             elif response.status_code == 404:
                 logger.warn(f"Commit diff API returned 404 for {commit_sha}, API endpoint may not exist or commit not found")
             else:
                 logger.warn(f"Commit diff API returned {response.status_code} for {commit_sha}: {response.text[:200] if response.text else 'No response'}")
-            
+
+        self._commit_diffs[commit_sha] = file_diffs
+        return file_diffs
+
+    def _get_api_json(self, path: str):
+        """
+        请求 Gitea API 并解析 JSON，结果按 API 路径缓存（非 200 响应缓存为 None），
+        避免为每个文件重复获取相同的提交和比较数据
+        """
+        if path not in self._api_json:
+            url = urljoin(f"{self.gitea_url}/", f"api/v1/repos/{self.repo_full_name}/{path}")
+            headers = {
+                'Authorization': f'token {self.gitea_token}'
+            }
+            response = http_get(url, headers=headers, verify=False)
+            logger.debug(f"Getting {path} from Gitea API: {response.status_code}, URL: {url}")
+            self._api_json[path] = response.json() if response.status_code == 200 else None
+        return self._api_json[path]
+
+    def _get_file_diff(self, filename: str, commit_sha: str, parent_sha: str = None) -> str:
+        """
+        获取特定文件在某个提交中的 diff
+        Gitea 的 compare API 可能不返回 patch，需要单独获取；完整 diff 和 API 响应在同一次推送的文件间共享
+        :param filename: 文件名
+        :param commit_sha: 当前提交 SHA
+        :param parent_sha: 父提交 SHA（可选，如果不提供会尝试获取）
+        """
+        try:
+            logger.debug(f"_get_file_diff called for {filename}, commit_sha={commit_sha}, parent_sha={parent_sha}")
+
+            # 方法1: 优先使用提交的完整 diff（最直接、最可靠的方法，不需要 parent_sha）
+            file_diffs = self._get_commit_diff(commit_sha)
+            if filename in file_diffs:
+                file_diff = file_diffs[filename].diff
+                logger.debug(f"Extracted diff for {filename} from commit diff API, length: {len(file_diff)}")
+                return file_diff
+            if file_diffs:
+                logger.warn(f"Could not extract diff for {filename} from full diff (diff text exists but extraction failed)")
+                # 如果提取失败，尝试直接返回完整 diff（如果只有一个文件或 diff 不太大）
+                diff_text = '\n'.join({id(file_diff): file_diff.diff for file_diff in file_diffs.values()}.values())
+                if len(diff_text) < 50000:
+                    logger.debug(f"Returning full diff as fallback for {filename} (extraction failed)")
+                    return diff_text
+
             # 方法2: 如果 commit diff API 失败，尝试使用 compare API（需要 parent_sha）
             # 如果没有提供 parent_sha，尝试获取
             if not parent_sha:
-                logger.debug(f"No parent_sha provided, trying to get it for commit {commit_sha}")
                 parent_sha = self.get_parent_commit_id(commit_sha)
                 logger.debug(f"Got parent_sha: {parent_sha}")
-            
+
             if parent_sha:
-                logger.debug(f"Trying compare API with parent_sha={parent_sha} to get diff for {filename}")
-                url = urljoin(f"{self.gitea_url}/", f"api/v1/repos/{self.repo_full_name}/compare/{parent_sha}...{commit_sha}")
-                headers = {
-                    'Authorization': f'token {self.gitea_token}'
-                }
-                response = requests.get(url, headers=headers, verify=False)
-                logger.debug(f"Getting diff from compare API: {response.status_code}, URL: {url}")
-                if response.status_code == 200:
-                    compare_data = response.json()
-                    # 检查是否有完整的 diff 信息
-                    commits = compare_data.get('commits', [])
-                    if commits:
-                        for commit in commits:
-                            commit_files = commit.get('files', [])
-                            for file in commit_files:
-                                if file.get('filename') == filename:
-                                    patch = file.get('patch', '') or file.get('diff', '')
-                                    if patch:
-                                        logger.debug(f"Got patch for {filename} from compare API, length: {len(patch)}")
-                                        return patch
-            
-            # 方法2: 尝试从 commit 的详细信息中获取（使用 git/commits API）
-            url = urljoin(f"{self.gitea_url}/", f"api/v1/repos/{self.repo_full_name}/git/commits/{commit_sha}")
-            headers = {
-                'Authorization': f'token {self.gitea_token}'
-            }
-            response = requests.get(url, headers=headers, verify=False)
-            logger.debug(f"Getting file diff for {filename} from git/commits API: {response.status_code}")
-            if response.status_code == 200:
-                commit_data = response.json()
-                # 查找文件
-                files = commit_data.get('files', [])
-                logger.debug(f"Found {len(files)} files in git/commits response, checking for patch field")
-                for file in files:
-                    if file.get('filename') == filename:
-                        patch = file.get('patch', '') or file.get('diff', '')
-                        if patch:
-                            logger.debug(f"Got patch for {filename} from git/commits API, length: {len(patch)}")
-                            return patch
-                        else:
-                            logger.debug(f"No patch field in file object, file keys: {list(file.keys())}")
-            
-            # 方法3: 尝试使用 commits API（不是 git/commits）
-            url = urljoin(f"{self.gitea_url}/", f"api/v1/repos/{self.repo_full_name}/commits/{commit_sha}")
-            response = requests.get(url, headers=headers, verify=False)
-            logger.debug(f"Getting file diff for {filename} from commits API: {response.status_code}")
-            if response.status_code == 200:
-                commit_data = response.json()
-                files = commit_data.get('files', [])
-                logger.debug(f"Found {len(files)} files in commits response")
-                for file in files:
-                    if file.get('filename') == filename:
-                        patch = file.get('patch', '') or file.get('diff', '')
-                        if patch:
-                            logger.debug(f"Got patch for {filename} from commits API, length: {len(patch)}")
-                            return patch
-            
+                compare_data = self._get_api_json(f"compare/{parent_sha}...{commit_sha}")
+                for commit in (compare_data or {}).get('commits', []):
+                    patch = _find_file_patch(commit.get('files'), filename)
+                    if patch:
+                        logger.debug(f"Got patch for {filename} from compare API, length: {len(patch)}")
+                        return patch
+
+            # 方法3: 尝试从 commit 的详细信息中获取（先 git/commits API，再 commits API）
+            for path in (f"git/commits/{commit_sha}", f"commits/{commit_sha}"):
+                commit_data = self._get_api_json(path)
+                patch = _find_file_patch((commit_data or {}).get('files'), filename)
+                if patch:
+                    logger.debug(f"Got patch for {filename} from {path} API, length: {len(patch)}")
+                    return patch
+
             # 方法4: 尝试获取文件的原始内容并生成 diff
             logger.debug(f"Trying to get file content directly for {filename}")
             if parent_sha:
@@ -304,55 +310,14 @@ class PushHandler:
                     if diff:
                         logger.debug(f"Generated diff for {filename} from file contents, length: {len(diff)}")
                         return diff
-            
+
             logger.debug(f"Could not get patch from commit API for {filename} in commit {commit_sha}")
         except Exception as e:
             logger.error(f"Failed to get file diff for {filename}: {str(e)}")
             import traceback
             logger.debug(traceback.format_exc())
         return ""
-    
-    def _extract_file_diff_from_full_diff(self, full_diff: str, filename: str) -> str:
-        """
-        从完整的 diff 文本中提取特定文件的 diff
-        """
-        try:
-            lines = full_diff.split('\n')
-            file_diff_lines = []
-            in_target_file = False
-            
-            logger.debug(f"Extracting diff for {filename} from full diff ({len(lines)} lines)")
-            
-            for i, line in enumerate(lines):
-                # 检查是否是目标文件的 diff 开始
-                # diff --git a/path/to/file b/path/to/file
-                if line.startswith('diff --git'):
-                    # 检查是否包含目标文件名（支持 a/ 和 b/ 前缀）
-                    # 例如：diff --git a/2.js b/2.js 或 diff --git a/src/2.js b/src/2.js
-                    if f"a/{filename}" in line or f"b/{filename}" in line or f"/{filename}" in line:
-                        in_target_file = True
-                        file_diff_lines.append(line)
-                        logger.debug(f"Found diff start for {filename} at line {i}: {line[:100]}")
-                    elif in_target_file:
-                        # 如果已经在目标文件中，遇到下一个文件的 diff 开始，停止
-                        logger.debug(f"Found next file diff at line {i}, stopping extraction")
-                        break
-                elif in_target_file:
-                    # 收集目标文件的所有 diff 行
-                    file_diff_lines.append(line)
-            
-            if file_diff_lines:
-                result = '\n'.join(file_diff_lines)
-                logger.debug(f"Extracted {len(file_diff_lines)} lines for {filename}, total length: {len(result)}")
-                return result
-            else:
-                logger.warn(f"No diff lines extracted for {filename} from full diff")
-        except Exception as e:
-            logger.error(f"Failed to extract file diff for {filename}: {str(e)}")
-            import traceback
-            logger.debug(traceback.format_exc())
-        return ""
-    
+
     def _get_file_content(self, filename: str, commit_sha: str) -> str:
         """
         获取文件在特定提交中的内容
@@ -367,7 +332,7 @@ class PushHandler:
                 'Authorization': f'token {self.gitea_token}'
             }
             params = {'ref': commit_sha}
-            response = requests.get(url, headers=headers, params=params, verify=False)
+            response = http_get(url, headers=headers, params=params, verify=False)
             logger.debug(f"Getting file content for {filename} at {commit_sha}: {response.status_code}, URL: {url}")
             
             if response.status_code == 200:
@@ -424,17 +389,9 @@ class PushHandler:
 
     def get_parent_commit_id(self, commit_id: str) -> str:
         # 获取提交的父提交ID
-        # 使用 git/commits API（不是 commits API）
-        url = urljoin(f"{self.gitea_url}/", f"api/v1/repos/{self.repo_full_name}/git/commits/{commit_id}")
-        headers = {
-            'Authorization': f'token {self.gitea_token}'
-        }
-        response = requests.get(url, headers=headers, verify=False)
-        logger.debug(
-            f"Get commit response from Gitea: {response.status_code}, URL: {url}")
-
-        if response.status_code == 200:
-            commit_data = response.json()
+        # 使用 git/commits API（不是 commits API），响应与 _get_file_diff 共享缓存
+        commit_data = self._get_api_json(f"git/commits/{commit_id}")
+        if commit_data is not None:
             parents = commit_data.get('parents', [])
             if parents:
                 parent_sha = parents[0].get('sha', '')
@@ -443,7 +400,7 @@ class PushHandler:
             else:
                 logger.debug("No parents found for commit")
         else:
-            logger.warn(f"Failed to get parent commit: {response.status_code}")
+            logger.warn(f"Failed to get parent commit for {commit_id}")
         return ""
 
     def repository_compare(self, base: str, head: str):
@@ -458,7 +415,7 @@ class PushHandler:
         headers = {
             'Authorization': f'token {self.gitea_token}'
         }
-        response = requests.get(url, headers=headers, verify=False)
+        response = http_get(url, headers=headers, verify=False)
         logger.debug(
             f"Get changes response from Gitea for repository_compare: {response.status_code}, {response.text}, URL: {url}")
 
@@ -643,7 +600,7 @@ class PushHandler:
             logger.info("Trying query parameter format for compare API")
             url = urljoin(f"{self.gitea_url}/", f"api/v1/repos/{self.repo_full_name}/compare")
             params = {'base': base, 'head': head}
-            response = requests.get(url, headers=headers, params=params, verify=False)
+            response = http_get(url, headers=headers, params=params, verify=False)
             logger.debug(
                 f"Get changes response from Gitea (query params): {response.status_code}, {response.text}, URL: {url}")
             if response.status_code == 200:
@@ -826,7 +783,7 @@ class PushHandler:
         logger.info(f"Attempting to add comment to issue #{issue_number} in {self.repo_full_name}")
         
         try:
-            response = requests.post(url, headers=headers, json=data, verify=False, timeout=30)
+            response = http_post(url, headers=headers, json=data, verify=False, timeout=30)
             if response.status_code == 201:
                 logger.info(f"✅ Comment successfully added to issue #{issue_number}")
             else:
@@ -861,7 +818,7 @@ class PushHandler:
         }
         
         try:
-            response = requests.get(url, headers=headers, params=params, verify=False, timeout=30)
+            response = http_get(url, headers=headers, params=params, verify=False, timeout=30)
             if response.status_code == 200:
                 issues = response.json()
                 for issue in issues:
@@ -895,7 +852,7 @@ class PushHandler:
         }
         
         try:
-            response = requests.get(url, headers=headers, verify=False, timeout=30)
+            response = http_get(url, headers=headers, verify=False, timeout=30)
             if response.status_code == 200:
                 labels = response.json()
                 for label in labels:
@@ -958,7 +915,7 @@ class PushHandler:
                     pass
         
         try:
-            response = requests.post(url, headers=headers, json=data, verify=False, timeout=30)
+            response = http_post(url, headers=headers, json=data, verify=False, timeout=30)
             if response.status_code == 201:
                 issue = response.json()
                 issue_number = issue.get('number')
@@ -1022,6 +979,9 @@ class PullRequestHandler:
         self.event_type = None
         self.repo_full_name = None
         self.action = None
+        # 同一个 PR 中各文件共享的请求结果：compare 响应（按 base/head）和提交的完整 diff（按 commit_sha）
+        self._compare_data = {}
+        self._commit_diffs = {}
         self.parse_event_type()
 
     def parse_event_type(self):
@@ -1073,13 +1033,14 @@ class PullRequestHandler:
                 'Authorization': f'token {self.gitea_token}',
                 'Content-Type': 'application/json'
             }
-            response = requests.get(url, headers=headers, verify=False)
+            # Gitea 用 limit 指定每页数量，默认最多 50 条（MAX_RESPONSE_ITEMS）
+            response, files = http_get_all_pages(url, headers=headers, per_page=50, per_page_param='limit', verify=False)
             logger.debug(
-                f"Get changes response from Gitea (attempt {attempt + 1}): {response.status_code}, {response.text}, URL: {url}")
+                f"Get changes response from Gitea (attempt {attempt + 1}): {response.status_code}, "
+                f"files: {len(files) if files is not None else response.text}, URL: {url}")
 
             # 检查请求是否成功
             if response.status_code == 200:
-                files = response.json()
                 if files:
                     # 获取 PR 的 base 和 head 信息用于获取 diff
                     pull_request = self.webhook_data.get('pull_request', {})
@@ -1119,9 +1080,44 @@ class PullRequestHandler:
         logger.warning(f"Max retries ({max_retries}) reached. Changes is still empty.")
         return []  # 达到最大重试次数后返回空列表
 
+    def _get_compare_data(self, base_sha: str, head_sha: str) -> dict:
+        """获取 base...head 的 compare 响应，按 (base, head) 缓存，失败时缓存为空字典"""
+        key = (base_sha, head_sha)
+        if key not in self._compare_data:
+            url = urljoin(f"{self.gitea_url}/",
+                          f"api/v1/repos/{self.repo_full_name}/compare/{base_sha}...{head_sha}")
+            headers = {
+                'Authorization': f'token {self.gitea_token}'
+            }
+            response = http_get(url, headers=headers, verify=False, timeout=30)
+            if response.status_code == 200:
+                self._compare_data[key] = response.json()
+            else:
+                logger.warn(f"Compare API returned {response.status_code} for {base_sha}...{head_sha}")
+                self._compare_data[key] = {}
+        return self._compare_data[key]
+
+    def _get_commit_file_diffs(self, commit_sha: str) -> dict:
+        """流式获取提交的完整 diff 并按文件拆分为 {文件路径: FileDiff}，按 commit_sha 缓存，PR 中的所有文件共享"""
+        if commit_sha not in self._commit_diffs:
+            diff_url = urljoin(f"{self.gitea_url}/",
+                               f"api/v1/repos/{self.repo_full_name}/git/commits/{commit_sha}.diff")
+            headers = {
+                'Authorization': f'token {self.gitea_token}'
+            }
+            file_diffs = {}
+            with http_get(diff_url, headers=headers, verify=False, timeout=30, stream=True) as diff_response:
+                if diff_response.status_code == 200:
+                    # 边下载边按文件拆分
+                    file_diffs = split_diff_by_file(diff_response.iter_content(chunk_size=65536))
+                    logger.debug(f"Split commit diff {commit_sha} into {len(file_diffs)} files")
+            self._commit_diffs[commit_sha] = file_diffs
+        return self._commit_diffs[commit_sha]
+
     def _get_file_diff_from_pr(self, filename: str, base_sha: str, head_sha: str) -> str:
         """
         从 PR 的 base 和 head 获取特定文件的 diff
+        compare 响应和完整 diff 只获取一次，由 PR 中的所有文件共享
         :param filename: 文件名
         :param base_sha: base 分支的 SHA
         :param head_sha: head 分支的 SHA
@@ -1129,90 +1125,34 @@ class PullRequestHandler:
         """
         try:
             # 使用 compare API 获取 diff
-            url = urljoin(f"{self.gitea_url}/", 
-                          f"api/v1/repos/{self.repo_full_name}/compare/{base_sha}...{head_sha}")
-            headers = {
-                'Authorization': f'token {self.gitea_token}'
-            }
-            response = requests.get(url, headers=headers, verify=False, timeout=30)
-            
-            if response.status_code == 200:
-                compare_data = response.json()
-                commits = compare_data.get('commits', [])
-                
-                # 从 commits 中查找文件
-                for commit in commits:
-                    commit_files = commit.get('files', [])
-                    for file in commit_files:
-                        if file.get('filename') == filename:
-                            patch = file.get('patch', '') or file.get('diff', '')
-                            if patch:
-                                logger.debug(f"Got patch for {filename} from compare API, length: {len(patch)}")
-                                return patch
-                
-                # 如果从 commits 中没找到，尝试从根级别的 files 中获取
-                files = compare_data.get('files', [])
-                for file in files:
-                    if file.get('filename') == filename:
-                        patch = file.get('patch', '') or file.get('diff', '')
-                        if patch:
-                            logger.debug(f"Got patch for {filename} from compare API files, length: {len(patch)}")
-                            return patch
-                
-                # 如果还是没有，尝试使用 commit diff API
-                logger.debug(f"Trying commit diff API for {filename}")
-                diff_url = urljoin(f"{self.gitea_url}/", 
-                                   f"api/v1/repos/{self.repo_full_name}/git/commits/{head_sha}.diff")
-                diff_response = requests.get(diff_url, headers=headers, verify=False, timeout=30)
-                if diff_response.status_code == 200:
-                    full_diff = diff_response.text
-                    # 提取特定文件的 diff
-                    from src.gitea.webhook_handler import PushHandler
-                    # 创建一个临时的 PushHandler 实例来使用 _extract_file_diff_from_full_diff 方法
-                    # 或者直接在这里实现提取逻辑
-                    file_diff = self._extract_file_diff_from_full_diff(full_diff, filename)
-                    if file_diff:
-                        logger.debug(f"Extracted diff for {filename} from commit diff, length: {len(file_diff)}")
-                        return file_diff
-            else:
-                logger.warn(f"Compare API returned {response.status_code} for {filename}")
+            compare_data = self._get_compare_data(base_sha, head_sha)
+            if not compare_data:
+                return ""
+
+            # 从 commits 中查找文件
+            for commit in compare_data.get('commits', []):
+                patch = _find_file_patch(commit.get('files'), filename)
+                if patch:
+                    logger.debug(f"Got patch for {filename} from compare API, length: {len(patch)}")
+                    return patch
+
+            # 如果从 commits 中没找到，尝试从根级别的 files 中获取
+            patch = _find_file_patch(compare_data.get('files'), filename)
+            if patch:
+                logger.debug(f"Got patch for {filename} from compare API files, length: {len(patch)}")
+                return patch
+
+            # 如果还是没有，尝试使用 commit diff API
+            file_diff = self._get_commit_file_diffs(head_sha).get(filename)
+            if file_diff:
+                logger.debug(f"Extracted diff for {filename} from commit diff, length: {len(file_diff.diff)}")
+                return file_diff.diff
         except Exception as e:
             logger.error(f"Exception when getting file diff for {filename}: {str(e)}")
             import traceback
             logger.debug(traceback.format_exc())
         return ""
 
-    def _extract_file_diff_from_full_diff(self, full_diff: str, filename: str) -> str:
-        """
-        从完整的 diff 文本中提取特定文件的 diff
-        """
-        try:
-            lines = full_diff.split('\n')
-            file_diff_lines = []
-            in_target_file = False
-            
-            for i, line in enumerate(lines):
-                # 检查是否是目标文件的 diff 开始
-                if line.startswith('diff --git'):
-                    # 检查是否包含目标文件名
-                    if f"a/{filename}" in line or f"b/{filename}" in line or f"/{filename}" in line:
-                        in_target_file = True
-                        file_diff_lines.append(line)
-                    elif in_target_file:
-                        # 如果已经在目标文件中，遇到下一个文件的 diff 开始，停止
-                        break
-                elif in_target_file:
-                    # 收集目标文件的所有 diff 行
-                    file_diff_lines.append(line)
-            
-            if file_diff_lines:
-                result = '\n'.join(file_diff_lines)
-                logger.debug(f"Extracted {len(file_diff_lines)} lines for {filename}")
-                return result
-        except Exception as e:
-            logger.error(f"Failed to extract file diff for {filename}: {str(e)}")
-        return ""
-
     def get_pull_request_commits(self) -> list:
         # 检查是否为 Pull Request Hook 事件
         if self.event_type != 'pull_request':
@@ -1224,13 +1164,14 @@ class PullRequestHandler:
             'Authorization': f'token {self.gitea_token}',
             'Content-Type': 'application/json'
         }
-        response = requests.get(url, headers=headers, verify=False)
-        logger.debug(f"Get commits response from Gitea: {response.status_code}, {response.text}")
+        response, gitea_commits = http_get_all_pages(url, headers=headers, per_page=50, per_page_param='limit',
+                                                     verify=False)
+        logger.debug(f"Get commits response from Gitea: {response.status_code}, "
+                     f"commits: {len(gitea_commits) if gitea_commits is not None else response.text}")
         
         # 检查请求是否成功
         if response.status_code == 200:
             # 将Gitea的commits转换为统一格式的commits
-            gitea_commits = response.json()
             unified_commits = []
             for commit in gitea_commits:
                 # Gitea commit 格式可能不同，需要转换
@@ -1295,7 +1236,7 @@ class PullRequestHandler:
             logger.debug(f"Trying API endpoint: {url}")
             
             try:
-                response = requests.post(url, headers=headers, json=data, verify=False, timeout=30)
+                response = http_post(url, headers=headers, json=data, verify=False, timeout=30)
                 logger.info(f"Add comment to Gitea PR {url}: status_code={response.status_code}")
                 
                 if response.status_code == 201:
@@ -1395,7 +1336,7 @@ class PullRequestHandler:
         logger.info(f"Attempting to add comment to issue #{issue_number} in {self.repo_full_name}")
         
         try:
-            response = requests.post(url, headers=headers, json=data, verify=False, timeout=30)
+            response = http_post(url, headers=headers, json=data, verify=False, timeout=30)
             if response.status_code == 201:
                 logger.info(f"✅ Comment successfully added to issue #{issue_number}")
             else:
@@ -1431,7 +1372,7 @@ class PullRequestHandler:
         }
         
         try:
-            response = requests.get(url, headers=headers, params=params, verify=False, timeout=30)
+            response = http_get(url, headers=headers, params=params, verify=False, timeout=30)
             if response.status_code == 200:
                 issues = response.json()
                 # 精确匹配标题
@@ -1480,7 +1421,7 @@ class PullRequestHandler:
             data['labels'] = labels
         
         try:
-            response = requests.post(url, headers=headers, json=data, verify=False, timeout=30)
+            response = http_post(url, headers=headers, json=data, verify=False, timeout=30)
             if response.status_code == 201:
                 issue = response.json()
                 issue_number = issue.get('number')
@@ -1546,7 +1487,7 @@ class PullRequestHandler:
             'Content-Type': 'application/json'
         }
 
-        response = requests.get(url, headers=headers, params=params, verify=False)
+        response = http_get(url, headers=headers, params=params, verify=False)
         if response.status_code == 200:
             data = response.json()
             pull_request = self.webhook_data.get('pull_request', {})
@@ -1,10 +1,11 @@
 import os
-import re
 import time
 
-import requests
 import fnmatch
+from src.utils.diff_parser import parse_file_diff
+from src.utils.http_session import http_get, http_get_all_pages, http_post
 from src.utils.log import logger
+from src.utils.token_util import count_tokens
 
 
 
@@ -24,16 +25,11 @@ def filter_changes(changes: list):
             logger.info(f"Detected file deletion via status field: {change.get('new_path')}")
             continue
             
-        # 如果没有status字段或status不为"removed"，继续检查diff模式
+        # 如果没有status字段或status不为"removed"，继续检查diff模式（新文件行范围为 +0,0 且没有新增行）
         diff = change.get('diff', '')
-        if diff:
-            diff_header_match = re.match(r'@@ -\d+,\d+ \+0,0 @@', diff)
-            if diff_header_match:
-                # 检查除了diff头部外的所有行是否都以减号开头
-                diff_lines = diff.split('\n')[1:]  # 跳过diff头部
-                if all(line.startswith('-') or not line for line in diff_lines):
-                    logger.info(f"Detected file deletion via diff pattern: {change.get('new_path')}")
-                    continue
+        if diff and parse_file_diff(diff).deleted_file:
+            logger.info(f"Detected file deletion via diff pattern: {change.get('new_path')}")
+            continue
                     
         not_deleted_changes.append(change)
     
@@ -47,6 +43,8 @@ def filter_changes(changes: list):
             'new_path': item['new_path'],
             'additions': item.get('additions', 0),
             'deletions': item.get('deletions', 0),
+            # 每个文件的 token 数只计算一次，供审查预算、分片和降级策略直接使用
+            'tokens': count_tokens(item.get('diff', '')),
         }
         for item in not_deleted_changes
         if any(item.get('new_path', '').endswith(ext) for ext in supported_extensions)
@@ -93,13 +91,14 @@ class PullRequestHandler:
                 'Authorization': f'token {self.github_token}',
                 'Accept': 'application/vnd.github.v3+json'
             }
-            response = requests.get(url, headers=headers)
+            # 每页最多 100 个文件，其余页面并发获取
+            response, files = http_get_all_pages(url, headers=headers)
             logger.debug(
-                f"Get changes response from GitHub (attempt {attempt + 1}): {response.status_code}, {response.text}, URL: {url}")
+                f"Get changes response from GitHub (attempt {attempt + 1}): {response.status_code}, "
+                f"files: {len(files) if files is not None else response.text}, URL: {url}")
 
             # 检查请求是否成功
             if response.status_code == 200:
-                files = response.json()
                 if files:
                     # 转换成GitLab格式的changes
                     changes = []
@@ -135,13 +134,13 @@ class PullRequestHandler:
             'Authorization': f'token {self.github_token}',
             'Accept': 'application/vnd.github.v3+json'
         }
-        response = requests.get(url, headers=headers)
-        logger.debug(f"Get commits response from GitHub: {response.status_code}, {response.text}")
+        response, github_commits = http_get_all_pages(url, headers=headers)
+        logger.debug(f"Get commits response from GitHub: {response.status_code}, "
+                     f"commits: {len(github_commits) if github_commits is not None else response.text}")
         
         # 检查请求是否成功
         if response.status_code == 200:
             # 将GitHub的commits转换为GitLab格式的commits
-            github_commits = response.json()
             gitlab_format_commits = []
             for commit in github_commits:
                 gitlab_commit = {
@@ -168,7 +167,7 @@ class PullRequestHandler:
         data = {
             'body': review_result
         }
-        response = requests.post(url, headers=headers, json=data)
+        response = http_post(url, headers=headers, json=data)
         logger.debug(f"Add comment to GitHub PR {url}: {response.status_code}, {response.text}")
         if response.status_code == 201:
             logger.info("Comment successfully added to pull request.")
@@ -183,7 +182,7 @@ class PullRequestHandler:
             'Accept': 'application/vnd.github.v3+json'
         }
 
-        response = requests.get(url, headers=headers)
+        response = http_get(url, headers=headers)
         if response.status_code == 200:
             data = response.json()
             target_branch = self.webhook_data['pull_request']['base']['ref']
@@ -255,7 +254,7 @@ class PushHandler:
         data = {
             'body': message
         }
-        response = requests.post(url, headers=headers, json=data)
+        response = http_post(url, headers=headers, json=data)
         logger.debug(f"Add comment to commit {last_commit_id}: {response.status_code}, {response.text}")
         if response.status_code == 201:
             logger.info("Comment successfully added to push commit.")
@@ -270,7 +269,7 @@ class PushHandler:
             'Authorization': f'token {self.github_token}',
             'Accept': 'application/vnd.github.v3+json'
         }
-        response = requests.get(url, headers=headers)
+        response = http_get(url, headers=headers)
         logger.debug(
             f"Get commits response from GitHub for repository_commits: {response.status_code}, {response.text}, URL: {url}")
 
@@ -287,7 +286,7 @@ class PushHandler:
             'Authorization': f'token {self.github_token}',
             'Accept': 'application/vnd.github.v3+json'
         }
-        response = requests.get(url, headers=headers)
+        response = http_get(url, headers=headers)
         logger.debug(
             f"Get commit response from GitHub: {response.status_code}, {response.text}, URL: {url}")
 
@@ -302,7 +301,7 @@ class PushHandler:
             'Authorization': f'token {self.github_token}',
             'Accept': 'application/vnd.github.v3+json'
         }
-        response = requests.get(url, headers=headers)
+        response = http_get(url, headers=headers)
         logger.debug(
             f"Get changes response from GitHub for repository_compare: {response.status_code}, {response.text}, URL: {url}")
 
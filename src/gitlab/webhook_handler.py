@@ -3,9 +3,11 @@ import re
 import time
 from urllib.parse import urljoin
 import fnmatch
-import requests
 
+from src.utils.diff_parser import parse_file_diff
+from src.utils.http_session import http_get, http_get_all_pages, http_post
 from src.utils.log import logger
+from src.utils.token_util import count_tokens
 
 
 def filter_changes(changes: list):
@@ -18,16 +20,20 @@ def filter_changes(changes: list):
     filter_deleted_files_changes = [change for change in changes if not change.get("deleted_file")]
 
     # 过滤 `new_path` 以支持的扩展名结尾的元素, 仅保留diff和new_path字段
-    filtered_changes = [
-        {
+    filtered_changes = []
+    for item in filter_deleted_files_changes:
+        if not any(item.get('new_path', '').endswith(ext) for ext in supported_extensions):
+            continue
+        # 按 hunk 统计新增/删除行数，hunk 内以 "++"、"--" 开头的代码行也会被计入
+        file_diff = parse_file_diff(item.get('diff', ''))
+        filtered_changes.append({
             'diff': item.get('diff', ''),
             'new_path': item['new_path'],
-            'additions': len(re.findall(r'^\+(?!\+\+)', item.get('diff', ''), re.MULTILINE)),
-            'deletions': len(re.findall(r'^-(?!--)', item.get('diff', ''), re.MULTILINE))
-        }
-        for item in filter_deleted_files_changes
-        if any(item.get('new_path', '').endswith(ext) for ext in supported_extensions)
-    ]
+            'additions': file_diff.additions,
+            'deletions': file_diff.deletions,
+            # 每个文件的 token 数只计算一次，供审查预算、分片和降级策略直接使用
+            'tokens': count_tokens(item.get('diff', '')),
+        })
     return filtered_changes
 
 
@@ -89,7 +95,7 @@ class MergeRequestHandler:
             headers = {
                 'Private-Token': self.gitlab_token
             }
-            response = requests.get(url, headers=headers, verify=False)
+            response = http_get(url, headers=headers, verify=False)
             logger.debug(
                 f"Get changes response from GitLab (attempt {attempt + 1}): {response.status_code}, {response.text}, URL: {url}")
 
@@ -120,11 +126,12 @@ class MergeRequestHandler:
         headers = {
             'Private-Token': self.gitlab_token
         }
-        response = requests.get(url, headers=headers, verify=False)
-        logger.debug(f"Get commits response from gitlab: {response.status_code}, {response.text}")
+        response, commits = http_get_all_pages(url, headers=headers, verify=False)
+        logger.debug(f"Get commits response from gitlab: {response.status_code}, "
+                     f"commits: {len(commits) if commits is not None else response.text}")
         # 检查请求是否成功
         if response.status_code == 200:
-            return response.json()
+            return commits
         else:
             logger.warn(f"Failed to get commits: {response.status_code}, {response.text}")
             return []
@@ -139,7 +146,7 @@ class MergeRequestHandler:
         data = {
             'body': review_result
         }
-        response = requests.post(url, headers=headers, json=data, verify=False)
+        response = http_post(url, headers=headers, json=data, verify=False)
         logger.debug(f"Add notes to gitlab {url}: {response.status_code}, {response.text}")
         if response.status_code == 201:
             logger.info("Note successfully added to merge request.")
@@ -154,7 +161,7 @@ class MergeRequestHandler:
             'Private-Token': self.gitlab_token,
             'Content-Type': 'application/json'
         }
-        response = requests.get(url, headers=headers, verify=False)
+        response = http_get(url, headers=headers, verify=False)
         logger.debug(f"Get protected branches response from gitlab: {response.status_code}, {response.text}")
         # 检查请求是否成功
         if response.status_code == 200:
@@ -230,7 +237,7 @@ class PushHandler:
         data = {
             'note': message
         }
-        response = requests.post(url, headers=headers, json=data, verify=False)
+        response = http_post(url, headers=headers, json=data, verify=False)
         logger.debug(f"Add comment to commit {last_commit_id}: {response.status_code}, {response.text}")
         if response.status_code == 201:
             logger.info("Comment successfully added to push commit.")
@@ -245,7 +252,7 @@ class PushHandler:
         headers = {
             'Private-Token': self.gitlab_token
         }
-        response = requests.get(url, headers=headers, verify=False)
+        response = http_get(url, headers=headers, verify=False)
         logger.debug(
             f"Get commits response from GitLab for repository_commits: {response.status_code}, {response.text}, URL: {url}")
 
@@ -268,7 +275,7 @@ class PushHandler:
         headers = {
             'Private-Token': self.gitlab_token
         }
-        response = requests.get(url, headers=headers, verify=False)
+        response = http_get(url, headers=headers, verify=False)
         logger.debug(
             f"Get changes response from GitLab for repository_compare: {response.status_code}, {response.text}, URL: {url}")
 
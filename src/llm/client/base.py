@@ -1,18 +1,102 @@
+import asyncio
+import os
+import time
 from abc import abstractmethod
-from typing import List, Dict, Optional, Union
+from typing import Dict, Iterator, List, Optional, Union
 
+from openai import OpenAI
+
+from src.llm.client.pool import get_http_client, get_async_openai, get_semaphore
+from src.llm.client.rate_limit import get_rate_limiter, call_with_retry, acall_with_retry
+from src.llm.metrics import llm_metrics
 from src.llm.types import NotGiven, NOT_GIVEN
+from src.utils.error import LLMRequestError
 from src.utils.log import logger
+from src.utils.token_util import count_tokens
 
 
 class BaseClient:
     """ Base class for chat models client. """
 
+    # 供应商名称：OpenAI 兼容接口的子类设置后共享连接池，并可使用原生异步调用
+    provider: str = None
+    # 额外的请求参数（如 Qwen 关闭思考模式）
+    extra_body: dict = None
+
+    def _apply_prompt_cache(self, params: dict) -> dict:
+        """
+        为请求开启供应商的提示词前缀缓存（LLM_PROMPT_CACHE_ENABLED=1 时调用），返回新的参数，不修改调用方的 messages。
+        DeepSeek、MiniMax、智谱等自动缓存相同前缀，无需额外参数；需要显式开启的供应商在子类中覆盖。
+        """
+        return params
+
+    def _create_openai_client(self) -> OpenAI:
+        """创建 OpenAI 兼容客户端，同一供应商的客户端共享 HTTP 连接池；重试由 _create_completion 统一处理"""
+        return OpenAI(api_key=self.api_key, base_url=self.base_url, http_client=get_http_client(self.provider),
+                      max_retries=0)
+
+    def _create_completion(self, **params):
+        """
+        调用 chat.completions.create：按供应商限流（LLM_RATE_LIMIT_RPM / LLM_RATE_LIMIT_TPM），
+        429、5xx 和连接错误按 Retry-After 或指数退避重试，最终失败抛出 LLMRequestError。
+        """
+        provider = self.provider or type(self).__name__
+        limiter = get_rate_limiter(provider)
+        messages = params['messages']
+        if os.getenv("LLM_PROMPT_CACHE_ENABLED", "0") == "1":
+            params = self._apply_prompt_cache(params)
+
+        def attempt():
+            limiter.acquire(messages)
+            return self.client.chat.completions.create(**params)
+
+        completion = call_with_retry(provider, attempt)
+        limiter.record_usage(completion)
+        llm_metrics.record_usage(provider, getattr(completion, 'usage', None))
+        return completion
+
+    async def _acreate_completion(self, client, **params):
+        """_create_completion 的异步版本，client 为供应商共享的 AsyncOpenAI 客户端"""
+        provider = self.provider or type(self).__name__
+        limiter = get_rate_limiter(provider)
+        messages = params['messages']
+        if os.getenv("LLM_PROMPT_CACHE_ENABLED", "0") == "1":
+            params = self._apply_prompt_cache(params)
+
+        async def attempt():
+            await limiter.aacquire(messages)
+            return await client.chat.completions.create(**params)
+
+        completion = await acall_with_retry(provider, attempt)
+        limiter.record_usage(completion)
+        llm_metrics.record_usage(provider, getattr(completion, 'usage', None))
+        return completion
+
+    def _first_message(self, completion):
+        """取出第一个候选的消息内容，响应为空时抛出 LLMRequestError"""
+        if not completion or not completion.choices:
+            logger.error("LLM returned no response")
+            raise LLMRequestError("LLM returned no response", provider=self.provider or type(self).__name__)
+        return completion.choices[0].message.content
+
+    def _is_ping_ok(self, result: str) -> bool:
+        """ping 的回复是否表示连通，同步和异步检查共用"""
+        return bool(result) and result.strip() == 'ok'
+
     def ping(self) -> bool:
         """Ping the model to check connectivity."""
         try:
             result = self.completions(messages=[{"role": "user", "content": '请仅返回 "ok"。'}])
-            return result and result == 'ok'
+            return self._is_ping_ok(result)
+        except Exception as e:
+            logger.error(f"尝试连接LLM失败， {e}")
+            return False
+
+    async def aping(self) -> bool:
+        """Ping the model asynchronously."""
+        try:
+            result = await self.acompletions(messages=[{"role": "user", "content": '请仅返回 "ok"。'}])
+            return self._is_ping_ok(result)
         except Exception as e:
             logger.error(f"尝试连接LLM失败， {e}")
             return False
@@ -24,3 +108,65 @@ class BaseClient:
                     ) -> str:
         """Chat with the model.
         """
+
+    async def acompletions(self,
+                           messages: List[Dict[str, str]],
+                           model: Union[Optional[str], NotGiven] = NOT_GIVEN,
+                           ) -> str:
+        """Chat with the model asynchronously.
+
+        OpenAI 兼容接口使用供应商共享的异步连接池，其他客户端在线程中执行同步调用；
+        并发数受供应商信号量限制。
+        """
+        async with get_semaphore(self.provider or type(self).__name__):
+            if not self.provider:
+                return await asyncio.to_thread(self.completions, messages, model)
+            client = get_async_openai(self.provider, self.api_key, self.base_url)
+            completion = await self._acreate_completion(client, **self._completion_params(messages, model))
+        return self._parse_content(self._first_message(completion))
+
+    def _parse_content(self, content) -> str:
+        """解析模型返回的消息内容"""
+        return content
+
+    def _completion_params(self, messages: List[Dict[str, str]],
+                           model: Union[Optional[str], NotGiven] = NOT_GIVEN) -> dict:
+        """构建 OpenAI 兼容接口的请求参数"""
+        params = {
+            "model": model or self.default_model,
+            "messages": messages,
+        }
+        if self.extra_body:
+            params["extra_body"] = self.extra_body
+        return params
+
+    def stream_completions(self,
+                           messages: List[Dict[str, str]],
+                           model: Union[Optional[str], NotGiven] = NOT_GIVEN,
+                           ) -> Iterator[str]:
+        """Chat with the model in streaming mode.
+
+        逐块返回模型输出，结束后按供应商记录首 token 延迟（TTFT）和输出速度（tokens/s）。
+        """
+        start = time.monotonic()
+        ttft = None
+        output = []
+        for chunk in self._stream(messages, model):
+            if not chunk:
+                continue
+            if ttft is None:
+                ttft = time.monotonic() - start
+            output.append(chunk)
+            yield chunk
+        duration = time.monotonic() - start
+        llm_metrics.record(self.provider or type(self).__name__, model or getattr(self, 'default_model', ''),
+                           ttft if ttft is not None else duration, duration, count_tokens(''.join(output)))
+
+    def _stream(self, messages: List[Dict[str, str]], model: Union[Optional[str], NotGiven] = NOT_GIVEN) -> Iterator[str]:
+        """流式请求，非 OpenAI 兼容接口的客户端退化为一次性返回完整结果"""
+        if not self.provider:
+            yield self.completions(messages=messages, model=model)
+            return
+        for chunk in self._create_completion(stream=True, **self._completion_params(messages, model)):
+            if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                yield self._parse_content(chunk.choices[0].delta.content)
@@ -1,8 +1,7 @@
+import hashlib
 import os
 from typing import Dict, List, Optional, Union
 
-from openai import OpenAI
-
 from src.llm.client.base import BaseClient
 from src.llm.types import NotGiven, NOT_GIVEN
 from src.utils.log import logger
@@ -11,6 +10,7 @@ import openai
 
 class OpenAIClient(BaseClient):
     """OpenAI client for chat models."""
+    provider = 'openai'
 
     def __init__(self, api_key: str = None):
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
@@ -18,7 +18,7 @@ class OpenAIClient(BaseClient):
         if not self.api_key:
             raise ValueError("API key is required. Please provide it or set it in the environment variables.")
 
-        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        self.client = self._create_openai_client()
         self.default_model = os.getenv("OPENAI_API_MODEL", "gpt-4o-mini")
 
     def completions(self,
@@ -26,8 +26,16 @@ class OpenAIClient(BaseClient):
                     model: Union[Optional[str], NotGiven] = NOT_GIVEN,
                     ) -> str:
         model = model or self.default_model
-        completion = self.client.chat.completions.create(
+        completion = self._create_completion(
             model=model,
             messages=messages,
         )
-        return completion.choices[0].message.content
+        return self._first_message(completion)
+
+    def _apply_prompt_cache(self, params: dict) -> dict:
+        # OpenAI 自动缓存 1024 token 以上的相同前缀；prompt_cache_key 让相同 system prompt 的请求路由到同一缓存
+        system = next((m['content'] for m in params['messages'] if m.get('role') == 'system'), None)
+        if not isinstance(system, str):
+            return params
+        cache_key = hashlib.sha256(system.encode('utf-8')).hexdigest()[:32]
+        return {**params, "extra_body": {**(params.get("extra_body") or {}), "prompt_cache_key": cache_key}}
@@ -0,0 +1,102 @@
+import asyncio
+import atexit
+import os
+import threading
+import weakref
+
+import httpx
+from openai import AsyncOpenAI
+
+# 每个供应商共享的连接池：同步客户端进程内共享，异步客户端按事件循环共享（httpx.AsyncClient 不能跨事件循环使用）。
+# 同步代码通过 run_async 在进程内常驻的事件循环中执行异步调用，异步客户端和并发信号量在多次审查间复用
+_lock = threading.Lock()
+_http_clients = {}
+_async_clients = weakref.WeakKeyDictionary()
+_semaphores = weakref.WeakKeyDictionary()
+_loop = None
+_loop_pid = None
+
+
+def _limits() -> httpx.Limits:
+    max_connections = int(os.getenv('LLM_MAX_CONNECTIONS', 20))
+    return httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                        keepalive_expiry=60)
+
+
+def get_http_client(provider: str) -> httpx.Client:
+    """获取供应商共享的同步 HTTP 连接池，复用 keep-alive 连接"""
+    with _lock:
+        client = _http_clients.get(provider)
+        if client is None:
+            client = httpx.Client(limits=_limits())
+            _http_clients[provider] = client
+        return client
+
+
+def get_async_openai(provider: str, api_key: str, base_url: str) -> AsyncOpenAI:
+    """获取当前事件循环中供应商共享的异步 OpenAI 兼容客户端"""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        key = (provider, api_key, base_url)
+        client = clients.get(key)
+        if client is None:
+            client = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0,
+                                 http_client=httpx.AsyncClient(limits=_limits()))
+            clients[key] = client
+        return client
+
+
+def get_semaphore(provider: str) -> asyncio.Semaphore:
+    """获取当前事件循环中供应商的并发限制信号量，并发数由 LLM_MAX_CONCURRENCY 控制"""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        semaphores = _semaphores.setdefault(loop, {})
+        semaphore = semaphores.get(provider)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(max(1, int(os.getenv('LLM_MAX_CONCURRENCY', 8))))
+            semaphores[provider] = semaphore
+        return semaphore
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """进程内常驻的事件循环，在后台线程中运行；fork 出的工作进程首次使用时重新创建"""
+    global _loop, _loop_pid
+    with _lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            threading.Thread(target=_loop.run_forever, name='llm-event-loop', daemon=True).start()
+        return _loop
+
+
+def run_async(coro):
+    """在进程内常驻的事件循环中执行协程并等待结果（供同步代码调用，不能在该事件循环内调用）"""
+    loop = _get_loop()
+    try:
+        running_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        running_loop = None
+    if running_loop is loop:
+        coro.close()
+        raise RuntimeError("run_async() cannot be called from the shared event loop")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+async def _close_async_clients():
+    for clients in list(_async_clients.values()):
+        for client in clients.values():
+            await client.close()
+        clients.clear()
+
+
+@atexit.register
+def _shutdown_loop():
+    """进程退出时关闭异步客户端的连接并停止事件循环"""
+    if _loop is None or _loop_pid != os.getpid() or not _loop.is_running():
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(_close_async_clients(), _loop).result(timeout=5)
+    except Exception:
+        pass
+    _loop.call_soon_threadsafe(_loop.stop)
@@ -1,8 +1,6 @@
 import os
 from typing import Dict, List, Optional, Union
 
-from openai import OpenAI
-
 from src.llm.client.base import BaseClient
 from src.llm.types import NotGiven, NOT_GIVEN
 from src.utils.log import logger
@@ -11,6 +9,7 @@ import dashscope
 
 class QwenClient(BaseClient):
     """Qwen client for chat models."""
+    provider = 'qwen'
 
     def __init__(self, api_key: str = None):
         self.api_key = api_key or os.getenv("QWEN_API_KEY")
@@ -18,7 +17,7 @@ class QwenClient(BaseClient):
         if not self.api_key:
             raise ValueError("API key is required. Please provide it or set it in the environment variables.")
 
-        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        self.client = self._create_openai_client()
         self.default_model = os.getenv("QWEN_API_MODEL", "qwen-turbo")
         self.extra_body={"enable_thinking": False}
         dashscope.api_key = self.api_key
@@ -28,9 +27,18 @@ class QwenClient(BaseClient):
                     model: Union[Optional[str], NotGiven] = NOT_GIVEN,
                     ) -> str:
         model = model or self.default_model
-        completion = self.client.chat.completions.create(
+        completion = self._create_completion(
             model=model,
             messages=messages,
             extra_body=self.extra_body,
         )
-        return completion.choices[0].message.content
+        return self._first_message(completion)
+
+    def _apply_prompt_cache(self, params: dict) -> dict:
+        # 百炼显式缓存：在 system prompt 上标记 cache_control，后续请求命中相同前缀时按缓存计费
+        messages = [
+            {**m, "content": [{"type": "text", "text": m["content"], "cache_control": {"type": "ephemeral"}}]}
+            if m.get("role") == "system" and isinstance(m.get("content"), str) else m
+            for m in params["messages"]
+        ]
+        return {**params, "messages": messages}
@@ -0,0 +1,169 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, List, Dict
+
+from src.utils.error import LLMRequestError
+from src.utils.log import logger
+from src.utils.token_util import count_tokens
+
+# 可重试的 HTTP 状态码：请求超时、冲突、限流和服务端错误
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+# 可重试的异常类型（连接错误、超时）
+RETRYABLE_ERROR_NAMES = {'APIConnectionError', 'APITimeoutError', 'ConnectError', 'ReadTimeout', 'TimeoutException'}
+
+
+class TokenBucket:
+    """令牌桶：按每分钟速率补充，预约式扣减（先扣减再等待），并发请求按到达顺序排队"""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        """扣减 amount 个令牌，返回需要等待的秒数（单次请求最多扣减桶容量）"""
+        with self._lock:
+            self._refill()
+            self.tokens -= min(amount, self.capacity)
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def consume(self, amount: float):
+        """补扣令牌（如响应后按实际输出 token 数补扣），不等待，由后续请求承担"""
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+
+
+class RateLimiter:
+    """单个供应商的限流器：每分钟请求数（RPM）和每分钟 token 数（TPM），未配置时不限制"""
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        prefix = provider.upper()
+        rpm = float(os.getenv(f"{prefix}_RATE_LIMIT_RPM", os.getenv("LLM_RATE_LIMIT_RPM", 0)))
+        tpm = float(os.getenv(f"{prefix}_RATE_LIMIT_TPM", os.getenv("LLM_RATE_LIMIT_TPM", 0)))
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+
+    def _reserve(self, messages: List[Dict[str, str]]) -> float:
+        wait = 0.0
+        if self.requests:
+            wait = self.requests.reserve(1)
+        if self.tokens:
+            wait = max(wait, self.tokens.reserve(estimate_input_tokens(messages)))
+        if wait > 1:
+            logger.info(f"LLM 供应商 {self.provider} 达到限流阈值，本地排队 {wait:.1f}s")
+        return wait
+
+    def acquire(self, messages: List[Dict[str, str]]):
+        wait = self._reserve(messages)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, messages: List[Dict[str, str]]):
+        wait = self._reserve(messages)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def record_usage(self, completion):
+        """按响应中的实际输出 token 数补扣 TPM 令牌"""
+        usage = getattr(completion, 'usage', None)
+        if self.tokens and usage is not None and getattr(usage, 'completion_tokens', None):
+            self.tokens.consume(usage.completion_tokens)
+
+
+_lock = threading.Lock()
+_limiters = {}
+
+
+def get_rate_limiter(provider: str) -> RateLimiter:
+    """获取供应商的限流器（进程内共享）"""
+    with _lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            limiter = RateLimiter(provider)
+            _limiters[provider] = limiter
+        return limiter
+
+
+def estimate_input_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(count_tokens(message['content']) for message in messages if isinstance(message.get('content'), str))
+
+
+def _status_code(error: Exception):
+    status_code = getattr(error, 'status_code', None)
+    if status_code is None and getattr(error, 'response', None) is not None:
+        status_code = getattr(error.response, 'status_code', None)
+    return status_code
+
+
+def is_retryable(error: Exception) -> bool:
+    return _status_code(error) in RETRYABLE_STATUS_CODES or type(error).__name__ in RETRYABLE_ERROR_NAMES
+
+
+def retry_delay(error: Exception, attempt: int) -> float:
+    """优先使用响应头中的 Retry-After（秒数或 HTTP 日期），否则指数退避并加随机抖动"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    retry_after = headers.get('retry-after')
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    base_delay = float(os.getenv("LLM_RETRY_BASE_DELAY", 1))
+    return random.uniform(0, base_delay * (2 ** attempt))
+
+
+def _request_error(provider: str, error: Exception) -> LLMRequestError:
+    if isinstance(error, LLMRequestError):
+        return error
+    return LLMRequestError(f"{provider} 请求失败: {error}", provider=provider, status_code=_status_code(error))
+
+
+def call_with_retry(provider: str, func: Callable):
+    """执行同步请求，可重试的错误按退避策略重试 LLM_MAX_RETRIES 次，最终失败抛出 LLMRequestError"""
+    max_retries = int(os.getenv("LLM_MAX_RETRIES", 3))
+    for attempt in range(max_retries + 1):
+        try:
+            return func()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise _request_error(provider, e) from e
+            delay = retry_delay(e, attempt)
+            logger.warning(f"LLM 供应商 {provider} 请求失败（{e}），{delay:.1f}s 后第 {attempt + 1} 次重试")
+            time.sleep(delay)
+
+
+async def acall_with_retry(provider: str, func: Callable):
+    """call_with_retry 的异步版本，func 返回 awaitable"""
+    max_retries = int(os.getenv("LLM_MAX_RETRIES", 3))
+    for attempt in range(max_retries + 1):
+        try:
+            return await func()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise _request_error(provider, e) from e
+            delay = retry_delay(e, attempt)
+            logger.warning(f"LLM 供应商 {provider} 请求失败（{e}），{delay:.1f}s 后第 {attempt + 1} 次重试")
+            await asyncio.sleep(delay)
@@ -0,0 +1,259 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from src.llm.client.base import BaseClient
+from src.llm.metrics import llm_metrics
+from src.llm.types import NotGiven, NOT_GIVEN
+from src.utils.error import LLMRequestError
+from src.utils.log import logger
+
+
+class ProviderHealth:
+    """单个供应商的健康状态：延迟 EWMA、错误率 EWMA，连续失败后进入冷却期"""
+
+    # EWMA 平滑系数，越大越偏向最近的请求
+    ALPHA = 0.3
+    # 连续失败多少次后进入冷却期
+    FAILURE_THRESHOLD = 3
+    # 冷却期（秒），期间该供应商排在可用供应商之后
+    COOLDOWN_SECONDS = 30
+    # 错误率超过该值时视为不健康
+    ERROR_RATE_THRESHOLD = 0.5
+
+    def __init__(self):
+        self.latency = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+
+    def record_success(self, latency: float):
+        self.latency = latency if self.latency is None else self.ALPHA * latency + (1 - self.ALPHA) * self.latency
+        self.error_rate = (1 - self.ALPHA) * self.error_rate
+        self.consecutive_failures = 0
+
+    def record_failure(self):
+        self.error_rate = self.ALPHA + (1 - self.ALPHA) * self.error_rate
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.FAILURE_THRESHOLD:
+            self.cooldown_until = time.monotonic() + self.COOLDOWN_SECONDS
+
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.cooldown_until and self.error_rate <= self.ERROR_RATE_THRESHOLD
+
+    def snapshot(self) -> dict:
+        return {
+            'latency': round(self.latency, 3) if self.latency is not None else None,
+            'error_rate': round(self.error_rate, 3),
+            'consecutive_failures': self.consecutive_failures,
+            'healthy': self.healthy(),
+        }
+
+
+class RoutingClient(BaseClient):
+    """
+    多供应商路由客户端：按配置顺序优先使用健康的供应商，出错或超时时切换到下一个供应商；
+    配置 LLM_HEDGE_DELAY 后，首选供应商超过该时间未返回时向下一个供应商发送对冲请求，采用先返回的结果。
+    """
+
+    def __init__(self, clients: List[Tuple[str, BaseClient]]):
+        if not clients:
+            raise ValueError("RoutingClient requires at least one provider client.")
+        self.clients = clients
+        self.primary = clients[0][0]
+        self.default_model = getattr(clients[0][1], 'default_model', '')
+        self.hedge_delay = float(os.getenv("LLM_HEDGE_DELAY", 0))
+        self.request_timeout = float(os.getenv("LLM_REQUEST_TIMEOUT", 300))
+        self._health = {name: ProviderHealth() for name, _ in clients}
+        self._lock = threading.Lock()
+        # 同步调用在线程池中执行，以便超时切换和对冲请求
+        self._executor = ThreadPoolExecutor(max_workers=max(2, 2 * int(os.getenv("LLM_MAX_CONCURRENCY", 8))),
+                                            thread_name_prefix='llm-router')
+
+    def _candidates(self) -> List[Tuple[str, BaseClient]]:
+        """健康的供应商在前，同等健康状态下保持配置顺序"""
+        with self._lock:
+            return sorted(self.clients, key=lambda item: not self._health[item[0]].healthy())
+
+    def _model_for(self, name: str, model: Union[Optional[str], NotGiven]):
+        # 指定的模型名只对首选供应商有效，其他供应商使用各自的默认模型
+        return model if name == self.primary else NOT_GIVEN
+
+    def _record(self, name: str, latency: float = None, error: Exception = None):
+        with self._lock:
+            if error is None:
+                self._health[name].record_success(latency)
+            else:
+                self._health[name].record_failure()
+            snapshot = self._health[name].snapshot()
+        # 健康状态随 LLM 调用统计一起汇总输出并写入数据库（/api/llm/stats）
+        llm_metrics.record_health(name, snapshot)
+        if error is not None:
+            logger.warning(f"LLM 供应商 {name} 调用失败: {error}")
+
+    def _timed_call(self, name: str, client: BaseClient, messages: List[Dict[str, str]],
+                    model: Union[Optional[str], NotGiven]) -> str:
+        start = time.monotonic()
+        try:
+            result = client.completions(messages=messages, model=self._model_for(name, model))
+        except Exception as e:
+            self._record(name, error=e)
+            raise
+        self._record(name, latency=time.monotonic() - start)
+        return result
+
+    def completions(self,
+                    messages: List[Dict[str, str]],
+                    model: Union[Optional[str], NotGiven] = NOT_GIVEN,
+                    ) -> str:
+        candidates = self._candidates()
+        pending = {}
+        errors = []
+        hedged = False
+
+        def launch():
+            name, client = candidates[len(pending) + len(errors)]
+            future = self._executor.submit(self._timed_call, name, client, messages, model)
+            pending[future] = (name, time.monotonic())
+
+        launch()
+        while pending:
+            now = time.monotonic()
+            has_next = len(pending) + len(errors) < len(candidates)
+            # 等待到最早的超时时间，或到达对冲时间
+            wait_time = min(started + self.request_timeout for _, started in pending.values()) - now
+            if self.hedge_delay > 0 and not hedged and has_next:
+                wait_time = min(wait_time, max(0.0, next(iter(pending.values()))[1] + self.hedge_delay - now))
+            done, _ = wait(pending, timeout=max(0.0, wait_time), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                name, _ = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.append(f"{name}: {e}")
+                    continue
+                if hedged:
+                    logger.info(f"LLM 对冲请求由 {name} 先返回")
+                return result
+
+            now = time.monotonic()
+            for future, (name, started) in list(pending.items()):
+                if now - started >= self.request_timeout:
+                    # 超时的请求无法中断，放弃其结果并计为失败
+                    pending.pop(future)
+                    self._record(name, error=TimeoutError(f"超过 {self.request_timeout}s 未返回"))
+                    errors.append(f"{name}: timeout")
+
+            has_next = len(pending) + len(errors) < len(candidates)
+            if not has_next:
+                continue
+            if not pending:
+                # 当前供应商失败，切换到下一个
+                launch()
+            elif self.hedge_delay > 0 and not hedged and \
+                    now - next(iter(pending.values()))[1] >= self.hedge_delay:
+                logger.info(f"LLM 请求超过 {self.hedge_delay}s 未返回，发送对冲请求")
+                hedged = True
+                launch()
+
+        raise LLMRequestError("所有 LLM 供应商调用失败", errors='; '.join(errors))
+
+    async def acompletions(self,
+                           messages: List[Dict[str, str]],
+                           model: Union[Optional[str], NotGiven] = NOT_GIVEN,
+                           ) -> str:
+        candidates = self._candidates()
+        errors = []
+        hedged = False
+
+        async def call(name: str, client: BaseClient) -> str:
+            start = time.monotonic()
+            try:
+                result = await asyncio.wait_for(
+                    client.acompletions(messages=messages, model=self._model_for(name, model)),
+                    timeout=self.request_timeout)
+            except asyncio.CancelledError:
+                raise
+            except asyncio.TimeoutError:
+                error = TimeoutError(f"超过 {self.request_timeout}s 未返回")
+                self._record(name, error=error)
+                raise error
+            except Exception as e:
+                self._record(name, error=e)
+                raise
+            self._record(name, latency=time.monotonic() - start)
+            return result
+
+        pending = {}
+        index = 0
+
+        def launch():
+            nonlocal index
+            name, client = candidates[index]
+            index += 1
+            pending[asyncio.ensure_future(call(name, client))] = name
+
+        launch()
+        try:
+            while pending:
+                hedge = self.hedge_delay > 0 and not hedged and index < len(candidates)
+                done, _ = await asyncio.wait(pending, timeout=self.hedge_delay if hedge else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.info(f"LLM 请求超过 {self.hedge_delay}s 未返回，发送对冲请求")
+                    hedged = True
+                    launch()
+                    continue
+                for task in done:
+                    name = pending.pop(task)
+                    try:
+                        return task.result()
+                    except Exception as e:
+                        errors.append(f"{name}: {e}")
+                if not pending and index < len(candidates):
+                    launch()
+        finally:
+            # 已有结果时取消仍在进行的对冲请求
+            for task in pending:
+                task.cancel()
+        raise LLMRequestError("所有 LLM 供应商调用失败", errors='; '.join(errors))
+
+    async def aping(self) -> bool:
+        """并发检查所有供应商的连接，任一供应商可用即返回 True"""
+        results = await asyncio.gather(*(client.aping() for _, client in self.clients))
+        for (name, _), ok in zip(self.clients, results):
+            if not ok:
+                logger.warning(f"LLM 供应商 {name} 连接检查失败")
+        return any(results)
+
+    def stream_completions(self,
+                           messages: List[Dict[str, str]],
+                           model: Union[Optional[str], NotGiven] = NOT_GIVEN,
+                           ) -> Iterator[str]:
+        """流式调用：在收到第一个内容块之前出错时切换到下一个供应商，之后的错误直接抛出"""
+        errors = []
+        for name, client in self._candidates():
+            start = time.monotonic()
+            started = False
+            try:
+                for chunk in client.stream_completions(messages=messages, model=self._model_for(name, model)):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                self._record(name, error=e)
+                if started:
+                    raise
+                errors.append(f"{name}: {e}")
+                continue
+            self._record(name, latency=time.monotonic() - start)
+            return
+        raise LLMRequestError("所有 LLM 供应商调用失败", errors='; '.join(errors))
+
+    def health_snapshot(self) -> dict:
+        """各供应商的健康状态"""
+        with self._lock:
+            return {name: health.snapshot() for name, health in self._health.items()}
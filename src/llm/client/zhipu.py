@@ -1,8 +1,6 @@
 import os
 from typing import Dict, List, Optional, Union
 
-from openai import OpenAI
-
 from src.llm.client.base import BaseClient
 from src.llm.types import NotGiven, NOT_GIVEN
 from src.utils.log import logger
@@ -10,6 +8,7 @@ from src.utils.log import logger
 
 class ZhipuClient(BaseClient):
     """Zhipu client for chat models."""
+    provider = 'zhipu'
 
     def __init__(self, api_key: str = None):
         self.api_key = api_key or os.getenv("ZHIPUAI_API_KEY")
@@ -22,7 +21,7 @@ class ZhipuClient(BaseClient):
         if not self.api_key:
             raise ValueError("API key is required. Please provide it or set it in the environment variables.")
 
-        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        self.client = self._create_openai_client()
         self.default_model = os.getenv("ZHIPUAI_API_MODEL", "glm-4.7")
         logger.info(f"Zhipu client initialized with API type: {self.api_type}, base_url: {self.base_url}, model: {self.default_model}")
 
@@ -31,12 +30,8 @@ class ZhipuClient(BaseClient):
                     model: Union[Optional[str], NotGiven] = NOT_GIVEN,
                     ) -> str:
         model = model or self.default_model
-        completion = self.client.chat.completions.create(
+        completion = self._create_completion(
             model=model,
             messages=messages,
         )
-        if completion and completion.choices and len(completion.choices) > 0:
-            return completion.choices[0].message.content
-        else:
-            logger.error("LLM returned no response")
-            raise Exception("LLM returned no response")
+        return self._first_message(completion)
@@ -1,4 +1,5 @@
 import os
+import threading
 
 from src.llm.client.base import BaseClient
 from src.llm.client.deepseek import DeepSeekClient
@@ -6,25 +7,92 @@ from src.llm.client.openai import OpenAIClient
 from src.llm.client.qwen import QwenClient
 from src.llm.client.zhipu import ZhipuClient
 from src.llm.client.minimax import MiniMaxClient
+from src.llm.client.router import RoutingClient
 from src.utils.log import logger
 
 
-
 class Factory:
+    chat_model_providers = {
+        'openai': OpenAIClient,
+        'deepseek': DeepSeekClient,
+        'qwen': QwenClient,
+        'zhipu': ZhipuClient,
+        'zhipuai': ZhipuClient,
+        'minimax': MiniMaxClient,
+    }
+
+    # 各供应商的 (base_url, model) 环境变量，用于生成客户端缓存键
+    provider_env_keys = {
+        'openai': ('OPENAI_API_BASE_URL', 'OPENAI_API_MODEL'),
+        'deepseek': ('DEEPSEEK_API_BASE_URL', 'DEEPSEEK_API_MODEL'),
+        'qwen': ('QWEN_API_BASE_URL', 'QWEN_API_MODEL'),
+        'zhipu': ('ZHIPUAI_API_BASE_URL', 'ZHIPUAI_API_MODEL'),
+        'zhipuai': ('ZHIPUAI_API_BASE_URL', 'ZHIPUAI_API_MODEL'),
+        'minimax': ('MINIMAX_API_BASE_URL', 'MINIMAX_API_MODEL'),
+    }
+
+    # 进程内客户端注册表：(供应商类, base_url, model) -> 客户端实例
+    _clients = {}
+    _lock = threading.Lock()
+
     @staticmethod
     def getClient(provider: str = None) -> BaseClient:
+        """
+        获取供应商客户端：每个 (供应商, base_url, model) 在进程内只创建一次，之后直接复用。
+        配置变化时（如 base_url 或 model 修改）会创建新的客户端。
+        未指定供应商且配置了 LLM_FALLBACK_PROVIDERS 时，返回在 LLM_PROVIDER 与备用供应商之间路由的客户端。
+        """
+        if provider is None and os.getenv("LLM_FALLBACK_PROVIDERS"):
+            return Factory._getRoutingClient()
         provider = provider or os.getenv("LLM_PROVIDER", "openai")
-        chat_model_providers = {
-            'openai': lambda: OpenAIClient(),
-            'deepseek': lambda: DeepSeekClient(),
-            'qwen': lambda: QwenClient(),
-            'zhipu': lambda: ZhipuClient(),
-            'zhipuai': lambda: ZhipuClient(),
-            'minimax': lambda: MiniMaxClient(),
-        }
-
-        provider_func = chat_model_providers.get(provider)
-        if provider_func:
-            return provider_func()
-        else:
+        client_class = Factory.chat_model_providers.get(provider)
+        if not client_class:
             raise Exception(f'Unknown chat model provider: {provider}')
+
+        base_url_key, model_key = Factory.provider_env_keys[provider]
+        key = (client_class, os.getenv(base_url_key), os.getenv(model_key))
+        client = Factory._clients.get(key)
+        if client is None:
+            with Factory._lock:
+                client = Factory._clients.get(key)
+                if client is None:
+                    client = client_class()
+                    Factory._clients[key] = client
+                    logger.info(f"LLM client created: provider={provider}, base_url={key[1]}, model={key[2]}")
+        return client
+
+    @staticmethod
+    def _getRoutingClient() -> BaseClient:
+        """创建（或复用）LLM_PROVIDER + LLM_FALLBACK_PROVIDERS 的路由客户端，无法创建的备用供应商会被跳过"""
+        names = [os.getenv("LLM_PROVIDER", "openai")]
+        for name in os.getenv("LLM_FALLBACK_PROVIDERS", "").split(','):
+            name = name.strip()
+            if name and name not in names:
+                names.append(name)
+
+        clients = []
+        for name in names:
+            try:
+                clients.append((name, Factory.getClient(name)))
+            except Exception as e:
+                if not clients:
+                    # 首选供应商不可用时直接报错，与未配置备用供应商时的行为一致
+                    raise
+                logger.warning(f"备用LLM供应商 {name} 不可用，已跳过: {e}")
+        if len(clients) == 1:
+            return clients[0][1]
+
+        key = ('router',) + tuple((name, id(client)) for name, client in clients)
+        with Factory._lock:
+            client = Factory._clients.get(key)
+            if client is None:
+                client = RoutingClient(clients)
+                Factory._clients[key] = client
+                logger.info(f"LLM routing client created: providers={[name for name, _ in clients]}")
+        return client
+
+    @staticmethod
+    def clear():
+        """清空客户端注册表（配置热更新或测试时使用）"""
+        with Factory._lock:
+            Factory._clients.clear()
@@ -0,0 +1,162 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from src.utils.log import logger
+
+
+class LLMMetrics:
+    """
+    LLM 调用性能统计：按供应商记录首 token 延迟（TTFT）、输出速度（tokens/s）、提示词缓存命中的 token 数，
+    以及路由客户端跟踪的供应商健康状态。
+    进程内先累计增量，每次审查结束时由 flush 输出 INFO 汇总并累加到 SQLite，多个工作进程共享统计。
+    """
+    DB_FILE = "data/llm_metrics.db"
+
+    def __init__(self, db_file: str = None):
+        self.db_file = db_file or os.getenv('LLM_METRICS_DB_FILE', LLMMetrics.DB_FILE)
+        self._lock = threading.Lock()
+        # 尚未写入数据库的增量：provider -> {name: value}
+        self._pending = {}
+        # 尚未写入数据库的最新健康状态：provider -> snapshot
+        self._pending_health = {}
+        self._db_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_file, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def init_db(self):
+        """初始化数据库及表结构"""
+        if self._db_ready:
+            return
+        os.makedirs(os.path.dirname(self.db_file) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('''
+                    CREATE TABLE IF NOT EXISTS llm_metrics (
+                        provider TEXT NOT NULL,
+                        name TEXT NOT NULL,
+                        value REAL DEFAULT 0,
+                        PRIMARY KEY (provider, name)
+                    )
+                ''')
+            conn.execute('''
+                    CREATE TABLE IF NOT EXISTS llm_provider_health (
+                        provider TEXT PRIMARY KEY,
+                        snapshot TEXT,
+                        updated_at INTEGER
+                    )
+                ''')
+            conn.commit()
+        self._db_ready = True
+
+    def _add(self, provider: str, **values):
+        with self._lock:
+            stats = self._pending.setdefault(provider, {})
+            for name, value in values.items():
+                stats[name] = stats.get(name, 0) + value
+
+    def record(self, provider: str, model: str, ttft: float, duration: float, output_tokens: int):
+        """
+        :param ttft: 从发出请求到收到第一个内容块的耗时（秒）
+        :param duration: 请求总耗时（秒）
+        :param output_tokens: 输出 token 数
+        """
+        generation_time = max(duration - ttft, 1e-6)
+        tokens_per_second = output_tokens / generation_time
+        logger.info(f"LLM stream finished: provider={provider}, model={model}, ttft={ttft:.2f}s, "
+                    f"duration={duration:.2f}s, output_tokens={output_tokens}, tokens/s={tokens_per_second:.1f}")
+        self._add(provider, requests=1, total_ttft=ttft, total_generation_time=generation_time,
+                  total_output_tokens=output_tokens)
+
+    def record_usage(self, provider: str, usage):
+        """
+        记录一次非流式调用的输入 token 数和其中命中提示词缓存的 token 数。
+        DeepSeek 返回 usage.prompt_cache_hit_tokens，OpenAI 兼容接口（OpenAI、Qwen、MiniMax、智谱）
+        返回 usage.prompt_tokens_details.cached_tokens。
+        """
+        prompt_tokens = getattr(usage, 'prompt_tokens', None)
+        if not prompt_tokens:
+            return
+        cached_tokens = getattr(usage, 'prompt_cache_hit_tokens', None)
+        if cached_tokens is None:
+            cached_tokens = getattr(getattr(usage, 'prompt_tokens_details', None), 'cached_tokens', None)
+        cached_tokens = cached_tokens or 0
+        logger.debug(f"LLM usage: provider={provider}, prompt_tokens={prompt_tokens}, cached_tokens={cached_tokens}")
+        self._add(provider, calls=1, prompt_tokens=prompt_tokens, cached_tokens=cached_tokens)
+
+    def record_health(self, provider: str, snapshot: dict):
+        """记录路由客户端中供应商的最新健康状态（ProviderHealth.snapshot）"""
+        with self._lock:
+            self._pending_health[provider] = snapshot
+
+    @staticmethod
+    def _summarize(stats: dict) -> dict:
+        """由累计值计算平均 TTFT、平均输出速度和提示词缓存命中率"""
+        result = {}
+        if stats.get('requests'):
+            result['requests'] = int(stats['requests'])
+            result['avg_ttft'] = round(stats.get('total_ttft', 0) / stats['requests'], 3)
+            if stats.get('total_generation_time'):
+                result['tokens_per_second'] = round(stats.get('total_output_tokens', 0)
+                                                    / stats['total_generation_time'], 1)
+        if stats.get('prompt_tokens'):
+            result['calls'] = int(stats.get('calls', 0))
+            result['prompt_tokens'] = int(stats['prompt_tokens'])
+            result['cached_tokens'] = int(stats.get('cached_tokens', 0))
+            result['cache_hit_rate'] = round(stats.get('cached_tokens', 0) / stats['prompt_tokens'], 3)
+        return result
+
+    def flush(self):
+        """输出本进程自上次 flush 以来的调用汇总（INFO），并把增量累加到数据库；每次审查结束时调用"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            pending_health, self._pending_health = self._pending_health, {}
+        if not pending and not pending_health:
+            return
+        for provider, stats in pending.items():
+            summary = ', '.join(f"{name}={value}" for name, value in self._summarize(stats).items())
+            logger.info(f"LLM 调用统计: provider={provider}, {summary}")
+        for provider, snapshot in pending_health.items():
+            logger.info(f"LLM 供应商健康状态: provider={provider}, {snapshot}")
+        now = int(time.time())
+        try:
+            self.init_db()
+            with self._connect() as conn:
+                conn.executemany(
+                    'INSERT INTO llm_metrics (provider, name, value) VALUES (?, ?, ?) '
+                    'ON CONFLICT(provider, name) DO UPDATE SET value = value + excluded.value',
+                    [(provider, name, value) for provider, stats in pending.items() for name, value in stats.items()])
+                conn.executemany(
+                    'INSERT OR REPLACE INTO llm_provider_health (provider, snapshot, updated_at) VALUES (?, ?, ?)',
+                    [(provider, json.dumps(snapshot), now) for provider, snapshot in pending_health.items()])
+                conn.commit()
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"Failed to save LLM metrics: {e}")
+
+    def snapshot(self) -> dict:
+        """返回所有工作进程累计的各供应商平均 TTFT、平均输出速度、提示词缓存命中率和最新健康状态"""
+        self.flush()
+        totals = {}
+        result = {}
+        try:
+            self.init_db()
+            with self._connect() as conn:
+                for provider, name, value in conn.execute('SELECT provider, name, value FROM llm_metrics').fetchall():
+                    totals.setdefault(provider, {})[name] = value
+                health_rows = conn.execute(
+                    'SELECT provider, snapshot, updated_at FROM llm_provider_health').fetchall()
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"Failed to read LLM metrics: {e}")
+            return result
+        for provider, stats in totals.items():
+            result[provider] = self._summarize(stats)
+        for provider, snapshot, updated_at in health_rows:
+            result.setdefault(provider, {})['health'] = {**json.loads(snapshot), 'updated_at': updated_at}
+        return result
+
+
+llm_metrics = LLMMetrics()
@@ -0,0 +1,107 @@
+import json
+import re
+from typing import Optional, Tuple
+
+
+class OutputNormalizer:
+    """
+    LLM 输出后处理器：去掉思考标签、模型在报告前输出的思考过程以及外层的 ```markdown 代码块。
+    所有模式预编译，思考短语合并为一个正则分支；先用子串查找跳过不需要的正则扫描。
+    """
+    # 思考标签本身（标签间的内容保留，由 ThinkTagStripper 负责流式场景下的整体过滤）
+    THINK_TAG_PATTERN = re.compile(r'</?think(?:ing)?>|<think(?:ing)? />')
+    # 常见的思考开头短语
+    THINKING_PHRASES = (
+        '让我按照要求的格式提供详细的',
+        '审查要点：',
+        '由于代码非常简单，我需要：',
+        '让我分析变更的内容',
+        '让我按照要求的格式编写审查报告',
+        '让我分析一下这段代码',
+        '我来分析一下这个变更',
+        '让我仔细分析这段代码',
+        '我需要分析这个变更的合理性',
+        '让我评估这个变更的影响',
+        '现在我将按照要求的格式提供审查报告',
+        '让我开始分析这个代码变更',
+        '我将按照要求的格式提供详细的审查报告',
+        '首先，我需要分析变更的内容',
+        '让我分析一下这个变量重命名变更',
+        '现在我将分析这个变更的合理性和影响',
+        '让我按照审查要点进行分析',
+        '我将按照要求的格式编写详细的审查报告',
+    )
+    # 所有思考短语合并为一个正则分支，一次扫描即可判断是否出现
+    THINKING_PATTERN = re.compile('|'.join(re.escape(phrase) for phrase in THINKING_PHRASES))
+    # 报告标题，如"# Vue3代码审查报告"
+    REPORT_TITLE = '审查报告'
+    REPORT_START_PATTERN = re.compile(r'^\s*#\s+[\u4e00-\u9fa5\w]+审查报告', re.MULTILINE)
+    # 思考内容之后第一个标题或列表
+    CONTENT_START_PATTERN = re.compile(r'^\s*[#\d\*\-]+\s+', re.MULTILINE)
+
+    def normalize(self, text: str) -> str:
+        if not text:
+            return text
+        # 先用子串查找快速判断，绝大多数输出不含思考标签或报告标题，无需运行正则
+        if '<think' in text or '</think' in text:
+            text = self.THINK_TAG_PATTERN.sub('', text)
+
+        report_start = self.REPORT_START_PATTERN.search(text) if self.REPORT_TITLE in text else None
+        if report_start:
+            # 从报告标题开始截取
+            text = text[report_start.start():].strip()
+        elif self.THINKING_PATTERN.search(text):
+            # 找到思考内容时，从第一个可能的报告标题或列表开始截取
+            content_start = self.CONTENT_START_PATTERN.search(text)
+            if content_start:
+                text = text[content_start.start():].strip()
+
+        if text.startswith("```markdown") and text.endswith("```"):
+            text = text[11:-3].strip()
+        return text
+
+
+output_normalizer = OutputNormalizer()
+
+# 输出末尾的 ```json 代码块（结构化审查结果）
+JSON_BLOCK_PATTERN = re.compile(r'```json\s*(\{.*?\})\s*```', re.DOTALL)
+
+
+def normalize_output(text: str) -> str:
+    """去掉 LLM 输出中的思考内容和外层 markdown 代码块"""
+    return output_normalizer.normalize(text)
+
+
+def extract_json_block(text: str) -> Tuple[str, Optional[dict]]:
+    """
+    取出 LLM 输出中最后一个 ```json 代码块并解析。
+    返回 (去掉该代码块后的文本, 解析结果)；没有代码块或 JSON 无效时返回 (原文本, None)。
+    """
+    if not text or '```json' not in text:
+        return text, None
+    matches = list(JSON_BLOCK_PATTERN.finditer(text))
+    if not matches:
+        return text, None
+    match = matches[-1]
+    try:
+        data = json.loads(match.group(1))
+    except ValueError:
+        return text, None
+    if not isinstance(data, dict):
+        return text, None
+    return (text[:match.start()] + text[match.end():]).strip(), data
+
+
+if __name__ == '__main__':
+    import time
+
+    sample = ("<think>让我分析一下这段代码</think>\n审查要点：\n"
+              + "\n".join(f"- 第 {i} 行：变量命名可以更清晰" for i in range(200))
+              + "\n\n# Python代码审查报告\n\n" + "\n".join(f"## 问题 {i}\n说明 {i}" for i in range(300))
+              + "\n\n总分：85分")
+    print(normalize_output(sample)[:30])
+    rounds = 2000
+    start = time.perf_counter()
+    for _ in range(rounds):
+        normalize_output(sample)
+    print(f"chars={len(sample)}, cost={(time.perf_counter() - start) / rounds * 1e6:.1f}us/op")
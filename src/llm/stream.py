@@ -0,0 +1,64 @@
+class ThinkTagStripper:
+    """
+    流式输出的思考内容过滤器：逐块输入模型输出，实时去掉 <think>/<thinking> 块及其内容，
+    能正确处理被拆分到多个块中的标签，只需缓存可能构成标签前缀的少量字符。
+    """
+    OPEN_TAGS = ('<think>', '<thinking>')
+    CLOSE_TAGS = ('</think>', '</thinking>')
+    EMPTY_TAGS = ('<think />', '<thinking />', '<think/>', '<thinking/>')
+    TAGS = OPEN_TAGS + CLOSE_TAGS + EMPTY_TAGS
+
+    def __init__(self):
+        self._pending = ''
+        self._inside_think = False
+
+    def feed(self, chunk: str) -> str:
+        """输入一个内容块，返回可以立即输出的内容"""
+        self._pending += chunk
+        output = []
+        while self._pending:
+            if self._inside_think:
+                end = self._find_close_tag()
+                if end < 0:
+                    # 只保留可能是结束标签前缀的尾部，其余思考内容直接丢弃
+                    self._pending = self._pending[-(max(len(tag) for tag in self.CLOSE_TAGS) - 1):]
+                    break
+                self._pending = self._pending[end:]
+                self._inside_think = False
+                continue
+
+            index = self._pending.find('<')
+            if index < 0:
+                output.append(self._pending)
+                self._pending = ''
+                break
+            output.append(self._pending[:index])
+            self._pending = self._pending[index:]
+
+            tag = next((tag for tag in self.TAGS if self._pending.startswith(tag)), None)
+            if tag:
+                self._pending = self._pending[len(tag):]
+                self._inside_think = tag in self.OPEN_TAGS
+            elif any(tag.startswith(self._pending) for tag in self.TAGS):
+                # 可能是被拆分的标签，等待下一个内容块
+                break
+            else:
+                output.append('<')
+                self._pending = self._pending[1:]
+        return ''.join(output)
+
+    def flush(self) -> str:
+        """流结束时输出剩余内容；未闭合的思考块丢弃"""
+        remaining = '' if self._inside_think else self._pending
+        self._pending = ''
+        self._inside_think = False
+        return remaining
+
+    def _find_close_tag(self) -> int:
+        """返回结束标签之后的位置，未找到返回 -1"""
+        positions = [(self._pending.find(tag), tag) for tag in self.CLOSE_TAGS]
+        found = [(position, tag) for position, tag in positions if position >= 0]
+        if not found:
+            return -1
+        position, tag = min(found)
+        return position + len(tag)
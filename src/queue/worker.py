@@ -26,6 +26,7 @@ def handle_push_event(webhook_data: dict, gitlab_token: str, gitlab_url: str, gi
 
         review_result = None
         score = 0
+        dimension_scores, issues = {}, []
         additions = 0
         deletions = 0
         if push_review_enabled:
@@ -40,7 +41,10 @@ def handle_push_event(webhook_data: dict, gitlab_token: str, gitlab_url: str, gi
             if len(changes) > 0:
                 commits_text = ';'.join(commit.get('message', '').strip() for commit in commits)
                 review_result = CodeReviewer().review_and_strip_code(changes, commits_text, changes)
-                score = CodeReviewer.parse_review_score(review_text=review_result)
+                # 只解析一次：结构化结果入库，展示时去掉 JSON 代码块
+                parsed_review = CodeReviewer.parse_review(review_result)
+                review_result, score = parsed_review.markdown, parsed_review.score
+                dimension_scores, issues = parsed_review.dimension_scores, parsed_review.issues
                 for item in changes:
                     additions += item['additions']
                     deletions += item['deletions']
@@ -59,6 +63,8 @@ def handle_push_event(webhook_data: dict, gitlab_token: str, gitlab_url: str, gi
             webhook_data=webhook_data,
             additions=additions,
             deletions=deletions,
+            dimension_scores=dimension_scores,
+            issues=issues,
         ))
 
     except Exception as e:
@@ -114,7 +120,11 @@ def handle_merge_request_event(webhook_data: dict, gitlab_token: str, gitlab_url
 
         # review 代码
         commits_text = ';'.join(commit['title'] for commit in commits)
-        review_result = CodeReviewer().review_and_strip_code(changes, commits_text, changes)
+        review_scope = f"{gitlab_url_slug}:{handler.project_id}:mr:{handler.merge_request_iid}"
+        review_result = CodeReviewer().review_changes_incrementally(changes, commits_text, review_scope)
+        # 只解析一次：结构化结果入库，展示时去掉 JSON 代码块
+        parsed_review = CodeReviewer.parse_review(review_result)
+        review_result = parsed_review.markdown
 
         # 将review结果提交到Gitlab的 notes
         handler.add_merge_request_notes(f'Auto Review Result: \n{review_result}')
@@ -128,13 +138,15 @@ def handle_merge_request_event(webhook_data: dict, gitlab_token: str, gitlab_url
                 target_branch=webhook_data['object_attributes']['target_branch'],
                 updated_at=int(datetime.now().timestamp()),
                 commits=commits,
-                score=CodeReviewer.parse_review_score(review_text=review_result),
+                score=parsed_review.score,
                 url=webhook_data['object_attributes']['url'],
                 review_result=review_result,
                 url_slug=gitlab_url_slug,
                 webhook_data=webhook_data,
                 additions=additions,
                 deletions=deletions,
+                dimension_scores=parsed_review.dimension_scores,
+                issues=parsed_review.issues,
             )
         )
 
@@ -155,6 +167,7 @@ def handle_github_push_event(webhook_data: dict, github_token: str, github_url:
 
         review_result = None
         score = 0
+        dimension_scores, issues = {}, []
         additions = 0
         deletions = 0
         if push_review_enabled:
@@ -169,7 +182,10 @@ def handle_github_push_event(webhook_data: dict, github_token: str, github_url:
             if len(changes) > 0:
                 commits_text = ';'.join(commit.get('message', '').strip() for commit in commits)
                 review_result = CodeReviewer().review_and_strip_code(changes, commits_text, changes)
-                score = CodeReviewer.parse_review_score(review_text=review_result)
+                # 只解析一次：结构化结果入库，展示时去掉 JSON 代码块
+                parsed_review = CodeReviewer.parse_review(review_result)
+                review_result, score = parsed_review.markdown, parsed_review.score
+                dimension_scores, issues = parsed_review.dimension_scores, parsed_review.issues
                 for item in changes:
                     additions += item.get('additions', 0)
                     deletions += item.get('deletions', 0)
@@ -188,6 +204,8 @@ def handle_github_push_event(webhook_data: dict, github_token: str, github_url:
             webhook_data=webhook_data,
             additions=additions,
             deletions=deletions,
+            dimension_scores=dimension_scores,
+            issues=issues,
         ))
 
     except Exception as e:
@@ -243,7 +261,11 @@ def handle_github_pull_request_event(webhook_data: dict, github_token: str, gith
 
         # review 代码
         commits_text = ';'.join(commit['title'] for commit in commits)
-        review_result = CodeReviewer().review_and_strip_code(changes, commits_text, changes)
+        review_scope = f"{github_url_slug}:{handler.repo_full_name}:mr:{handler.pull_request_number}"
+        review_result = CodeReviewer().review_changes_incrementally(changes, commits_text, review_scope)
+        # 只解析一次：结构化结果入库，展示时去掉 JSON 代码块
+        parsed_review = CodeReviewer.parse_review(review_result)
+        review_result = parsed_review.markdown
 
         # 将review结果提交到GitHub的 notes
         handler.add_pull_request_notes(f'Auto Review Result: \n{review_result}')
@@ -257,13 +279,15 @@ def handle_github_pull_request_event(webhook_data: dict, github_token: str, gith
                 target_branch=webhook_data['pull_request']['base']['ref'],
                 updated_at=int(datetime.now().timestamp()),
                 commits=commits,
-                score=CodeReviewer.parse_review_score(review_text=review_result),
+                score=parsed_review.score,
                 url=webhook_data['pull_request']['html_url'],
                 review_result=review_result,
                 url_slug=github_url_slug,
                 webhook_data=webhook_data,
                 additions=additions,
                 deletions=deletions,
+                dimension_scores=parsed_review.dimension_scores,
+                issues=parsed_review.issues,
             ))
 
     except Exception as e:
@@ -296,6 +320,7 @@ def handle_gitea_push_event(webhook_data: dict, gitea_token: str, gitea_url: str
 
         review_result = None
         score = 0
+        dimension_scores, issues = {}, []
         additions = 0
         deletions = 0
         if push_review_enabled:
@@ -310,7 +335,10 @@ def handle_gitea_push_event(webhook_data: dict, gitea_token: str, gitea_url: str
             if len(changes) > 0:
                 commits_text = ';'.join(commit.get('message', '').strip() for commit in commits)
                 review_result = CodeReviewer().review_and_strip_code(changes, commits_text, changes)
-                score = CodeReviewer.parse_review_score(review_text=review_result)
+                # 只解析一次：结构化结果入库，展示时去掉 JSON 代码块
+                parsed_review = CodeReviewer.parse_review(review_result)
+                review_result, score = parsed_review.markdown, parsed_review.score
+                dimension_scores, issues = parsed_review.dimension_scores, parsed_review.issues
                 for item in changes:
                     additions += item.get('additions', 0)
                     deletions += item.get('deletions', 0)
@@ -362,6 +390,8 @@ def handle_gitea_push_event(webhook_data: dict, gitea_token: str, gitea_url: str
             webhook_data=webhook_data,
             additions=additions,
             deletions=deletions,
+            dimension_scores=dimension_scores,
+            issues=issues,
         ))
 
     except Exception as e:
@@ -428,7 +458,11 @@ def handle_gitea_pull_request_event(webhook_data: dict, gitea_token: str, gitea_
 
         # review 代码
         commits_text = ';'.join(commit.get('title', commit.get('message', '')).split('\n')[0] for commit in commits)
-        review_result = CodeReviewer().review_and_strip_code(changes, commits_text, changes)
+        review_scope = f"{gitea_url_slug}:{handler.repo_full_name}:mr:{handler.pull_request_number}"
+        review_result = CodeReviewer().review_changes_incrementally(changes, commits_text, review_scope)
+        # 只解析一次：结构化结果入库，展示时去掉 JSON 代码块
+        parsed_review = CodeReviewer.parse_review(review_result)
+        review_result = parsed_review.markdown
 
         # 检查是否启用 Issue 模式（默认开启）
         use_issue_mode = os.environ.get('GITEA_USE_ISSUE_MODE', '1') == '1'
@@ -487,13 +521,15 @@ def handle_gitea_pull_request_event(webhook_data: dict, gitea_token: str, gitea_
                 target_branch=target_branch,
                 updated_at=int(datetime.now().timestamp()),
                 commits=commits,
-                score=CodeReviewer.parse_review_score(review_text=review_result),
+                score=parsed_review.score,
                 url=html_url,
                 review_result=review_result,
                 url_slug=gitea_url_slug,
                 webhook_data=webhook_data,
                 additions=additions,
                 deletions=deletions,
+                dimension_scores=parsed_review.dimension_scores,
+                issues=parsed_review.issues,
             ))
 
     except Exception as e:
@@ -1,3 +1,4 @@
+import json
 import sqlite3
 
 import pandas as pd
@@ -27,7 +28,10 @@ class ReviewService:
                             url TEXT,
                             review_result TEXT,
                             additions INTEGER DEFAULT 0,
-                            deletions INTEGER DEFAULT 0
+                            deletions INTEGER DEFAULT 0,
+                            dimension_scores TEXT,
+                            issues TEXT,
+                            issue_count INTEGER DEFAULT 0
                         )
                     ''')
                 cursor.execute('''
@@ -41,22 +45,40 @@ class ReviewService:
                             score INTEGER,
                             review_result TEXT,
                             additions INTEGER DEFAULT 0,
-                            deletions INTEGER DEFAULT 0
+                            deletions INTEGER DEFAULT 0,
+                            dimension_scores TEXT,
+                            issues TEXT,
+                            issue_count INTEGER DEFAULT 0
                         )
                     ''')
-                # 确保旧版本的mr_review_log、push_review_log表添加additions、deletions列
+                # 确保旧版本的mr_review_log、push_review_log表添加additions、deletions及结构化审查结果列
                 tables = ["mr_review_log", "push_review_log"]
-                columns = ["additions", "deletions"]
+                columns = {
+                    "additions": "INTEGER DEFAULT 0",
+                    "deletions": "INTEGER DEFAULT 0",
+                    "dimension_scores": "TEXT",
+                    "issues": "TEXT",
+                    "issue_count": "INTEGER DEFAULT 0",
+                }
                 for table in tables:
                     cursor.execute(f"PRAGMA table_info({table})")
                     current_columns = [col[1] for col in cursor.fetchall()]
-                    for column in columns:
+                    for column, column_type in columns.items():
                         if column not in current_columns:
-                            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER DEFAULT 0")
+                            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
                 conn.commit()
         except sqlite3.DatabaseError as e:
             print(f"Database initialization failed: {e}")
 
+    @staticmethod
+    def _structured_columns(entity) -> tuple:
+        """结构化审查结果对应的 (dimension_scores, issues, issue_count) 列值"""
+        dimension_scores = getattr(entity, 'dimension_scores', None)
+        issues = getattr(entity, 'issues', None)
+        return (json.dumps(dimension_scores, ensure_ascii=False) if dimension_scores else None,
+                json.dumps(issues, ensure_ascii=False) if issues else None,
+                len(issues) if issues else 0)
+
     @staticmethod
     def insert_mr_review_log(entity: MergeRequestReviewEntity):
         """插入合并请求审核日志"""
@@ -64,13 +86,14 @@ class ReviewService:
             with sqlite3.connect(ReviewService.DB_FILE) as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                                INSERT INTO mr_review_log (project_name,author, source_branch, target_branch, updated_at, commit_messages, score, url,review_result, additions, deletions)
-                                VALUES (?,?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                                INSERT INTO mr_review_log (project_name,author, source_branch, target_branch, updated_at, commit_messages, score, url,review_result, additions, deletions, dimension_scores, issues, issue_count)
+                                VALUES (?,?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                             ''',
                                (entity.project_name, entity.author, entity.source_branch,
                                 entity.target_branch,
                                 entity.updated_at, entity.commit_messages, entity.score,
-                                entity.url, entity.review_result, entity.additions, entity.deletions))
+                                entity.url, entity.review_result, entity.additions, entity.deletions)
+                               + ReviewService._structured_columns(entity))
                 conn.commit()
         except sqlite3.DatabaseError as e:
             print(f"Error inserting review log: {e}")
@@ -82,7 +105,7 @@ class ReviewService:
         try:
             with sqlite3.connect(ReviewService.DB_FILE) as conn:
                 query = """
-                            SELECT project_name, author, source_branch, target_branch, updated_at, commit_messages, score, url, review_result, additions, deletions
+                            SELECT project_name, author, source_branch, target_branch, updated_at, commit_messages, score, url, review_result, additions, deletions, dimension_scores, issue_count
                             FROM mr_review_log
                             WHERE 1=1
                             """
@@ -119,12 +142,13 @@ class ReviewService:
             with sqlite3.connect(ReviewService.DB_FILE) as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
-                                INSERT INTO push_review_log (project_name,author, branch, updated_at, commit_messages, score,review_result, additions, deletions)
-                                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                                INSERT INTO push_review_log (project_name,author, branch, updated_at, commit_messages, score,review_result, additions, deletions, dimension_scores, issues, issue_count)
+                                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                             ''',
                                (entity.project_name, entity.author, entity.branch,
                                 entity.updated_at, entity.commit_messages, entity.score,
-                                entity.review_result, entity.additions, entity.deletions))
+                                entity.review_result, entity.additions, entity.deletions)
+                               + ReviewService._structured_columns(entity))
                 conn.commit()
         except sqlite3.DatabaseError as e:
             print(f"Error inserting review log: {e}")
@@ -137,7 +161,7 @@ class ReviewService:
             with sqlite3.connect(ReviewService.DB_FILE) as conn:
                 # 基础查询
                 query = """
-                    SELECT project_name, author, branch, updated_at, commit_messages, score, review_result, additions, deletions
+                    SELECT project_name, author, branch, updated_at, commit_messages, score, review_result, additions, deletions, dimension_scores, issue_count
                     FROM push_review_log
                     WHERE 1=1
                 """
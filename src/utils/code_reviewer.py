@@ -1,42 +1,59 @@
 import abc
+import asyncio
 import os
+import json
 import re
-from typing import Dict, Any, List
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional
 
 import yaml
-from jinja2 import Template
 
+from src.llm.client.pool import run_async
 from src.llm.factory import Factory
+from src.llm.metrics import llm_metrics
+from src.llm.output import normalize_output, extract_json_block
+from src.llm.stream import ThinkTagStripper
+from src.utils.language_detector import FILE_EXTENSIONS, detect_language, detect_language_from_paths
 from src.utils.log import logger
-from src.utils.token_util import count_tokens, truncate_text_by_tokens
+from src.utils.prompt_registry import prompt_registry
+from src.utils.review_cache import ReviewCache, FileReviewStore
+from src.utils.review_context import ReviewContext, change_to_diff, change_tokens
+from src.utils.token_util import count_and_truncate
+
+
+# 结构化输出模式下追加到 system prompt 的说明，要求模型在报告末尾输出机器可读的审查结果
+STRUCTURED_OUTPUT_INSTRUCTION = """
+
+## 结构化结果
+在审查报告的最后，额外输出一个且仅一个 ```json 代码块，内容为机器可读的审查结果，格式如下：
+{"score": 0-100 的整数总分, "dimensions": {"维度名称": 该维度得分}, "issues": [{"file": "文件路径", "line": 行号或 null, "severity": "high/medium/low", "message": "问题描述"}]}
+"""
+
+
+@dataclass
+class ParsedReview:
+    """解析后的审查结果：展示用的 markdown 与结构化的评分、各维度得分和问题列表"""
+    markdown: str
+    # 未能解析出总分时为 None，入库为 NULL，不影响平均分统计
+    score: Optional[int] = None
+    dimension_scores: Dict[str, Any] = field(default_factory=dict)
+    issues: List[Dict[str, Any]] = field(default_factory=list)
+    # 是否来自结构化的 JSON 结果
+    structured: bool = False
 
 
 class BaseReviewer(abc.ABC):
     """代码审查基类"""
 
     def __init__(self, prompt_key: str):
-        self.client = Factory().getClient()
+        self.client = Factory.getClient()
         self.prompts = self._load_prompts(prompt_key, os.getenv("REVIEW_STYLE", "professional"))
 
     def _load_prompts(self, prompt_key: str, style="professional") -> Dict[str, Any]:
         """加载提示词配置"""
-        prompt_templates_file = "config/prompt_templates.yml"
         try:
-            # 在打开 YAML 文件时显式指定编码为 UTF-8，避免使用系统默认的 GBK 编码。
-            with open(prompt_templates_file, "r", encoding="utf-8") as file:
-                prompts = yaml.safe_load(file).get(prompt_key, {})
-
-                # 使用Jinja2渲染模板
-                def render_template(template_str: str) -> str:
-                    return Template(template_str).render(style=style)
-
-                system_prompt = render_template(prompts["system_prompt"])
-                user_prompt = render_template(prompts["user_prompt"])
-
-                return {
-                    "system_message": {"role": "system", "content": system_prompt},
-                    "user_message": {"role": "user", "content": user_prompt},
-                }
+            # 解析和渲染结果由注册表缓存，模板文件修改后自动重新加载
+            return prompt_registry.get(prompt_key, style)
         except (FileNotFoundError, KeyError, yaml.YAMLError) as e:
             logger.error(f"加载提示词配置失败: {e}")
             raise Exception(f"提示词配置加载失败: {e}")
@@ -44,7 +61,45 @@ class BaseReviewer(abc.ABC):
     def call_llm(self, messages: List[Dict[str, Any]]) -> str:
         """调用 LLM 进行代码审核"""
         logger.info(f"向 AI 发送代码 Review 请求, messages: {messages}")
-        review_result = self.client.completions(messages=messages)
+        if os.getenv("LLM_STREAM_ENABLED", "0") == "1":
+            review_result = self._stream_llm(messages)
+        else:
+            review_result = self.client.completions(messages=messages)
+        logger.info(f"收到 AI 返回结果: {review_result}")
+        return review_result
+
+    def _stream_llm(self, messages: List[Dict[str, Any]]) -> str:
+        """流式调用 LLM，边接收边过滤思考内容，流结束即得到最终结果"""
+        stripper = ThinkTagStripper()
+        parts = [stripper.feed(chunk) for chunk in self.client.stream_completions(messages=messages)]
+        parts.append(stripper.flush())
+        return ''.join(parts)
+
+    @staticmethod
+    def _system_message(prompts: Dict[str, Any]) -> Dict[str, Any]:
+        """开启 REVIEW_STRUCTURED_OUTPUT_ENABLED 时，在 system prompt 末尾追加结构化输出说明"""
+        if os.getenv("REVIEW_STRUCTURED_OUTPUT_ENABLED", "0") != "1":
+            return prompts["system_message"]
+        return {"role": "system", "content": prompts["system_message"]["content"] + STRUCTURED_OUTPUT_INSTRUCTION}
+
+    @classmethod
+    def _build_messages(cls, prompts: Dict[str, Any], prompt_vars: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        构建请求的 messages，保持可被供应商缓存的稳定前缀：system prompt 在前，
+        user prompt 模板中的固定说明在前、审查时间和提交信息在后、diff 放在最后。
+        """
+        return [
+            cls._system_message(prompts),
+            {
+                "role": "user",
+                "content": prompts["user_message"]["content"].format(**prompt_vars),
+            },
+        ]
+
+    async def acall_llm(self, messages: List[Dict[str, Any]]) -> str:
+        """异步调用 LLM，使用供应商共享的连接池和并发限制"""
+        logger.info(f"向 AI 发送代码 Review 请求, messages: {messages}")
+        review_result = await self.client.acompletions(messages=messages)
         logger.info(f"收到 AI 返回结果: {review_result}")
         return review_result
 
@@ -57,9 +112,35 @@ class BaseReviewer(abc.ABC):
 class CodeReviewer(BaseReviewer):
     """代码 Diff 级别的审查"""
 
+    # 降级审查选择文件时，token 预算量化的最大单位数
+    FALLBACK_BUDGET_STEPS = 1000
+    # 源代码文件扩展名，降级审查时优先于文档、配置等文件
+    SOURCE_FILE_EXTENSIONS = tuple(FILE_EXTENSIONS)
+    # 路径权重：测试、文档、锁文件和生成的代码在降级审查时优先级较低
+    PATH_WEIGHTS = tuple((re.compile(pattern), weight) for pattern, weight in (
+        (r'(^|/)(tests?|__tests__|spec)/|_test\.|\.test\.|\.spec\.', 0.6),
+        (r'(^|/)docs?/|\.(md|rst|txt)$', 0.3),
+        (r'(^|/)(vendor|node_modules|dist|build)/|\.min\.(js|css)$|\.lock$|-lock\.json$|_pb2\.py$|\.pb\.go$', 0.1),
+    ))
+    # 各供应商默认模型的上下文窗口（tokens），可通过 LLM_CONTEXT_WINDOW 覆盖
+    PROVIDER_CONTEXT_WINDOWS = {
+        'openai': 128000,
+        'deepseek': 64000,
+        'qwen': 128000,
+        'zhipu': 128000,
+        'zhipuai': 128000,
+        'minimax': 1000000,
+    }
+    # 降级审查的 diff 最多占用的上下文比例，其余留给提示词和输出
+    FALLBACK_SAFETY_MARGIN = 0.8
+    # 上下文超限错误信息中的关键字
+    CONTEXT_OVERFLOW_KEYWORDS = ('context_length', 'context length', 'too many tokens', 'exceed', 'maximum')
+
     def __init__(self):
         # 不预加载通用提示词，而是动态加载
-        self.client = Factory().getClient()
+        self.client = Factory.getClient()
+        # 最近一次语言检测的 (diff文本, 语言)，同一次审查中不重复检测
+        self._language_memo = None
         # 语言到提示词映射
         self.language_prompts = {
             'python': 'python_review_prompt',
@@ -77,145 +158,31 @@ class CodeReviewer(BaseReviewer):
         }
 
     def _detect_language_from_diff(self, diffs_text: str) -> str:
-        """从diff文本中检测主要编程语言"""
-        # 文件扩展名到语言的映射
-        file_extensions = {
-            '.py': 'python',
-            '.js': 'javascript',
-            '.ts': 'typescript',
-            '.jsx': 'javascript',
-            '.tsx': 'typescript',
-            '.vue': 'vue',
-            '.java': 'java',
-            '.go': 'go',
-            '.php': 'php',
-            '.cpp': 'cpp',
-            '.cc': 'cpp',
-            '.cxx': 'cpp',
-            '.c': 'c',
-            '.h': 'cpp',
-            '.hpp': 'cpp',
-        }
-        
-        # 统计各种语言的文件数量
-        language_counts = {}
-        vue3_indicators = 0
-        
-        # 尝试多种文件路径模式
-        file_patterns = [
-            r'^\+\+\+ b/(.+)$',  # Git diff格式: +++ b/file.vue
-            r'^\+\+\+ (.+)$',    # 简化格式: +++ file.vue
-            r'^--- a/(.+)$',     # Git diff格式: --- a/file.vue
-            r'^--- (.+)$',       # 简化格式: --- file.vue
-            r'^diff --git a/(.+) b/(.+)$',  # Git diff格式: diff --git a/file.vue b/file.vue
-        ]
-        
-        for line in diffs_text.split('\n'):
-            # 尝试所有文件路径模式
-            file_path = None
-            for pattern in file_patterns:
-                match = re.search(pattern, line)
-                if match:
-                    if pattern == r'^diff --git a/(.+) b/(.+)$':
-                        # 对于diff --git格式，取第一个文件路径
-                        file_path = match.group(1)
-                    else:
-                        file_path = match.group(1)
-                    break
-            
-            if file_path:
-                # 获取文件扩展名
-                ext = os.path.splitext(file_path)[1].lower()
-                if ext in file_extensions:
-                    lang = file_extensions[ext]
-                    language_counts[lang] = language_counts.get(lang, 0) + 1
-                    logger.info(f"检测到文件: {file_path}, 扩展名: {ext}, 语言: {lang}")
-            
-            # 检查代码内容中的Vue3特征
-            line_lower = line.lower()
-            if any(indicator in line_lower for indicator in [
-                'setup()', 'defineprops', 'defineemits', 'ref(', 'reactive(',
-                'computed(', 'watch(', 'onmounted', 'onunmounted',
-                'composition api', 'script setup', '<script setup'
-            ]):
-                vue3_indicators += 1
-                logger.info(f"检测到Vue3特征: {line.strip()}")
-        
-        # 如果没有通过文件路径检测到语言，尝试从内容中检测
-        if not language_counts:
-            # 检查是否包含Vue相关的内容
-            if any(indicator in diffs_text.lower() for indicator in [
-                '<template>', '<script>', '<style>', 'vue', '.vue'
-            ]):
-                language_counts['vue'] = 1
-                logger.info("通过内容检测到Vue文件")
-            
-            # 检查JavaScript特征
-            elif any(indicator in diffs_text.lower() for indicator in [
-                'function', 'var ', 'let ', 'const ', '=>', 'prompt(', 'alert(',
-                'console.log', 'document.', 'window.', 'addEventListener'
-            ]):
-                language_counts['javascript'] = 1
-                logger.info("通过内容检测到JavaScript代码")
-            
-            # 检查Python特征
-            elif any(indicator in diffs_text.lower() for indicator in [
-                'def ', 'import ', 'from ', 'class ', 'if __name__', 'print(',
-                'self.', 'return ', 'try:', 'except:', 'with open('
-            ]):
-                language_counts['python'] = 1
-                logger.info("通过内容检测到Python代码")
-        
-        # 返回出现最多的语言，如果没有检测到则返回默认
-        if language_counts:
-            primary_language = max(language_counts, key=language_counts.get)
-            
-            # 如果是Vue且有Vue3特征，记录日志
-            if primary_language == 'vue' and vue3_indicators > 0:
-                logger.info(f"检测到Vue3代码，Vue3特征数量: {vue3_indicators}")
-            elif primary_language == 'vue':
-                logger.info(f"检测到Vue文件，但未发现Vue3特征，Vue3特征数量: {vue3_indicators}")
-            
-            logger.info(f"检测到主要编程语言: {primary_language}")
-            return primary_language
-        
-        logger.info("未检测到特定编程语言，使用通用审查提示词")
-        return 'default'
-
-    def _get_appropriate_prompt(self, diffs_text: str) -> str:
-        """根据代码内容选择合适的提示词"""
-        detected_lang = self._detect_language_from_diff(diffs_text)
+        """从diff文本中检测主要编程语言，同一份diff文本只检测一次"""
+        if self._language_memo is not None and self._language_memo[0] is diffs_text:
+            return self._language_memo[1]
+        language = detect_language(diffs_text)
+        self._language_memo = (diffs_text, language)
+        logger.info(f"检测到主要编程语言: {language}")
+        return language
+
+    def _get_appropriate_prompt(self, diffs_text: str, detected_lang: str = None) -> str:
+        """根据代码内容选择合适的提示词，已检测过语言时直接传入 detected_lang"""
+        if not detected_lang or detected_lang == 'default':
+            detected_lang = self._detect_language_from_diff(diffs_text)
         prompt_key = self.language_prompts.get(detected_lang, 'vue3_review_prompt')
         
-        # 添加详细的调试日志
-        logger.info(f"语言检测结果: {detected_lang}")
-        logger.info(f"语言映射: {detected_lang} -> {prompt_key}")
-        logger.info(f"可用的语言映射: {self.language_prompts}")
-        
         # 临时修复：强制Vue文件使用Vue3提示词
         if detected_lang == 'vue':
-            logger.info("检测到Vue文件，强制使用vue3_review_prompt")
             return 'vue3_review_prompt'
         
+        logger.debug(f"语言映射: {detected_lang} -> {prompt_key}")
         return prompt_key
 
     def _load_language_specific_prompts(self, prompt_key: str, style="professional") -> Dict[str, Any]:
         """加载语言特定的提示词配置"""
-        prompt_templates_file = "config/prompt_templates.yml"
         try:
-            with open(prompt_templates_file, "r", encoding="utf-8") as file:
-                prompts = yaml.safe_load(file).get(prompt_key, {})
-
-                def render_template(template_str: str) -> str:
-                    return Template(template_str).render(style=style)
-
-                system_prompt = render_template(prompts["system_prompt"])
-                user_prompt = render_template(prompts["user_prompt"])
-
-                return {
-                    "system_message": {"role": "system", "content": system_prompt},
-                    "user_message": {"role": "user", "content": user_prompt},
-                }
+            return prompt_registry.get(prompt_key, style)
         except (FileNotFoundError, KeyError, yaml.YAMLError) as e:
             logger.error(f"加载语言特定提示词配置失败: {e}")
             # 如果加载失败，回退到通用提示词
@@ -223,21 +190,8 @@ class CodeReviewer(BaseReviewer):
 
     def _load_fallback_prompts(self, style="professional") -> Dict[str, Any]:
         """加载通用提示词作为回退"""
-        prompt_templates_file = "config/prompt_templates.yml"
         try:
-            with open(prompt_templates_file, "r", encoding="utf-8") as file:
-                prompts = yaml.safe_load(file).get("code_review_prompt", {})
-
-                def render_template(template_str: str) -> str:
-                    return Template(template_str).render(style=style)
-
-                system_prompt = render_template(prompts["system_prompt"])
-                user_prompt = render_template(prompts["user_prompt"])
-
-                return {
-                    "system_message": {"role": "system", "content": system_prompt},
-                    "user_message": {"role": "user", "content": user_prompt},
-                }
+            return prompt_registry.get("code_review_prompt", style)
         except (FileNotFoundError, KeyError, yaml.YAMLError) as e:
             logger.error(f"加载通用提示词配置失败: {e}")
             raise Exception(f"提示词配置加载失败: {e}")
@@ -246,34 +200,7 @@ class CodeReviewer(BaseReviewer):
         """将changes列表转换为标准的diff格式"""
         if not changes:
             return ""
-        
-        diff_content = []
-        for change in changes:
-            # 处理不同的change格式
-            if isinstance(change, dict):
-                # GitLab API返回的格式
-                if 'diff' in change:
-                    diff_text = change['diff']
-                    # 如果diff不包含文件路径信息，但有new_path，则添加标准diff头
-                    if not diff_text.startswith('diff --git') and 'new_path' in change:
-                        diff_text = f"diff --git a/{change['new_path']} b/{change['new_path']}\nindex 0000000..0000000 100644\n--- a/{change['new_path']}\n+++ b/{change['new_path']}\n{diff_text}"
-                    diff_content.append(diff_text)
-                elif 'new_path' in change and 'old_path' in change:
-                    # 构建简单的diff格式
-                    diff_content.append(f"diff --git a/{change['old_path']} b/{change['new_path']}")
-                    if 'new_file' in change and change['new_file']:
-                        diff_content.append(f"new file mode 100644")
-                    elif 'deleted_file' in change and change['deleted_file']:
-                        diff_content.append(f"deleted file mode 100644")
-                    diff_content.append(f"--- a/{change['old_path']}")
-                    diff_content.append(f"+++ b/{change['new_path']}")
-                    if 'diff' in change:
-                        diff_content.append(change['diff'])
-            elif isinstance(change, str):
-                # 如果已经是字符串格式，直接添加
-                diff_content.append(change)
-        
-        return "\n".join(diff_content)
+        return "\n".join(diff for diff in map(change_to_diff, changes) if diff)
 
     def review_and_strip_code(self, changes_text: str, commits_text: str = "", changes_data: list = None, review_time: str = None) -> str:
         """
@@ -285,21 +212,24 @@ class CodeReviewer(BaseReviewer):
         :param review_time: 审查时间，来自webhook的metadata
         :return:
         """
-        # 保存原始的changes数据用于语言检测
-        original_changes_data = changes_data
-        
-        # 如果changes_text是列表格式，转换为diff格式
-        if isinstance(changes_text, list):
-            changes_text = self._convert_changes_to_diff_format(changes_text)
-        elif hasattr(changes_text, '__iter__') and not isinstance(changes_text, str):
-            # 处理其他可迭代对象
-            changes_text = self._convert_changes_to_diff_format(list(changes_text))
-        
-        # 如果changes为空,打印日志
-        if not changes_text:
-            logger.info("代码为空, diffs_text = %", str(changes_text))
-            return "代码为空"
+        # 如果changes_text是列表格式，由审查上下文转换为diff格式
+        raw_diff = None
+        if isinstance(changes_text, str):
+            raw_diff = changes_text
+        elif hasattr(changes_text, '__iter__'):
+            changes_data = list(changes_text)
+
+        context = self._build_context(changes_data if isinstance(changes_data, list) else [], commits_text,
+                                      review_time, raw_diff)
+        try:
+            return self._review_context(context)
+        finally:
+            # 输出本次审查的 LLM 调用汇总并写入共享统计
+            llm_metrics.flush()
 
+    @staticmethod
+    def _build_context(changes: list, commits_text: str, review_time: str = None, raw_diff: str = None) -> ReviewContext:
+        """创建审查上下文，未提供审查时间时使用当前时间"""
         # 生成当前时间作为默认值
         import datetime
         if not review_time:
@@ -309,98 +239,302 @@ class CodeReviewer(BaseReviewer):
             review_time = local_now.strftime('%Y年%m月%d日 %H:%M:%S')
             logger.info(f"审查时间未提供，使用当前时间: {review_time}")
 
-        # 在截断之前先进行语言检测，确保能正确识别文件类型
-        detected_language = self._detect_language_from_diff(changes_text)
-        logger.info(f"在截断前检测到的语言: {detected_language}")
-        
-        # 如果从diff中检测失败，尝试从changes数据中检测
-        if detected_language == 'default' and original_changes_data:
-            logger.info("从diff中检测语言失败，尝试从changes数据中检测")
-            detected_language = self._detect_language_from_changes(original_changes_data)
-            logger.info(f"从changes数据中检测到的语言: {detected_language}")
-        
         # 如果超长，取前REVIEW_MAX_TOKENS个token
         # MiniMax-M1 上下文窗口为 100万 tokens，建议设置为 750000-800000
-        review_max_tokens = int(os.getenv("REVIEW_MAX_TOKENS", 800000))
-        
-        # 计算tokens数量，如果超过REVIEW_MAX_TOKENS，截断changes_text
-        tokens_count = count_tokens(changes_text)
-        if tokens_count > review_max_tokens:
-            logger.info(f"代码过长，从 {tokens_count} tokens 截断到 {review_max_tokens} tokens")
-            changes_text = truncate_text_by_tokens(changes_text, review_max_tokens)
-            # 截断后再次检测语言，以防截断破坏了文件路径信息
-            truncated_language = self._detect_language_from_diff(changes_text)
-            logger.info(f"截断后检测到的语言: {truncated_language}")
-            # 如果截断后检测不到语言，使用截断前的检测结果
-            if truncated_language == 'default' and detected_language != 'default':
-                logger.info(f"截断后语言检测失败，使用截断前的检测结果: {detected_language}")
-                final_language = detected_language
-            else:
-                final_language = truncated_language
-        else:
-            final_language = detected_language
+        return ReviewContext(
+            changes=tuple(changes),
+            commits_text=commits_text,
+            review_time=review_time,
+            max_tokens=int(os.getenv("REVIEW_MAX_TOKENS", 800000)),
+            raw_diff=raw_diff,
+        )
+
+    def _review_context(self, context: ReviewContext) -> str:
+        """按审查上下文审查代码：diff 拼接、token 计数、截断和语言检测都只计算一次"""
+        # 如果changes为空,打印日志
+        if not context.diff_text:
+            logger.info(f"代码为空, diffs_text = {context.diff_text!r}")
+            return "代码为空"
+
+        changes_data = list(context.changes)
+        # 开启分片审查时，超出单片预算的变更按文件拆分并行审查，不再截断
+        if self._should_shard(changes_data, context.tokens_count):
+            return self._sharded_review(changes_data, context.commits_text, context.review_time)
+        if context.truncated:
+            logger.info(f"代码过长，从 {context.tokens_count} tokens 截断到 {context.max_tokens} tokens")
+        # 在截断前的完整 diff 上检测语言，覆盖全部文件
+        language = context.language
+        logger.info(f"检测到主要编程语言: {language}")
+
+        # 相同的变更集（重新打开的MR、无内容变化的rebase、cherry-pick）直接返回缓存的审查结果
+        review_cache = ReviewCache()
+        cache_key = self._review_cache_key(context.review_text, language)
+        cached_result = review_cache.get(cache_key)
+        if cached_result is not None:
+            return cached_result
 
         # 尝试审查代码，如果失败则使用降级策略
         try:
-            review_result = self.review_code(changes_text, commits_text, final_language, original_changes_data, review_time).strip()
-            # 过滤各种格式的thinking标签
-            review_result = review_result.replace('<thinking>', '').replace('</thinking>', '')
-            review_result = review_result.replace('<think>', '').replace('</think>', '')
-            review_result = review_result.replace('<thinking />', '')
-            review_result = review_result.replace('<think />', '')
-            
-            # 过滤纯文本形式的思考内容
-            # 查找常见的思考开头模式
-            thinking_patterns = [
-                '让我按照要求的格式提供详细的',
-                '审查要点：',
-                '由于代码非常简单，我需要：',
-                '让我分析变更的内容',
-                '让我按照要求的格式编写审查报告',
-                '让我分析一下这段代码',
-                '我来分析一下这个变更',
-                '让我仔细分析这段代码',
-                '我需要分析这个变更的合理性',
-                '让我评估这个变更的影响',
-                '现在我将按照要求的格式提供审查报告',
-                '让我开始分析这个代码变更',
-                '我将按照要求的格式提供详细的审查报告',
-                '首先，我需要分析变更的内容',
-                '让我分析一下这个变量重命名变更',
-                '现在我将分析这个变更的合理性和影响',
-                '让我按照审查要点进行分析',
-                '我将按照要求的格式编写详细的审查报告'
-            ]
-            
-            # 查找第一个真正的审查内容开始位置
-            # 通常审查报告以标题开始，如"# Vue3代码审查报告"或类似格式
-            import re
-            report_start_match = re.search(r'^\s*#\s+[\u4e00-\u9fa5\w]+审查报告', review_result, re.MULTILINE)
-            if report_start_match:
-                # 从报告标题开始截取
-                review_result = review_result[report_start_match.start():].strip()
-            elif any(pattern in review_result for pattern in thinking_patterns):
-                # 如果找到思考模式，尝试找到思考内容的结束位置
-                # 查找第一个可能的报告标题或列表开始
-                content_start_match = re.search(r'^\s*[#\d\*\-]+\s+', review_result, re.MULTILINE)
-                if content_start_match:
-                    review_result = review_result[content_start_match.start():].strip()
-            
-            if review_result.startswith("```markdown") and review_result.endswith("```"):
-                return review_result[11:-3].strip()
+            review_result = self.review_code(context.review_text, context.commits_text, language, changes_data,
+                                             context.review_time).strip()
+            review_result = normalize_output(review_result)
+            review_cache.put(cache_key, review_result)
             return review_result
         except Exception as e:
-            error_msg = str(e).lower()
             # 检查是否是上下文长度相关的错误
-            if any(keyword in error_msg for keyword in ['context_length', 'context length', 'too many tokens', 'exceed', 'maximum', 'limit']):
+            if self._is_context_overflow(e):
                 logger.warning(f"代码审查失败（上下文超限），尝试降级策略：{e}")
-                return self._fallback_review(original_changes_data, commits_text, review_time, final_language)
+                if self._should_shard(changes_data):
+                    return self._sharded_review(changes_data, context.commits_text, context.review_time)
+                return self._fallback_review(context)
             else:
                 # 其他错误，重新抛出
                 raise
 
+    @classmethod
+    def _is_context_overflow(cls, error: Exception) -> bool:
+        """是否为上下文超限错误；限流（429）重试耗尽后的错误直接抛出，不再发起降级调用"""
+        context = getattr(error, 'context', None)
+        if isinstance(context, dict) and context.get('status_code') == 429 or 'status_code=429' in str(error):
+            return False
+        error_msg = str(error).lower()
+        return any(keyword in error_msg for keyword in cls.CONTEXT_OVERFLOW_KEYWORDS)
+
+    @staticmethod
+    def _change_tokens(change) -> int:
+        """单个文件变更（含 diff 头）的 token 数，优先使用 filter_changes 预先计算的值"""
+        return change_tokens(change)
+
+    @staticmethod
+    def _should_shard(changes_data: list, tokens_count: int = None) -> bool:
+        """是否使用分片审查：需开启 REVIEW_SHARDING_ENABLED，且变更包含多个文件并超出单片 token 预算"""
+        if os.getenv("REVIEW_SHARDING_ENABLED", "0") != "1" or not isinstance(changes_data, list):
+            return False
+        if len([change for change in changes_data if isinstance(change, dict)]) < 2:
+            return False
+        return tokens_count is None or tokens_count > int(os.getenv("REVIEW_SHARD_MAX_TOKENS", 30000))
+
+    def _split_into_shards(self, changes_data: list, max_tokens: int) -> List[list]:
+        """按文件边界将 changes 拆分为不超过 max_tokens 的分片，单个文件超出预算时独占一个分片"""
+        shards = []
+        current_shard = []
+        current_tokens = 0
+        for change in changes_data:
+            if not isinstance(change, dict):
+                continue
+            file_tokens = self._change_tokens(change)
+            if current_shard and current_tokens + file_tokens > max_tokens:
+                shards.append(current_shard)
+                current_shard = []
+                current_tokens = 0
+            current_shard.append(change)
+            current_tokens += file_tokens
+        if current_shard:
+            shards.append(current_shard)
+        return shards
+
+    def _sharded_review(self, changes_data: list, commits_text: str, review_time: str) -> str:
+        """
+        分片并行审查（map-reduce）：按文件边界拆分为 token 受限的分片并发审查，
+        再通过一次 reduce 调用将各分片的审查结果合并为一份报告和总分
+        """
+        shard_max_tokens = int(os.getenv("REVIEW_SHARD_MAX_TOKENS", 30000))
+        concurrency = max(1, int(os.getenv("REVIEW_SHARD_CONCURRENCY", 4)))
+        shards = self._split_into_shards(changes_data, shard_max_tokens)
+        logger.info(f"分片审查：{len(changes_data)} 个文件拆分为 {len(shards)} 个分片，并发数 {concurrency}")
+
+        results = run_async(self._areview_shards(shards, commits_text, review_time, concurrency))
+
+        partial_reviews = []
+        failed_files = []
+        for index, (shard, result) in enumerate(zip(shards, results), start=1):
+            file_paths = [change.get('new_path') or change.get('old_path') or '' for change in shard]
+            if isinstance(result, Exception):
+                logger.error(f"分片 {index}/{len(shards)} 审查失败: {result}")
+                failed_files.extend(file_paths)
+            else:
+                partial_reviews.append((file_paths, result))
+
+        if not partial_reviews:
+            raise Exception(f"分片审查全部失败，共 {len(shards)} 个分片")
+
+        review_result = self._reduce_reviews(partial_reviews, commits_text, review_time)
+        if failed_files:
+            review_result += "\n\n---\n⚠️ **注意**：以下文件所在分片审查失败，未包含在本次审查中：\n"
+            review_result += "".join(f"- {file_path}\n" for file_path in failed_files)
+        return review_result
+
+    async def _areview_shards(self, shards: List[list], commits_text: str, review_time: str, concurrency: int) -> list:
+        """并发审查各分片，返回与分片一一对应的审查结果或异常"""
+        semaphore = asyncio.Semaphore(concurrency)
+        review_cache = ReviewCache()
+        review_max_tokens = int(os.getenv("REVIEW_MAX_TOKENS", 800000))
+
+        async def review_shard(shard: list) -> str:
+            diffs_text = self._convert_changes_to_diff_format(shard)
+            tokens_count, truncated_text = count_and_truncate(diffs_text, review_max_tokens)
+            if tokens_count > review_max_tokens:
+                logger.warning(f"分片超出 REVIEW_MAX_TOKENS，截断到 {review_max_tokens} tokens")
+                diffs_text = truncated_text
+            language = self._detect_language_from_changes(shard)
+            cache_key = self._review_cache_key(diffs_text, language)
+            cached_result = review_cache.get(cache_key)
+            if cached_result is not None:
+                return cached_result
+            messages = self._build_review_messages(diffs_text, commits_text, language, shard, review_time)
+            async with semaphore:
+                review_result = normalize_output((await self.acall_llm(messages)).strip())
+            review_cache.put(cache_key, review_result)
+            return review_result
+
+        return await asyncio.gather(*(review_shard(shard) for shard in shards), return_exceptions=True)
+
+    def _reduce_reviews(self, partial_reviews: list, commits_text: str, review_time: str) -> str:
+        """合并各分片的审查结果；reduce 调用失败时直接拼接分片结果，总分取各分片平均分"""
+        if len(partial_reviews) == 1:
+            return partial_reviews[0][1]
+        partial_text = "\n\n".join(
+            f"### 分片 {index}（{', '.join(file_paths)}）\n\n{review}"
+            for index, (file_paths, review) in enumerate(partial_reviews, start=1))
+        try:
+            prompts = self._load_language_specific_prompts("code_review_reduce_prompt",
+                                                           os.getenv("REVIEW_STYLE", "professional"))
+            prompt_vars = {
+                'partial_reviews': partial_text,
+                'diffs_text': partial_text,
+                'commits_text': commits_text,
+                'review_time': review_time or '未知时间'
+            }
+            messages = self._build_messages(prompts, prompt_vars)
+            return normalize_output(self.call_llm(messages).strip())
+        except Exception as e:
+            logger.error(f"分片审查结果合并失败，直接拼接各分片结果: {e}")
+            parsed_reviews = [(file_paths, self.parse_review(review)) for file_paths, review in partial_reviews]
+            scores = [parsed.score for _, parsed in parsed_reviews if parsed.score is not None]
+            partial_text = "\n\n".join(
+                f"### 分片 {index}（{', '.join(file_paths)}）\n\n{parsed.markdown}"
+                for index, (file_paths, parsed) in enumerate(parsed_reviews, start=1))
+            if not scores:
+                # 各分片都没有解析出总分时不输出总分，避免记为 0 分
+                return partial_text
+            return f"总分：{round(sum(scores) / len(scores))}分\n\n{partial_text}"
+
+    def _review_cache_key(self, diffs_text: str, language: str = None) -> str:
+        """计算审查结果的内容寻址键：归一化 diff + 提示词 + 审查风格 + 模型 + 是否结构化输出"""
+        return ReviewCache.build_key(diffs_text, self._get_appropriate_prompt(diffs_text, language),
+                                     os.getenv("REVIEW_STYLE", "professional"),
+                                     f"{os.getenv('LLM_PROVIDER', 'openai')}:{getattr(self.client, 'default_model', '')}",
+                                     os.getenv("REVIEW_STRUCTURED_OUTPUT_ENABLED", "0") == "1")
+
+    def review_changes_incrementally(self, changes: list, commits_text: str, review_scope: str,
+                                     review_time: str = None) -> str:
+        """
+        MR/PR 文件级增量审查：记录每个文件的审查结果，MR 更新时只把 diff 发生变化的文件发送给 LLM，
+        未变化的文件复用上次的审查结果，最终合并为一份报告，综合总分按文件修改行数加权。
+        需要审查的文件各自一次 LLM 调用，按 REVIEW_SHARD_CONCURRENCY 并发审查。
+        未开启 REVIEW_INCREMENTAL_ENABLED 时与 review_and_strip_code 行为一致。
+        :param review_scope: 审查范围标识，如 url_slug:项目:mr:编号
+        """
+        if os.getenv("REVIEW_INCREMENTAL_ENABLED", "0") != "1" or not changes:
+            return self.review_and_strip_code(changes, commits_text, changes, review_time)
+        try:
+            return self._review_changes_incrementally(changes, commits_text, review_scope, review_time)
+        finally:
+            llm_metrics.flush()
+
+    def _review_changes_incrementally(self, changes: list, commits_text: str, review_scope: str,
+                                      review_time: str = None) -> str:
+        store = FileReviewStore()
+        previous_reviews = store.get_file_reviews(review_scope)
+        file_changes = {}
+        diff_hashes = {}
+        for change in changes:
+            file_path = change.get('new_path') or change.get('old_path') or ''
+            file_changes[file_path] = change
+            diff_hashes[file_path] = self._review_cache_key(change_to_diff(change) or '',
+                                                            detect_language_from_paths([file_path]))
+
+        # 每个文件单独保存审查结果，diff 未变化的文件复用自己上次的结果
+        file_reviews = {file_path: previous_reviews[file_path] for file_path in file_changes
+                        if file_path in previous_reviews and previous_reviews[file_path][0] == diff_hashes[file_path]}
+        reused_paths = set(file_reviews)
+
+        # 变化的文件各自审查，按 REVIEW_SHARD_CONCURRENCY 并发
+        pending_paths = [file_path for file_path in file_changes if file_path not in reused_paths]
+        concurrency = max(1, int(os.getenv("REVIEW_SHARD_CONCURRENCY", 4)))
+        results = run_async(self._areview_shards([[file_changes[file_path]] for file_path in pending_paths],
+                                                 commits_text, review_time, concurrency)) if pending_paths else []
+        reviewed_paths = []
+        failed_files = []
+        for file_path, result in zip(pending_paths, results):
+            if isinstance(result, Exception):
+                # 失败的文件不保存，下次更新时重新审查
+                logger.error(f"增量审查文件 {file_path} 审查失败: {result}")
+                failed_files.append(file_path)
+                continue
+            file_reviews[file_path] = (diff_hashes[file_path], result, self.parse_review(result).score)
+            reviewed_paths.append(file_path)
+        if not file_reviews:
+            raise Exception(f"增量审查全部失败，共 {len(pending_paths)} 个文件")
+
+        store.save_file_reviews(review_scope, file_reviews)
+        logger.info(f"增量审查 {review_scope}: 重新审查 {len(reviewed_paths)} 个文件，"
+                    f"复用 {len(reused_paths)} 个文件的历史审查结果")
+
+        weighted_score = 0
+        total_weight = 0
+        dimension_totals = {}
+        issues = []
+        sections = []
+        any_structured = False
+        for file_path, change in file_changes.items():
+            if file_path not in file_reviews:
+                continue
+            _, review_result, score = file_reviews[file_path]
+            parsed = self.parse_review(review_result)
+            any_structured = any_structured or parsed.structured
+            weight = max(1, change.get('additions', 0) + change.get('deletions', 0))
+            if score is not None:
+                # 未解析出总分的结果不参与加权平均
+                weighted_score += score * weight
+                total_weight += weight
+            for dimension, dimension_score in parsed.dimension_scores.items():
+                if isinstance(dimension_score, (int, float)):
+                    totals = dimension_totals.setdefault(dimension, [0, 0])
+                    totals[0] += dimension_score * weight
+                    totals[1] += weight
+            issues.extend({**issue, 'file': file_path} for issue in parsed.issues)
+            status = "未变化，复用上次结果" if file_path in reused_paths else "本次审查"
+            sections.append(f"---\n## 📄 {file_path}（{status}）\n\n{parsed.markdown}")
+
+        # 综合总分放在报告开头，parse_review 取第一个匹配的总分；所有结果都没有总分时不输出
+        total_score = round(weighted_score / total_weight) if total_weight else None
+        sections[:0] = [
+            f"> 本次重新审查 **{len(reviewed_paths)}** 个文件，"
+            f"复用 **{len(reused_paths)}** 个未变化文件的历史审查结果。",
+        ]
+        if total_score is not None:
+            sections.insert(0, f"综合总分：{total_score}分")
+        if failed_files:
+            sections.append("---\n⚠️ **注意**：以下文件审查失败，未包含在本次审查中：\n"
+                            + "".join(f"- {file_path}\n" for file_path in failed_files))
+        if any_structured:
+            # 各文件的结构化结果合并为一份：总分与各维度得分按修改行数加权，问题列表合并
+            summary = {
+                'score': total_score,
+                'dimensions': {dimension: round(total / weight)
+                               for dimension, (total, weight) in dimension_totals.items()},
+                'issues': issues,
+            }
+            sections.append(f"```json\n{json.dumps(summary, ensure_ascii=False)}\n```")
+        return "\n\n".join(sections)
+
     def review_code(self, diffs_text: str, commits_text: str = "", pre_detected_language: str = None, changes_data: list = None, review_time: str = None) -> str:
         """Review 代码并返回结果"""
+        return self.call_llm(self._build_review_messages(diffs_text, commits_text, pre_detected_language, changes_data, review_time))
+
+    def _build_review_messages(self, diffs_text: str, commits_text: str = "", pre_detected_language: str = None, changes_data: list = None, review_time: str = None) -> List[Dict[str, Any]]:
+        """选择提示词并构建审查请求的 messages"""
         # review_time 来自webhook的metadata，通过review_and_strip_code方法传递过来，此处直接使用
         
         # 智能选择提示词
@@ -420,13 +554,10 @@ class CodeReviewer(BaseReviewer):
                 logger.info(f"从changes数据中检测到的语言: {detected_lang}")
         
         # 使用_get_appropriate_prompt方法获取正确的提示词，确保Vue文件使用Vue3模板
-        prompt_key = self._get_appropriate_prompt(diffs_text)
+        prompt_key = self._get_appropriate_prompt(diffs_text, detected_lang)
         style = os.getenv("REVIEW_STYLE", "professional")
         
-        logger.info(f"检测到的语言对应的提示词: {prompt_key}")
-        logger.info(f"当前审查风格: {style}")
-        logger.info(f"可用的语言提示词映射: {self.language_prompts}")
-        logger.info(f"审查时间: {review_time}")
+        logger.info(f"检测到的语言对应的提示词: {prompt_key}, 审查风格: {style}, 审查时间: {review_time}")
         
         # 加载对应的提示词
         if prompt_key != "code_review_prompt":
@@ -452,91 +583,145 @@ class CodeReviewer(BaseReviewer):
             'review_time': review_time or '未知时间'
         }
         
-        messages = [
-            prompts["system_message"],
-            {
-                "role": "user",
-                "content": prompts["user_message"]["content"].format(**prompt_vars),
-            },
-        ]
-        return self.call_llm(messages)
+        messages = self._build_messages(prompts, prompt_vars)
+        return messages
 
-    def _fallback_review(self, changes_data: list, commits_text: str, review_time: str, language: str = None) -> str:
+    def _fallback_review(self, context: ReviewContext) -> str:
         """
         降级审查策略：当代码过长导致上下文超限时使用
-        策略：只审查修改最多的前N个文件，逐步减少直到成功
+        策略：按文件 token 数和优先级一次性选出预算内价值最高的文件子集，只调用一次 LLM
         """
-        import math
-        
         logger.info("执行降级审查策略...")
         
-        if not changes_data or not isinstance(changes_data, list):
+        changes_data = list(context.changes)
+        if not changes_data:
             return "无法进行代码审查：没有可审查的代码变更"
         
-        # 计算安全的内容限制（保留一定余量）
-        safety_margin = 0.8
-        base_max_tokens = 15000 * safety_margin
-        fallback_max_tokens = int(base_max_tokens)
+        fallback_max_tokens = self._fallback_token_budget(context)
         
-        # 按修改行数排序（additions + deletions），优先审查修改最多的文件
-        def get_change_priority(change):
-            if isinstance(change, dict):
-                additions = change.get('additions', 0)
-                deletions = change.get('deletions', 0)
-                return additions + deletions
-            return 0
+        selected_changes, skipped_changes = self._select_changes_within_budget(changes_data, fallback_max_tokens,
+                                                                               context.file_tokens)
+        total_churn = sum(self._change_churn(change) for change in changes_data)
+        if not selected_changes:
+            return f"❌ 代码审查失败：代码变更过多，即使只审查单个文件也超出模型上下文限制。建议分批提交代码进行审查。\n\n**统计信息**：\n- 总文件数：{len(changes_data)}\n- 总修改行数：{total_churn}"
         
-        sorted_changes = sorted(changes_data, key=get_change_priority, reverse=True)
+        num_files = len(selected_changes)
+        # 复用上下文中已拼接的单文件 diff，单个文件超出预算时截断
+        fallback_context = context.subset(selected_changes)
+        fallback_diff = count_and_truncate(fallback_context.diff_text, fallback_max_tokens)[1]
+        logger.info(f"降级策略：审查 {num_files}/{len(changes_data)} 个文件，"
+                    f"tokens {sum(fallback_context.file_tokens)}/{fallback_max_tokens}")
         
-        # 逐步减少文件数量进行尝试
-        max_retries = 5
-        for attempt in range(max_retries):
-            # 选择前N个修改最多的文件
-            num_files = max(1, len(sorted_changes) - attempt)
-            selected_changes = sorted_changes[:num_files]
-            
-            logger.info(f"降级策略尝试 {attempt + 1}/{max_retries}: 审查 {num_files}/{len(sorted_changes)} 个文件")
-            
-            # 转换选中的changes为diff格式
-            fallback_diff = self._convert_changes_to_diff_format(selected_changes)
-            tokens_count = count_tokens(fallback_diff)
-            
-            if tokens_count > fallback_max_tokens:
-                logger.info(f"降级策略：tokens ({tokens_count}) 仍然超出限制，继续减少文件数量")
-                continue
-            
-            try:
-                # 使用简化版提示词进行审查
-                review_result = self._simple_review(fallback_diff, commits_text, review_time, language)
-                
-                # 添加降级说明
-                if num_files < len(sorted_changes):
-                    fallback_note = f"""
+        try:
+            # 使用简化版提示词进行审查
+            review_result = self._simple_review(fallback_diff, context.commits_text, context.review_time,
+                                                context.language)
+        except Exception as e:
+            if self._is_context_overflow(e):
+                logger.warning(f"降级策略失败：{e}")
+                return f"❌ 代码审查失败：代码变更过多，即使只审查部分文件也超出模型上下文限制。建议分批提交代码进行审查。\n\n**统计信息**：\n- 总文件数：{len(changes_data)}\n- 总修改行数：{total_churn}"
+            raise
+        
+        # 添加降级说明
+        if skipped_changes:
+            fallback_note = f"""
 ---
-⚠️ **注意**：由于代码变更过多，此审查仅包含 **{num_files}** 个修改最多的文件（共 **{len(sorted_changes)}** 个文件）。
+⚠️ **注意**：由于代码变更过多，此审查仅包含 **{num_files}** 个优先级最高的文件（共 **{len(changes_data)}** 个文件）。
 
 未审查的文件：
 """
-                    for i, change in enumerate(sorted_changes[num_files:], start=num_files+1):
-                        if isinstance(change, dict):
-                            file_path = change.get('new_path', change.get('old_path', f'文件#{i}'))
-                            fallback_note += f"- {file_path}\n"
-                    
-                    review_result = review_result + fallback_note
-                
-                logger.info(f"降级审查成功：审查了 {num_files} 个文件")
-                return review_result
-                
-            except Exception as e:
-                error_msg = str(e).lower()
-                if any(keyword in error_msg for keyword in ['context_length', 'context length', 'too many tokens', 'exceed', 'maximum', 'limit']):
-                    logger.warning(f"降级策略失败（尝试 {attempt + 1}）：{e}")
-                    continue
-                else:
-                    raise
+            for i, change in enumerate(skipped_changes, start=1):
+                if isinstance(change, dict):
+                    file_path = change.get('new_path', change.get('old_path', f'文件#{i}'))
+                    fallback_note += f"- {file_path}\n"
+            
+            review_result = review_result + fallback_note
         
-        # 所有降级策略都失败，返回错误信息
-        return f"❌ 代码审查失败：代码变更过多，即使只审查修改最多的文件也超出模型上下文限制。建议分批提交代码进行审查。\n\n**统计信息**：\n- 总文件数：{len(sorted_changes)}\n- 总修改行数：{sum(get_change_priority(c) for c in sorted_changes)}"
+        logger.info(f"降级审查成功：审查了 {num_files} 个文件")
+        return review_result
+
+    def _fallback_token_budget(self, context: ReviewContext) -> int:
+        """
+        降级审查的 token 预算：取 REVIEW_MAX_TOKENS、模型上下文窗口和本次超限请求的 token 数中的最小值，再乘以安全系数。
+        上下文窗口优先使用 LLM_CONTEXT_WINDOW，否则按供应商默认值，配置了备用供应商时取其中最小的窗口
+        """
+        limits = [context.max_tokens, min(context.tokens_count, context.max_tokens)]
+        context_window = int(os.getenv("LLM_CONTEXT_WINDOW", 0))
+        if context_window <= 0:
+            providers = [os.getenv("LLM_PROVIDER", "openai")] + os.getenv("LLM_FALLBACK_PROVIDERS", "").split(',')
+            context_window = min((self.PROVIDER_CONTEXT_WINDOWS[provider.strip()] for provider in providers
+                                  if provider.strip() in self.PROVIDER_CONTEXT_WINDOWS), default=0)
+        if context_window > 0:
+            limits.append(context_window)
+        return max(1, int(min(limits) * self.FALLBACK_SAFETY_MARGIN))
+
+    @staticmethod
+    def _change_churn(change) -> int:
+        """文件的修改行数（additions + deletions）"""
+        if isinstance(change, dict):
+            return change.get('additions', 0) + change.get('deletions', 0)
+        return 0
+
+    def _change_priority(self, change) -> float:
+        """文件的审查优先级：修改行数 × 语言权重 × 路径权重"""
+        if not isinstance(change, dict):
+            return 0.0
+        file_path = (change.get('new_path') or change.get('old_path') or '').lower()
+        ext = os.path.splitext(file_path)[1]
+        language_weight = 1.0 if ext in self.SOURCE_FILE_EXTENSIONS else 0.5
+        path_weight = 1.0
+        for pattern, weight in self.PATH_WEIGHTS:
+            if pattern.search(file_path):
+                path_weight = min(path_weight, weight)
+        return max(1, self._change_churn(change)) * language_weight * path_weight
+
+    def _select_changes_within_budget(self, changes_data: list, max_tokens: int, file_tokens=None) -> tuple:
+        """
+        0/1 背包选择：在 max_tokens 预算内选出优先级总和最大的文件子集。
+        token 数按预算量化到最多 FALLBACK_BUDGET_STEPS 个单位（向上取整，保证结果不超预算），
+        复杂度为 O(文件数 × FALLBACK_BUDGET_STEPS)。
+
+        :param file_tokens: 与 changes_data 一一对应的 token 数，未提供时逐个计算
+        :return: (选中的文件列表, 跳过的文件列表)，选中的文件按优先级从高到低排列
+        """
+        unit = max(1, -(-max_tokens // self.FALLBACK_BUDGET_STEPS))
+        capacity = max_tokens // unit
+        if file_tokens is None:
+            file_tokens = [self._change_tokens(change) for change in changes_data]
+        items = [(change, -(-tokens // unit), self._change_priority(change))
+                 for change, tokens in zip(changes_data, file_tokens)]
+
+        best = [0.0] * (capacity + 1)
+        taken = []
+        for _, weight, value in items:
+            row = bytearray(capacity + 1)
+            if weight <= capacity:
+                for budget in range(capacity, weight - 1, -1):
+                    candidate = best[budget - weight] + value
+                    if candidate > best[budget]:
+                        best[budget] = candidate
+                        row[budget] = 1
+            taken.append(row)
+
+        selected, skipped = [], []
+        budget = capacity
+        for index in range(len(items) - 1, -1, -1):
+            change, weight, _ = items[index]
+            if taken[index][budget]:
+                selected.append(change)
+                budget -= weight
+            else:
+                skipped.append(change)
+
+        if not selected and items:
+            # 单个文件就超出预算：只审查优先级最高的文件，由调用方截断
+            top = max(items, key=lambda item: item[2])[0]
+            selected = [top]
+            skipped = [change for change in changes_data if change is not top]
+
+        selected.sort(key=self._change_priority, reverse=True)
+        skipped.sort(key=self._change_priority, reverse=True)
+        return selected, skipped
 
     def _simple_review(self, diffs_text: str, commits_text: str, review_time: str, language: str = None) -> str:
         """
@@ -545,7 +730,7 @@ class CodeReviewer(BaseReviewer):
         # 加载简化版提示词
         style = os.getenv("REVIEW_STYLE", "professional")
         # 使用_get_appropriate_prompt方法获取正确的提示词，确保Vue文件使用Vue3模板
-        prompt_key = self._get_appropriate_prompt(diffs_text)
+        prompt_key = self._get_appropriate_prompt(diffs_text, language)
         
         try:
             prompts = self._load_language_specific_prompts(prompt_key, style)
@@ -559,108 +744,52 @@ class CodeReviewer(BaseReviewer):
             'review_time': review_time or '未知时间'
         }
         
-        messages = [
-            prompts["system_message"],
-            {
-                "role": "user",
-                "content": prompts["user_message"]["content"].format(**prompt_vars),
-            },
-        ]
-        
-        result = self.call_llm(messages)
-        # 过滤各种格式的thinking标签
-        result = result.replace('<thinking>', '').replace('</thinking>', '')
-        result = result.replace('<think>', '').replace('</think>', '')
-        result = result.replace('<thinking />', '')
-        result = result.replace('<think />', '')
+        messages = self._build_messages(prompts, prompt_vars)
         
-        # 过滤纯文本形式的思考内容
-        # 查找常见的思考开头模式
-        thinking_patterns = [
-            '让我按照要求的格式提供详细的',
-            '审查要点：',
-            '由于代码非常简单，我需要：',
-            '让我分析变更的内容',
-            '让我按照要求的格式编写审查报告',
-            '让我分析一下这段代码',
-            '我来分析一下这个变更',
-            '让我仔细分析这段代码',
-            '我需要分析这个变更的合理性',
-            '让我评估这个变更的影响',
-            '现在我将按照要求的格式提供审查报告',
-            '让我开始分析这个代码变更',
-            '我将按照要求的格式提供详细的审查报告',
-            '首先，我需要分析变更的内容',
-            '让我分析一下这个变量重命名变更',
-            '现在我将分析这个变更的合理性和影响',
-            '让我按照审查要点进行分析',
-            '我将按照要求的格式编写详细的审查报告'
-        ]
-        
-        # 查找第一个真正的审查内容开始位置
-        # 通常审查报告以标题开始，如"# Vue3代码审查报告"或类似格式
-        import re
-        report_start_match = re.search(r'^\s*#\s+[\u4e00-\u9fa5\w]+审查报告', result, re.MULTILINE)
-        if report_start_match:
-            # 从报告标题开始截取
-            result = result[report_start_match.start():].strip()
-        elif any(pattern in result for pattern in thinking_patterns):
-            # 如果找到思考模式，尝试找到思考内容的结束位置
-            # 查找第一个可能的报告标题或列表开始
-            content_start_match = re.search(r'^\s*[#\d\*\-]+\s+', result, re.MULTILINE)
-            if content_start_match:
-                result = result[content_start_match.start():].strip()
-        
-        if result.startswith("```markdown") and result.endswith("```"):
-            return result[11:-3].strip()
-        return result
+        return normalize_output(self.call_llm(messages))
 
     def _detect_language_from_changes(self, changes_data: list) -> str:
         """从changes数据中检测主要编程语言"""
-        file_extensions = {
-            '.py': 'python',
-            '.js': 'javascript',
-            '.ts': 'typescript',
-            '.jsx': 'javascript',
-            '.tsx': 'typescript',
-            '.vue': 'vue',
-            '.java': 'java',
-            '.go': 'go',
-            '.php': 'php',
-            '.cpp': 'cpp',
-            '.cc': 'cpp',
-            '.cxx': 'cpp',
-            '.c': 'c',
-            '.h': 'cpp',
-            '.hpp': 'cpp',
-        }
-        
-        language_counts = {}
-        
-        for change in changes_data:
-            if isinstance(change, dict):
-                # 尝试从new_path获取文件路径
-                file_path = change.get('new_path') or change.get('old_path')
-                if file_path:
-                    ext = os.path.splitext(file_path)[1].lower()
-                    if ext in file_extensions:
-                        lang = file_extensions[ext]
-                        language_counts[lang] = language_counts.get(lang, 0) + 1
-                        logger.info(f"从changes数据检测到文件: {file_path}, 扩展名: {ext}, 语言: {lang}")
-        
-        if language_counts:
-            primary_language = max(language_counts, key=language_counts.get)
-            logger.info(f"从changes数据检测到主要编程语言: {primary_language}")
-            return primary_language
-        
-        logger.info("从changes数据中未检测到特定编程语言")
-        return 'default'
+        language = detect_language_from_paths(
+            change.get('new_path') or change.get('old_path')
+            for change in changes_data
+            if isinstance(change, dict) and (change.get('new_path') or change.get('old_path'))
+        )
+        logger.info(f"从changes数据检测到主要编程语言: {language}")
+        return language
+
+    @staticmethod
+    def parse_review(review_text: str) -> ParsedReview:
+        """
+        解析 AI 返回的 Review 结果（只解析一次）：优先使用末尾的 ```json 结构化结果，
+        其中没有总分时从"总分：XX分"中解析，都没有时总分为 None。
+        """
+        markdown, data = extract_json_block(review_text or '')
+        if data is None or not {'score', 'dimensions', 'issues'} & data.keys():
+            # 没有结构化结果，末尾的 json 代码块属于报告正文（如示例代码）
+            markdown = review_text or ''
+            data = None
+        try:
+            score = int(data.get('score')) if data is not None else None
+        except (TypeError, ValueError):
+            score = None
+        if score is None:
+            match = re.search(r"总分[:：]\s*(\d+)分?", markdown)
+            score = int(match.group(1)) if match else None
+        if data is None:
+            return ParsedReview(markdown=markdown, score=score)
+        dimensions = data.get('dimensions')
+        issues = data.get('issues')
+        return ParsedReview(
+            markdown=markdown,
+            score=max(0, min(100, score)) if score is not None else None,
+            dimension_scores=dimensions if isinstance(dimensions, dict) else {},
+            issues=[issue for issue in issues if isinstance(issue, dict)] if isinstance(issues, list) else [],
+            structured=True,
+        )
 
     @staticmethod
     def parse_review_score(review_text: str) -> int:
-        """解析 AI 返回的 Review 结果，返回评分"""
-        if not review_text:
-            return 0
-        match = re.search(r"总分[:：]\s*(\d+)分?", review_text)
-        return int(match.group(1)) if match else 0
+        """解析 AI 返回的 Review 结果，返回评分，未解析出评分时返回 0"""
+        return CodeReviewer.parse_review(review_text).score or 0
 
@@ -2,6 +2,7 @@ import os
 
 from dotenv import load_dotenv
 
+from src.llm.client.pool import run_async
 from src.llm.factory import Factory
 from src.utils.log import logger
 
@@ -58,9 +59,9 @@ def check_llm_provider():
         logger.info(f"LLM 供应商 {llm_provider} 的配置项已设置。")
 
 def check_llm_connectivity():
-    client = Factory().getClient()
+    client = Factory.getClient()
     logger.info(f"正在检查 LLM 供应商的连接...")
-    if client.ping():
+    if run_async(client.aping()):
         logger.info("LLM 可以连接成功。")
     else:
         logger.error("LLM连接可能有问题，请检查配置项。")
@@ -0,0 +1,154 @@
+import os
+import sqlite3
+import time
+
+from src.utils.log import logger
+
+# 各平台用于标识一次投递的请求头（平台超时重试时保持不变）
+DELIVERY_ID_HEADERS = [
+    'X-Gitea-Delivery',
+    'X-Gogs-Delivery',
+    'X-GitHub-Delivery',
+    'Idempotency-Key',
+    'X-Gitlab-Event-UUID',
+]
+
+# 会触发审查的 MR/PR action
+REVIEWABLE_ACTIONS = {'open', 'update', 'opened', 'synchronize', 'reopened', 'reopen'}
+
+
+def get_delivery_id(headers) -> str:
+    """从请求头中获取投递ID，没有则返回 None"""
+    for header in DELIVERY_ID_HEADERS:
+        value = headers.get(header)
+        if value:
+            return value
+    return None
+
+
+def event_scope(data: dict) -> tuple:
+    """
+    解析事件作用范围：(项目, MR/PR 编号或分支, action)，无法识别时返回 None
+    兼容 GitLab / GitHub / Gitea 的 webhook 数据格式
+    """
+    project = (data.get('project') or {}).get('id') or (data.get('repository') or {}).get('full_name')
+    if not project:
+        return None
+    if data.get('object_kind') == 'merge_request':
+        attributes = data.get('object_attributes') or {}
+        return project, f"mr:{attributes.get('iid')}", attributes.get('action')
+    if 'pull_request' in data:
+        return project, f"mr:{(data.get('pull_request') or {}).get('number')}", data.get('action')
+    if data.get('ref', '').startswith('refs/heads/'):
+        return project, f"push:{data['ref']}", 'push'
+    return None
+
+
+def _head_sha(data: dict) -> str:
+    if data.get('object_kind') == 'merge_request':
+        return ((data.get('object_attributes') or {}).get('last_commit') or {}).get('id')
+    if 'pull_request' in data:
+        return ((data.get('pull_request') or {}).get('head') or {}).get('sha')
+    return data.get('after') or data.get('checkout_sha')
+
+
+class DeliveryDeduplicator:
+    """
+    Webhook 幂等去重：按投递ID以及 (项目, MR/分支, head SHA) 建立带 TTL 的索引，
+    Git 平台重试或重复投递的事件直接返回，不再重新审查。
+    rq 模式使用 Redis 存储索引，async 模式使用本地 SQLite。
+    """
+    DB_FILE = "data/queue.db"
+
+    def __init__(self, queue_driver: str = None):
+        self.queue_driver = queue_driver or os.getenv('QUEUE_DRIVER', 'async')
+        self.ttl = int(os.getenv('WEBHOOK_DEDUP_TTL', 86400))
+        self.db_file = os.getenv('QUEUE_DB_FILE', DeliveryDeduplicator.DB_FILE)
+        self._redis = None
+        if self.queue_driver != 'rq':
+            self.init_db()
+
+    def init_db(self):
+        """初始化数据库及表结构"""
+        try:
+            os.makedirs(os.path.dirname(self.db_file) or '.', exist_ok=True)
+            with sqlite3.connect(self.db_file, timeout=30) as conn:
+                conn.execute('''
+                        CREATE TABLE IF NOT EXISTS webhook_delivery (
+                            dedup_key TEXT PRIMARY KEY,
+                            expires_at INTEGER
+                        )
+                    ''')
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"Webhook dedup database initialization failed: {e}")
+
+    def build_keys(self, delivery_id: str, data: dict, url_slug: str) -> list:
+        keys = []
+        if delivery_id:
+            keys.append(f"delivery:{url_slug}:{delivery_id}")
+        scope = event_scope(data)
+        head_sha = _head_sha(data)
+        # 只对会触发审查的事件按 head SHA 去重，close/merge 等事件不受影响
+        if scope and head_sha and (scope[2] in REVIEWABLE_ACTIONS or scope[2] == 'push'):
+            project, target, _ = scope
+            keys.append(f"event:{url_slug}:{project}:{target}:{head_sha}")
+        return keys
+
+    def claim(self, keys: list) -> bool:
+        """
+        登记去重键，任一键已存在（未过期）则视为重复投递，返回 False
+        """
+        if not keys or self.ttl <= 0:
+            return True
+        if self.queue_driver == 'rq':
+            return self._claim_redis(keys)
+        return self._claim_sqlite(keys)
+
+    def release(self, keys: list):
+        """入队失败时撤销登记，保证平台重试时可以正常处理"""
+        if not keys or self.ttl <= 0:
+            return
+        try:
+            if self.queue_driver == 'rq':
+                self._get_redis().delete(*[f"webhook_dedup:{key}" for key in keys])
+            else:
+                with sqlite3.connect(self.db_file, timeout=30) as conn:
+                    conn.executemany('DELETE FROM webhook_delivery WHERE dedup_key = ?', [(key,) for key in keys])
+                    conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to release webhook dedup keys {keys}: {e}")
+
+    def _get_redis(self):
+        if self._redis is None:
+            from redis import Redis
+            self._redis = Redis(os.getenv('REDIS_HOST', '127.0.0.1'), os.getenv('REDIS_PORT', 6379))
+        return self._redis
+
+    def _claim_redis(self, keys: list) -> bool:
+        redis = self._get_redis()
+        claimed = []
+        for key in keys:
+            if not redis.set(f"webhook_dedup:{key}", 1, nx=True, ex=self.ttl):
+                logger.info(f"Duplicate webhook delivery detected: {key}")
+                if claimed:
+                    redis.delete(*claimed)
+                return False
+            claimed.append(f"webhook_dedup:{key}")
+        return True
+
+    def _claim_sqlite(self, keys: list) -> bool:
+        now = int(time.time())
+        with sqlite3.connect(self.db_file, timeout=30, isolation_level='IMMEDIATE') as conn:
+            conn.execute('DELETE FROM webhook_delivery WHERE expires_at < ?', (now,))
+            placeholders = ','.join(['?'] * len(keys))
+            existing = conn.execute(f'SELECT dedup_key FROM webhook_delivery WHERE dedup_key IN ({placeholders})',
+                                    keys).fetchall()
+            if existing:
+                logger.info(f"Duplicate webhook delivery detected: {[row[0] for row in existing]}")
+                conn.rollback()
+                return False
+            conn.executemany('INSERT INTO webhook_delivery (dedup_key, expires_at) VALUES (?, ?)',
+                             [(key, now + self.ttl) for key in keys])
+            conn.commit()
+        return True
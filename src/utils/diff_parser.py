@@ -0,0 +1,229 @@
+import codecs
+import re
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Optional, Union
+
+# @@ -旧起始行[,旧行数] +新起始行[,新行数] @@
+HUNK_HEADER_PATTERN = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+
+@dataclass
+class FileDiff:
+    """unified diff 中单个文件的变更记录"""
+    # 新增文件的 old_path、删除文件的 new_path 为 None
+    old_path: Optional[str] = None
+    new_path: Optional[str] = None
+    # diff --git / index / mode / --- / +++ 等头部行
+    header: List[str] = field(default_factory=list)
+    # 每个 hunk 的文本（以 @@ 行开头）
+    hunks: List[str] = field(default_factory=list)
+    additions: int = 0
+    deletions: int = 0
+    is_binary: bool = False
+    new_file: bool = False
+    deleted_file: bool = False
+    renamed: bool = False
+
+    @property
+    def path(self) -> Optional[str]:
+        return self.new_path or self.old_path
+
+    @property
+    def diff(self) -> str:
+        """该文件完整的 diff 文本（头部 + 所有 hunk）"""
+        return '\n'.join(self.header + self.hunks)
+
+    @property
+    def hunks_text(self) -> str:
+        """不含头部的 diff 文本（GitLab changes API 的格式）"""
+        return '\n'.join(self.hunks)
+
+
+def _iter_lines(source) -> Iterator[str]:
+    """
+    按行读取 diff：source 可以是字符串、文件对象或文本/字节块的迭代器（如 response.iter_content()），
+    块可以在任意位置截断。字符串不会被整体拆分成行列表，避免同时持有两份全文。
+    """
+    if isinstance(source, (str, bytes)):
+        source = (source,)
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    remainder = ''
+    for chunk in source:
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        buffer = remainder + chunk if remainder else chunk
+        start = 0
+        while True:
+            end = buffer.find('\n', start)
+            if end < 0:
+                break
+            yield buffer[start:end].rstrip('\r')
+            start = end + 1
+        remainder = buffer[start:]
+    remainder += decoder.decode(b'', final=True)
+    if remainder:
+        yield remainder.rstrip('\r')
+
+
+def _strip_prefix(path: str) -> Optional[str]:
+    """去掉 ---/+++ 行中路径的 a/ b/ 前缀和时间戳，/dev/null 返回 None"""
+    path = path.split('\t', 1)[0]
+    if len(path) >= 2 and path[0] == '"' and path[-1] == '"':
+        path = path[1:-1]
+    if path == '/dev/null':
+        return None
+    if path[:2] in ('a/', 'b/'):
+        return path[2:]
+    return path
+
+
+def _parse_git_header(line: str):
+    """解析 "diff --git a/X b/Y"，路径中包含空格时依赖新旧路径相同来确定分隔位置"""
+    rest = line[len('diff --git '):]
+    if rest.startswith('"'):
+        match = re.match(r'"a/(.+?)" "?b/(.+?)"?$', rest)
+        return match.groups() if match else (None, None)
+    # 最常见的情况：新旧路径相同，"a/X b/X" 的长度为 2 * len(X) + 5
+    if (len(rest) - 5) % 2 == 0:
+        half = (len(rest) - 5) // 2
+        path = rest[2:2 + half]
+        if rest == f"a/{path} b/{path}":
+            return path, path
+    match = re.match(r'a/(.+?) b/(.+)$', rest)
+    return match.groups() if match else (None, None)
+
+
+def _finalize(file_diff: FileDiff) -> FileDiff:
+    # 新增/删除的二进制文件没有 ---/+++ 行，diff --git 头中给出的两个路径以 mode 行为准
+    if file_diff.new_file:
+        file_diff.old_path = None
+    if file_diff.deleted_file:
+        file_diff.new_path = None
+    return file_diff
+
+
+def iter_file_diffs(source: Union[str, Iterable]) -> Iterator[FileDiff]:
+    """
+    流式解析 unified diff，逐个文件返回 FileDiff。
+    支持 git diff（diff --git 头）、diff -u（只有 ---/+++ 头）以及只有 hunk 的单文件 diff。
+    hunk 按头部声明的行数识别边界，hunk 内以 "+++"、"---" 开头的代码行不会被误认为文件头。
+    """
+    current = None
+    hunk_lines = []
+    old_remaining = new_remaining = 0
+
+    def finish_hunk():
+        if hunk_lines:
+            current.hunks.append('\n'.join(hunk_lines))
+            hunk_lines.clear()
+
+    for line in _iter_lines(source):
+        if old_remaining > 0 or new_remaining > 0:
+            # hunk 内容
+            hunk_lines.append(line)
+            tag = line[:1]
+            if tag == '+':
+                current.additions += 1
+                new_remaining -= 1
+            elif tag == '-':
+                current.deletions += 1
+                old_remaining -= 1
+            elif tag == '\\':
+                # "\ No newline at end of file"
+                pass
+            else:
+                old_remaining -= 1
+                new_remaining -= 1
+            continue
+        if line.startswith('\\') and hunk_lines:
+            hunk_lines.append(line)
+            continue
+
+        if line.startswith('diff --git '):
+            if current is not None:
+                finish_hunk()
+                yield _finalize(current)
+            old_path, new_path = _parse_git_header(line)
+            current = FileDiff(old_path=old_path, new_path=new_path, header=[line])
+            continue
+
+        hunk = HUNK_HEADER_PATTERN.match(line) if line.startswith('@@') else None
+        if hunk:
+            if current is None:
+                current = FileDiff()
+            finish_hunk()
+            hunk_lines.append(line)
+            old_remaining = int(hunk.group(2)) if hunk.group(2) is not None else 1
+            new_remaining = int(hunk.group(4)) if hunk.group(4) is not None else 1
+            continue
+
+        if line.startswith('--- ') and (current is None or current.hunks or hunk_lines):
+            # diff -u 格式：没有 diff --git 头，"---" 行开始新的文件
+            if current is not None:
+                finish_hunk()
+                yield _finalize(current)
+            current = FileDiff()
+        if current is None:
+            # 第一个文件头之前的内容（如提交信息）
+            continue
+
+        if hunk_lines:
+            finish_hunk()
+        current.header.append(line)
+        if line.startswith('--- '):
+            current.old_path = _strip_prefix(line[4:])
+            current.new_file = current.new_file or current.old_path is None
+        elif line.startswith('+++ '):
+            current.new_path = _strip_prefix(line[4:])
+            current.deleted_file = current.deleted_file or current.new_path is None
+        elif line.startswith('new file mode'):
+            current.new_file = True
+        elif line.startswith('deleted file mode'):
+            current.deleted_file = True
+        elif line.startswith('rename from '):
+            current.renamed = True
+            current.old_path = line[len('rename from '):]
+        elif line.startswith('rename to '):
+            current.renamed = True
+            current.new_path = line[len('rename to '):]
+        elif line.startswith('Binary files ') or line == 'GIT binary patch':
+            current.is_binary = True
+
+    if current is not None:
+        finish_hunk()
+        yield _finalize(current)
+
+
+def parse_file_diff(diff_text: str) -> FileDiff:
+    """解析单个文件的 diff（可以没有文件头，如 GitLab/GitHub API 返回的 diff/patch）"""
+    file_diff = next(iter_file_diffs(diff_text or ''), None) or FileDiff()
+    if not file_diff.deleted_file and file_diff.hunks and file_diff.additions == 0 and all(
+            HUNK_HEADER_PATTERN.match(hunk).group(3) == '0' for hunk in file_diff.hunks):
+        # 只有 hunk 的 diff：新文件行范围为 +0,0 且没有新增行，说明文件被删除
+        file_diff.deleted_file = True
+    return file_diff
+
+
+def split_diff_by_file(source: Union[str, Iterable]) -> dict:
+    """
+    将完整的 diff 按文件拆分为 {文件路径: FileDiff}。
+    新旧路径不同（重命名）时两个路径都指向同一个 FileDiff；同一路径出现多次时保留第一个。
+    """
+    file_diffs = {}
+    for file_diff in iter_file_diffs(source):
+        for path in (file_diff.new_path, file_diff.old_path):
+            if path:
+                file_diffs.setdefault(path, file_diff)
+    return file_diffs
+
+
+if __name__ == '__main__':
+    import time
+
+    sample = '\n'.join(
+        f"diff --git a/src/module_{i}.py b/src/module_{i}.py\nindex 1111111..2222222 100644\n"
+        f"--- a/src/module_{i}.py\n+++ b/src/module_{i}.py\n@@ -1,3 +1,3 @@\n context\n-old line {i}\n+new line {i}\n context"
+        for i in range(20000))
+    start = time.perf_counter()
+    files = split_diff_by_file(sample)
+    print(f"chars={len(sample)}, files={len(files)}, cost={(time.perf_counter() - start) * 1000:.1f}ms")
@@ -14,6 +14,8 @@ from src.utils.error.exceptions import (
     NotificationError,
     NotificationConfigError,
     NotificationSendError,
+    QueueError,
+    QueueFullError,
     SystemError
 )
 
@@ -32,5 +34,7 @@ __all__ = [
     'NotificationError',
     'NotificationConfigError',
     'NotificationSendError',
+    'QueueError',
+    'QueueFullError',
     'SystemError'
 ]
@@ -97,6 +97,16 @@ class NotificationSendError(NotificationError):
     pass
 
 
+class QueueError(BaseError):
+    """任务队列错误基类"""
+    pass
+
+
+class QueueFullError(QueueError):
+    """任务队列已满（积压任务超过上限）"""
+    pass
+
+
 class SystemError(BaseError):
     """系统错误"""
     pass
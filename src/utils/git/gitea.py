@@ -3,9 +3,8 @@ import os
 import subprocess
 import shutil
 
-import requests
-
 from src.utils.git.base import BaseGitClient
+from src.utils.http_session import http_get, http_post
 from src.utils.log import logger
 
 
@@ -93,7 +92,7 @@ class GiteaGitClient(BaseGitClient):
                 'private': False,
                 'auto_init': True
             }
-            response = requests.post(url, headers=headers, json=data, timeout=30)
+            response = http_post(url, headers=headers, json=data, timeout=30)
             if response.status_code == 201:
                 logger.info(f"仓库创建成功: {repo_name}")
                 return True
@@ -113,7 +112,7 @@ class GiteaGitClient(BaseGitClient):
             headers = {
                 'Authorization': f'token {self.access_token}'
             }
-            response = requests.get(url, headers=headers, timeout=30)
+            response = http_get(url, headers=headers, timeout=30)
             return response.status_code == 200
         except Exception as e:
             logger.error(f"检查仓库异常: {e}")
@@ -127,7 +126,7 @@ class GiteaGitClient(BaseGitClient):
                 'Authorization': f'token {self.access_token}',
                 'Content-Type': 'application/json'
             }
-            response = requests.get(url, headers=headers, timeout=30)
+            response = http_get(url, headers=headers, timeout=30)
             if response.status_code == 200:
                 user_info = response.json()
                 self.owner = user_info.get('login') or user_info.get('username')
@@ -3,9 +3,8 @@ import os
 import subprocess
 import shutil
 
-import requests
-
 from src.utils.git.base import BaseGitClient
+from src.utils.http_session import http_get, http_post
 from src.utils.log import logger
 
 
@@ -129,7 +128,7 @@ class GitHubGitClient(BaseGitClient):
                 'auto_init': True
             }
 
-            response = requests.post(
+            response = http_post(
                 url,
                 headers=headers,
                 json=data,
@@ -156,7 +155,7 @@ class GitHubGitClient(BaseGitClient):
                 'Authorization': f'token {self.access_token}'
             }
 
-            response = requests.get(
+            response = http_get(
                 url,
                 headers=headers,
                 timeout=30
@@ -174,7 +173,7 @@ class GitHubGitClient(BaseGitClient):
                 'Authorization': f'token {self.access_token}',
                 'Content-Type': 'application/json'
             }
-            response = requests.get(url, headers=headers, timeout=30)
+            response = http_get(url, headers=headers, timeout=30)
             if response.status_code == 200:
                 user_info = response.json()
                 self.owner = user_info.get('login')
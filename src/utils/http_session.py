@@ -0,0 +1,147 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from src.utils.log import logger
+
+# 代码托管平台（GitLab / GitHub / Gitea）API 调用的连接池大小、默认超时（秒）和重试次数
+GIT_API_POOL_SIZE = max(1, int(os.getenv('GIT_API_POOL_SIZE', 10)))
+GIT_API_TIMEOUT = float(os.getenv('GIT_API_TIMEOUT', 30))
+GIT_API_MAX_RETRIES = max(0, int(os.getenv('GIT_API_MAX_RETRIES', 3)))
+# 连接超时单独设置较短的值，避免主机不可达时长时间阻塞
+GIT_API_CONNECT_TIMEOUT = min(10.0, GIT_API_TIMEOUT)
+# 分页接口最多获取的页数和并发获取的页数
+GIT_API_MAX_PAGES = max(1, int(os.getenv('GIT_API_MAX_PAGES', 30)))
+GIT_API_PAGE_CONCURRENCY = max(1, int(os.getenv('GIT_API_PAGE_CONCURRENCY', 4)))
+
+_lock = threading.Lock()
+_sessions = {}
+_pid = None
+
+
+class _Session(requests.Session):
+    """未指定 timeout 的请求使用默认超时"""
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = (GIT_API_CONNECT_TIMEOUT, GIT_API_TIMEOUT)
+        return super().request(method, url, **kwargs)
+
+
+def _create_session() -> requests.Session:
+    session = _Session()
+    # 只重试幂等的请求（GET/HEAD/OPTIONS），避免重复发表评论；429 和 503 遵循 Retry-After
+    retry = Retry(total=GIT_API_MAX_RETRIES, connect=GIT_API_MAX_RETRIES, read=GIT_API_MAX_RETRIES,
+                  backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=frozenset(['GET', 'HEAD', 'OPTIONS']),
+                  respect_retry_after_header=True, raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=GIT_API_POOL_SIZE, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_session(url: str) -> requests.Session:
+    """
+    获取 url 所在主机共享的 Session（按 scheme://host:port 区分），复用 keep-alive 连接。
+    多进程模式下每个工作进程使用自己的连接池，不与父进程共享 socket。
+    """
+    global _pid
+    parts = urlsplit(url)
+    key = (parts.scheme, parts.netloc)
+    with _lock:
+        if _pid != os.getpid():
+            _sessions.clear()
+            _pid = os.getpid()
+        session = _sessions.get(key)
+        if session is None:
+            session = _create_session()
+            _sessions[key] = session
+        return session
+
+
+def http_get(url: str, **kwargs) -> requests.Response:
+    """与 requests.get 用法相同，使用主机共享的 Session"""
+    return get_session(url).get(url, **kwargs)
+
+
+def http_post(url: str, **kwargs) -> requests.Response:
+    """与 requests.post 用法相同，使用主机共享的 Session"""
+    return get_session(url).post(url, **kwargs)
+
+
+def _last_page(response: requests.Response) -> Optional[int]:
+    """总页数：GitLab 的 X-Total-Pages，或 GitHub / Gitea 的 Link rel="last"；未知时返回 None"""
+    total_pages = response.headers.get('X-Total-Pages')
+    if total_pages and total_pages.isdigit():
+        return int(total_pages)
+    last_url = response.links.get('last', {}).get('url')
+    if last_url:
+        page = parse_qs(urlsplit(last_url).query).get('page')
+        if page and page[0].isdigit():
+            return int(page[0])
+    return None
+
+
+def _next_page(response: requests.Response, page: int) -> Optional[int]:
+    """下一页页码：GitLab 的 X-Next-Page，或 Link rel="next"；没有下一页时返回 None"""
+    next_page = response.headers.get('X-Next-Page')
+    if next_page is not None:
+        return int(next_page) if next_page.isdigit() else None
+    return page + 1 if 'next' in response.links else None
+
+
+def http_get_all_pages(url: str, params: dict = None, per_page: int = 100, per_page_param: str = 'per_page',
+                       max_pages: int = None, **kwargs) -> Tuple[requests.Response, Optional[list]]:
+    """
+    获取分页接口的全部数据（最多 max_pages 页，默认 GIT_API_MAX_PAGES）。
+    先请求第一页，从 X-Total-Pages 或 Link rel="last" 得到总页数后并发获取其余页面（并发数 GIT_API_PAGE_CONCURRENCY）；
+    总页数未知时按 X-Next-Page / Link rel="next" 依次获取。
+    :return: (第一页的响应, 按页码顺序合并后的列表)；第一页请求失败时列表为 None，由调用方根据响应处理错误
+    """
+    max_pages = max_pages or GIT_API_MAX_PAGES
+    params = {**(params or {}), per_page_param: per_page}
+
+    def fetch(page: int) -> requests.Response:
+        return http_get(url, params={**params, 'page': page}, **kwargs)
+
+    first = fetch(1)
+    if first.status_code != 200:
+        return first, None
+    items = list(first.json())
+
+    last_page = _last_page(first)
+    if last_page is not None:
+        pages = range(2, min(last_page, max_pages) + 1)
+        if pages:
+            with ThreadPoolExecutor(max_workers=min(GIT_API_PAGE_CONCURRENCY, len(pages))) as executor:
+                # map 按页码顺序返回结果
+                for page, response in zip(pages, executor.map(fetch, pages)):
+                    if response.status_code != 200:
+                        logger.warn(f"Failed to get page {page} of {url}: {response.status_code}, {response.text}")
+                        continue
+                    items.extend(response.json())
+        if last_page > max_pages:
+            logger.warn(f"{url} 共 {last_page} 页，只获取了前 {max_pages} 页")
+        return first, items
+
+    response, page = first, 1
+    while True:
+        next_page = _next_page(response, page)
+        if next_page is None:
+            break
+        if next_page > max_pages:
+            logger.warn(f"{url} 超过 {max_pages} 页，只获取了前 {max_pages} 页")
+            break
+        response, page = fetch(next_page), next_page
+        if response.status_code != 200:
+            logger.warn(f"Failed to get page {page} of {url}: {response.status_code}, {response.text}")
+            break
+        items.extend(response.json())
+    return first, items
@@ -0,0 +1,148 @@
+import importlib
+import json
+import os
+import sqlite3
+import time
+
+from src.utils.log import logger
+
+
+class JobStore:
+    """
+    基于 SQLite 的本地任务队列持久化（async 模式使用）。
+    任务入队时先落盘，执行完成后标记为 done；进程重启后 queued/running 状态的任务会被重新投递（至少一次）。
+    """
+    DB_FILE = "data/queue.db"
+
+    STATE_QUEUED = 'queued'
+    STATE_RUNNING = 'running'
+    STATE_DONE = 'done'
+    STATE_FAILED = 'failed'
+    # 被同一 MR/分支上更新的事件合并取代
+    STATE_SUPERSEDED = 'superseded'
+
+    def __init__(self, db_file: str = None):
+        self.db_file = db_file or os.getenv('QUEUE_DB_FILE', JobStore.DB_FILE)
+        # 超过该次数仍未成功的任务不再重放，避免异常任务反复拖垮工作进程
+        self.max_attempts = int(os.getenv('QUEUE_JOB_MAX_ATTEMPTS', 3))
+        # 已完成任务的保留天数
+        self.retention_days = int(os.getenv('QUEUE_JOB_RETENTION_DAYS', 7))
+        self.init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_file, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def init_db(self):
+        """初始化数据库及表结构"""
+        try:
+            os.makedirs(os.path.dirname(self.db_file) or '.', exist_ok=True)
+            with self._connect() as conn:
+                conn.execute('''
+                        CREATE TABLE IF NOT EXISTS queue_job (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            function TEXT NOT NULL,
+                            args TEXT,
+                            state TEXT NOT NULL,
+                            attempts INTEGER DEFAULT 0,
+                            error TEXT,
+                            coalesce_key TEXT,
+                            created_at INTEGER,
+                            updated_at INTEGER
+                        )
+                    ''')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_queue_job_state ON queue_job (state)')
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"Queue database initialization failed: {e}")
+
+    @staticmethod
+    def function_path(function: callable) -> str:
+        return f"{function.__module__}:{function.__qualname__}"
+
+    @staticmethod
+    def resolve_function(function_path: str) -> callable:
+        module_name, _, qualname = function_path.partition(':')
+        target = importlib.import_module(module_name)
+        for attr in qualname.split('.'):
+            target = getattr(target, attr)
+        return target
+
+    def enqueue(self, function: callable, args: tuple, coalesce_key: str = None) -> int:
+        """任务落盘，返回任务ID"""
+        now = int(time.time())
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'INSERT INTO queue_job (function, args, state, coalesce_key, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (self.function_path(function), json.dumps(list(args), ensure_ascii=False), self.STATE_QUEUED,
+                 coalesce_key, now, now))
+            conn.commit()
+            return cursor.lastrowid
+
+    def _update_state(self, job_id: int, state: str, error: str = None, increase_attempts: bool = False):
+        # 结束状态（done/failed/superseded）的任务不会再重放，清理参数（包含 webhook 数据和访问令牌），仅保留执行记录
+        finished = state in (self.STATE_DONE, self.STATE_FAILED, self.STATE_SUPERSEDED)
+        with self._connect() as conn:
+            conn.execute(
+                f'''UPDATE queue_job SET state = ?, error = ?, updated_at = ?
+                    {', attempts = attempts + 1' if increase_attempts else ''}
+                    {', args = NULL' if finished else ''}
+                    WHERE id = ?''',
+                (state, error, int(time.time()), job_id))
+            conn.commit()
+
+    def mark_running(self, job_id: int):
+        self._update_state(job_id, self.STATE_RUNNING, increase_attempts=True)
+
+    def mark_done(self, job_id: int):
+        self._update_state(job_id, self.STATE_DONE)
+
+    def mark_failed(self, job_id: int, error: str):
+        self._update_state(job_id, self.STATE_FAILED, error=error)
+
+    def mark_superseded(self, job_id: int, superseded_by: int):
+        self._update_state(job_id, self.STATE_SUPERSEDED, error=f'superseded by job {superseded_by}')
+
+    def get_pending_jobs(self) -> list:
+        """
+        获取需要重放的任务：queued（未执行）和 running（执行中被中断）。
+        重试次数超限的任务直接标记为 failed。
+        :return: [(job_id, function_path, args), ...]
+        """
+        jobs = []
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT id, function, args, attempts FROM queue_job WHERE state IN (?, ?) ORDER BY id',
+                (self.STATE_QUEUED, self.STATE_RUNNING)).fetchall()
+        for job_id, function_path, args, attempts in rows:
+            if attempts >= self.max_attempts:
+                logger.warn(f"Queue job {job_id} exceeded max attempts ({self.max_attempts}), marked as failed.")
+                self.mark_failed(job_id, f'exceeded max attempts ({self.max_attempts})')
+                continue
+            jobs.append((job_id, function_path, tuple(json.loads(args or '[]'))))
+        return jobs
+
+    def purge_finished_jobs(self):
+        """清理超过保留期的已完成/失败/已合并任务"""
+        expire_at = int(time.time()) - self.retention_days * 86400
+        with self._connect() as conn:
+            conn.execute('DELETE FROM queue_job WHERE state IN (?, ?, ?) AND updated_at < ?',
+                         (self.STATE_DONE, self.STATE_FAILED, self.STATE_SUPERSEDED, expire_at))
+            conn.commit()
+
+
+def run_job(job_id: int, function_path: str, args: tuple):
+    """
+    在工作进程中执行持久化任务，并维护任务状态
+    """
+    store = JobStore()
+    store.mark_running(job_id)
+    try:
+        function = JobStore.resolve_function(function_path)
+        function(*args)
+    except Exception as e:
+        store.mark_failed(job_id, str(e))
+        raise
+    store.mark_done(job_id)
@@ -0,0 +1,64 @@
+import os
+import threading
+from typing import Any, Dict
+
+import yaml
+from jinja2 import Template
+
+from src.utils.log import logger
+
+PROMPT_TEMPLATES_FILE = "config/prompt_templates.yml"
+
+
+class PromptRegistry:
+    """
+    提示词模板注册表：YAML 只解析一次，每个 (prompt_key, style) 只渲染一次。
+    每次获取时检查文件的修改时间，文件变化后自动重新加载，修改提示词无需重启服务。
+    """
+
+    def __init__(self, templates_file: str = PROMPT_TEMPLATES_FILE):
+        self.templates_file = templates_file
+        self._lock = threading.Lock()
+        self._signature = None
+        self._templates = {}
+        self._rendered = {}
+
+    def get(self, prompt_key: str, style: str = "professional") -> Dict[str, Any]:
+        """
+        获取渲染后的提示词。
+        文件不存在、YAML 格式错误或缺少 prompt_key / system_prompt / user_prompt 时分别抛出
+        FileNotFoundError、yaml.YAMLError、KeyError。
+        """
+        self._reload_if_changed()
+        key = (prompt_key, style)
+        rendered = self._rendered.get(key)
+        if rendered is None:
+            with self._lock:
+                rendered = self._rendered.get(key)
+                if rendered is None:
+                    prompts = self._templates[prompt_key]
+                    rendered = (Template(prompts["system_prompt"]).render(style=style),
+                                Template(prompts["user_prompt"]).render(style=style))
+                    self._rendered[key] = rendered
+        # 返回新的字典，调用方修改 messages 不会影响缓存
+        return {
+            "system_message": {"role": "system", "content": rendered[0]},
+            "user_message": {"role": "user", "content": rendered[1]},
+        }
+
+    def _reload_if_changed(self):
+        stat = os.stat(self.templates_file)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature:
+            return
+        with self._lock:
+            if signature == self._signature:
+                return
+            with open(self.templates_file, "r", encoding="utf-8") as file:
+                self._templates = yaml.safe_load(file) or {}
+            self._rendered = {}
+            self._signature = signature
+            logger.info(f"提示词模板已加载: {self.templates_file}")
+
+
+prompt_registry = PromptRegistry()
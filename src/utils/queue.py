@@ -1,25 +1,244 @@
+import atexit
 import os
-from multiprocessing import Process
+import threading
+import time
+from multiprocessing import Pool
 
 from redis import Redis
 from rq import Queue
 
+from src.utils.dedup import DeliveryDeduplicator, REVIEWABLE_ACTIONS, event_scope
+from src.utils.error import QueueFullError
+from src.utils.job_store import JobStore, run_job
 from src.utils.log import logger
 
 queue_driver = os.getenv('QUEUE_DRIVER', 'async')
 
+# 常驻工作进程数量（async 模式）
+queue_worker_num = max(1, int(os.getenv('QUEUE_WORKER_NUM', 4)))
+# 允许积压（排队等待执行）的最大任务数，超过后 webhook 直接返回 503
+queue_max_backlog = max(0, int(os.getenv('QUEUE_MAX_BACKLOG', 100)))
+# 合并窗口（秒）：同一 MR/分支在窗口内的连续事件只审查最后一次，0 表示不合并
+queue_coalesce_window = max(0.0, float(os.getenv('QUEUE_COALESCE_WINDOW', 0)))
+# 任务超时（秒）：提交后超过该时间仍未完成的任务视为丢失（如工作进程被 OOM kill），不再计入积压
+queue_job_timeout = max(1.0, float(os.getenv('QUEUE_JOB_TIMEOUT', 3600)))
+
 if queue_driver == 'rq':
     queues = {}
 
+_pool = None
+_pool_lock = threading.Lock()
+_job_store = None
+_deduplicator = None
+# 已提交但尚未完成的任务（包括正在执行和排队中的任务）：AsyncResult -> 提交时间
+_pending_results = {}
+# 处于合并窗口中、尚未投递的任务：coalesce_key -> {job_id, function, args, timer}
+_coalescing_jobs = {}
+
+
+def _warm_up_worker():
+    """
+    工作进程初始化函数：每个工作进程只执行一次，
+    预先导入 CodeReviewer、LLM 客户端及各平台 handler，并加载 tokenizer，避免每个任务重复初始化
+    """
+    try:
+        import src.queue.worker  # noqa: F401
+        import src.llm.factory  # noqa: F401
+        from src.utils.token_util import count_tokens
+        count_tokens('')
+        logger.info(f'Queue worker {os.getpid()} warmed up.')
+    except Exception as e:
+        # 预热失败不影响任务执行，任务执行时会再次按需加载
+        logger.warn(f'Queue worker {os.getpid()} warm up failed: {e}')
+
+
+def start_worker_pool():
+    """
+    启动常驻工作进程池（仅 async 模式）。应在服务启动线程（调度器、Flask）之前调用，
+    避免在多线程的请求处理中 fork 工作进程
+    """
+    if queue_driver != 'rq':
+        _get_pool()
+
+
+def _get_pool() -> Pool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                logger.info(f'Starting queue worker pool, QUEUE_WORKER_NUM: {queue_worker_num}, '
+                            f'QUEUE_MAX_BACKLOG: {queue_max_backlog}')
+                _pool = Pool(processes=queue_worker_num, initializer=_warm_up_worker)
+                atexit.register(_shutdown_pool)
+    return _pool
+
+
+def _shutdown_pool():
+    # 任务已持久化，未完成的任务会在下次启动时重放，无需等待执行完毕
+    if _pool is not None:
+        _pool.terminate()
+        _pool.join()
+
+
+def _get_job_store() -> JobStore:
+    global _job_store
+    if _job_store is None:
+        _job_store = JobStore()
+    return _job_store
+
+
+def _on_job_failed(error: BaseException):
+    logger.error(f'Queue job failed: {error}')
+
+
+def _count_pending_jobs() -> int:
+    """
+    按 AsyncResult 统计未完成的任务数，需持有 _pool_lock。
+    工作进程异常退出时任务的回调不会执行，因此不依赖回调计数；超过 QUEUE_JOB_TIMEOUT 的任务不再计入
+    """
+    now = time.monotonic()
+    for result, submitted_at in list(_pending_results.items()):
+        if result.ready():
+            del _pending_results[result]
+        elif now - submitted_at > queue_job_timeout:
+            logger.warn(f'Queue job not finished within {queue_job_timeout}s, the worker may have died, '
+                        f'no longer counted in the backlog.')
+            del _pending_results[result]
+    return len(_pending_results)
+
+
+def _check_pool_capacity():
+    with _pool_lock:
+        pending = _count_pending_jobs()
+        if pending + len(_coalescing_jobs) >= queue_worker_num + queue_max_backlog:
+            raise QueueFullError('Review queue is full, please retry later.',
+                                 pending=pending, workers=queue_worker_num, backlog=queue_max_backlog)
+
 
-def handle_queue(function: callable, data: any, token: str, url: str, url_slug: str):
+def _submit_to_pool(function: callable, args: tuple):
+    pool = _get_pool()
+    result = pool.apply_async(function, args=args, error_callback=_on_job_failed)
+    with _pool_lock:
+        _pending_results[result] = time.monotonic()
+
+
+def _coalesce_key(data: dict, url_slug: str) -> str:
+    """
+    计算事件的合并键：(url_slug, 项目, MR/PR 编号或分支)，无法识别或不需要合并的事件返回 None。
+    close/merge 等不触发审查的 action 不参与合并，避免取代待审查的事件
+    """
+    scope = event_scope(data)
+    if not scope:
+        return None
+    project, target, action = scope
+    if action != 'push' and action not in REVIEWABLE_ACTIONS:
+        return None
+    return f"{url_slug}:{project}:{target}"
+
+
+def _merge_push_payload(previous: dict, latest: dict) -> dict:
+    """
+    合并同一分支上的连续 Push：以最新事件为准，before 取最早一次的值，commits 按顺序拼接，
+    保证合并后的 compare 范围覆盖所有被取代的 Push
+    """
+    merged = dict(latest)
+    merged['before'] = previous.get('before', latest.get('before'))
+    merged['commits'] = list(previous.get('commits') or []) + list(latest.get('commits') or [])
+    if 'total_commits_count' in latest:
+        merged['total_commits_count'] = previous.get('total_commits_count', 0) + latest.get('total_commits_count', 0)
+    if previous.get('created'):
+        merged['created'] = True
+    return merged
+
+
+def _flush_coalesced_job(key: str):
+    with _pool_lock:
+        job = _coalescing_jobs.pop(key, None)
+    if job:
+        _submit_to_pool(run_job, (job['job_id'], JobStore.function_path(job['function']), job['args']))
+
+
+def _coalesce(function: callable, args: tuple, key: str):
+    """
+    在合并窗口内等待：窗口期内同一 key 的新事件取代旧事件并重新计时，窗口结束后只投递最新的事件
+    """
+    store = _get_job_store()
+    with _pool_lock:
+        previous = _coalescing_jobs.pop(key, None)
+        if previous:
+            previous['timer'].cancel()
+            if previous['function'] is function and ':push:' in key:
+                args = (_merge_push_payload(previous['args'][0], args[0]),) + tuple(args[1:])
+        job_id = store.enqueue(function, args, coalesce_key=key)
+        timer = threading.Timer(queue_coalesce_window, _flush_coalesced_job, args=(key,))
+        timer.daemon = True
+        _coalescing_jobs[key] = {'job_id': job_id, 'function': function, 'args': args, 'timer': timer}
+        timer.start()
+    if previous:
+        store.mark_superseded(previous['job_id'], job_id)
+        logger.info(f"Queue job {previous['job_id']} superseded by job {job_id} (coalesce key: {key}).")
+
+
+def _get_deduplicator() -> DeliveryDeduplicator:
+    global _deduplicator
+    if _deduplicator is None:
+        _deduplicator = DeliveryDeduplicator(queue_driver)
+    return _deduplicator
+
+
+def handle_queue(function: callable, data: any, token: str, url: str, url_slug: str, delivery_id: str = None) -> bool:
+    """
+    将 webhook 事件加入审查队列
+    :param delivery_id: Git 平台的投递ID，用于识别重试/重复投递
+    :return: 是否入队；重复投递的事件返回 False
+    """
+    deduplicator = _get_deduplicator()
+    dedup_keys = deduplicator.build_keys(delivery_id, data, url_slug)
+    if not deduplicator.claim(dedup_keys):
+        return False
+    try:
+        _enqueue(function, data, token, url, url_slug)
+    except Exception:
+        deduplicator.release(dedup_keys)
+        raise
+    return True
+
+
+def _enqueue(function: callable, data: any, token: str, url: str, url_slug: str):
     if queue_driver == 'rq':
         if url_slug not in queues:
             logger.info(f'REDIS_HOST: {os.getenv("REDIS_HOST", "127.0.0.1")}，REDIS_PORT: {os.getenv("REDIS_PORT", 6379)}')
             queues[url_slug] = Queue(url_slug, connection=Redis(os.getenv('REDIS_HOST', '127.0.0.1'),
                                                                               os.getenv('REDIS_PORT', 6379)))
 
+        if queue_max_backlog and queues[url_slug].count >= queue_max_backlog:
+            raise QueueFullError('Review queue is full, please retry later.',
+                                 queue=url_slug, backlog=queue_max_backlog)
         queues[url_slug].enqueue(function, data, token, url, url_slug)
     else:
-        process = Process(target=function, args=(data, token, url, url_slug))
-        process.start()
+        args = (data, token, url, url_slug)
+        key = _coalesce_key(data, url_slug) if queue_coalesce_window > 0 else None
+        if not (key and key in _coalescing_jobs):
+            _check_pool_capacity()
+        if key:
+            _coalesce(function, args, key)
+            return
+        # 先落盘再投递，保证进程重启后任务不丢失
+        job_id = _get_job_store().enqueue(function, args)
+        _submit_to_pool(run_job, (job_id, JobStore.function_path(function), args))
+
+
+def replay_pending_jobs():
+    """
+    重放上次进程退出时未完成的任务（仅 async 模式），在服务启动时调用
+    """
+    if queue_driver == 'rq':
+        return
+    store = _get_job_store()
+    store.purge_finished_jobs()
+    jobs = store.get_pending_jobs()
+    if not jobs:
+        return
+    logger.info(f'Replaying {len(jobs)} pending queue jobs.')
+    for job_id, function_path, args in jobs:
+        _submit_to_pool(run_job, (job_id, function_path, args))
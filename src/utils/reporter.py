@@ -1,14 +1,16 @@
 import json
 import hashlib
 import time
+from src.llm.client.pool import run_async
 from src.llm.factory import Factory
+from src.llm.output import normalize_output
 from src.utils.log import logger
 from src.utils.config import get
 
 
 class Reporter:
     def __init__(self):
-        self.default_client = Factory().getClient()
+        self.default_client = Factory.getClient()
         self.llm_provider = get('LLM_PROVIDER', 'minimax')
         self.model_info = self._get_model_info()
         self.max_input_tokens = self.model_info.get('max_input_tokens', 2000)
@@ -37,55 +39,17 @@ class Reporter:
         
         # 如果当前模型的token限制较小（<=4096），尝试使用更大token限制的模型
         if current_max_tokens <= 4096:
-            # 检查是否配置了其他更大token限制的模型
-            if get('DEEPSEEK_API_KEY'):
-                logger.info("使用DeepSeek模型生成日报（更大的token限制）")
-                # 临时修改环境变量来使用DeepSeek
-                import os
-                original_provider = os.environ.get('LLM_PROVIDER')
-                os.environ['LLM_PROVIDER'] = 'deepseek'
-                
+            # 检查是否配置了其他更大token限制的模型，直接按供应商获取客户端，不修改环境变量
+            for provider, required_key in (('deepseek', 'DEEPSEEK_API_KEY'), ('ollama', 'OLLAMA_API_BASE_URL')):
+                if not get(required_key):
+                    continue
+                logger.info(f"使用{provider}模型生成日报（更大的token限制）")
                 try:
-                    # 创建DeepSeek客户端
-                    deepseek_client = Factory().getClient()
-                    # 恢复原始设置
-                    if original_provider:
-                        os.environ['LLM_PROVIDER'] = original_provider
-                    else:
-                        del os.environ['LLM_PROVIDER']
-                    return deepseek_client
+                    return Factory.getClient(provider)
                 except Exception as e:
-                    logger.warning(f"创建DeepSeek客户端失败: {e}")
-                    # 恢复原始设置
-                    if original_provider:
-                        os.environ['LLM_PROVIDER'] = original_provider
-                    else:
-                        del os.environ['LLM_PROVIDER']
-            
-            elif get('OLLAMA_API_BASE_URL'):
-                logger.info("使用Ollama模型生成日报（更大的token限制）")
-                # 临时修改环境变量来使用Ollama
-                import os
-                original_provider = os.environ.get('LLM_PROVIDER')
-                os.environ['LLM_PROVIDER'] = 'ollama'
-                
-                try:
-                    # 创建Ollama客户端
-                    ollama_client = Factory().getClient()
-                    # 恢复原始设置
-                    if original_provider:
-                        os.environ['LLM_PROVIDER'] = original_provider
-                    else:
-                        del os.environ['LLM_PROVIDER']
-                    return ollama_client
-                except Exception as e:
-                    logger.warning(f"创建Ollama客户端失败: {e}")
-                    # 恢复原始设置
-                    if original_provider:
-                        os.environ['LLM_PROVIDER'] = original_provider
-                    else:
-                        del os.environ['LLM_PROVIDER']
-        
+                    logger.warning(f"创建{provider}客户端失败: {e}")
+                break
+
         # 如果没有更大token限制的模型可用，使用默认客户端
         logger.info(f"使用默认模型 {self.llm_provider} 生成日报")
         return self.default_client
@@ -139,12 +103,14 @@ class Reporter:
             # 优化提示词
             prompt = self._get_optimized_prompt(processed_data)
 
-            # 调用大模型生成报告
-            report = self.report_client.completions(
+            # 调用大模型生成报告，与审查共用供应商的异步连接池和并发限制
+            report = run_async(self.report_client.acompletions(
                 messages=[
                     {"role": "user", "content": prompt},
                 ],
-            )
+            ))
+            # 去掉思考内容和外层 markdown 代码块
+            report = normalize_output(report)
 
             # 缓存结果
             self._cache_report(cache_key, report)
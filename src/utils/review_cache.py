@@ -0,0 +1,230 @@
+import hashlib
+import os
+import re
+import sqlite3
+import time
+
+from src.utils.log import logger
+
+# diff 中与内容无关、rebase/cherry-pick 后会变化的部分
+_INDEX_LINE_PATTERN = re.compile(r'^index [0-9a-f]+\.\.[0-9a-f]+( \d+)?$')
+_HUNK_HEADER_PATTERN = re.compile(r'^@@ -\d+(,\d+)? \+\d+(,\d+)? @@')
+
+
+def normalize_diff(diff_text: str) -> str:
+    """
+    归一化 diff 文本：去掉 index 行、hunk 头中的行号、行尾空白和换行符差异，
+    使内容相同但基线不同的变更（rebase、cherry-pick）得到相同的结果
+    """
+    lines = []
+    for line in diff_text.replace('\r\n', '\n').split('\n'):
+        line = line.rstrip()
+        if _INDEX_LINE_PATTERN.match(line):
+            continue
+        lines.append(_HUNK_HEADER_PATTERN.sub('@@', line))
+    return '\n'.join(lines).strip()
+
+
+class ReviewCache:
+    """
+    以内容寻址的审查结果缓存：key 为 (归一化 diff, 提示词, 审查风格, 模型, 是否结构化输出) 的哈希，
+    相同的变更集直接返回已保存的审查结果，不再调用 LLM。
+    缓存按 TTL 和最大条目数（LRU）淘汰，命中/未命中次数持久化，多个工作进程共享统计。
+    """
+    DB_FILE = "data/review_cache.db"
+
+    def __init__(self, db_file: str = None):
+        self.enabled = os.getenv('REVIEW_CACHE_ENABLED', '1') == '1'
+        self.db_file = db_file or os.getenv('REVIEW_CACHE_DB_FILE', ReviewCache.DB_FILE)
+        self.ttl = int(os.getenv('REVIEW_CACHE_TTL_DAYS', 30)) * 86400
+        self.max_entries = int(os.getenv('REVIEW_CACHE_MAX_ENTRIES', 1000))
+        if self.enabled:
+            self.init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_file, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def init_db(self):
+        """初始化数据库及表结构"""
+        try:
+            os.makedirs(os.path.dirname(self.db_file) or '.', exist_ok=True)
+            with self._connect() as conn:
+                conn.execute('''
+                        CREATE TABLE IF NOT EXISTS review_cache (
+                            cache_key TEXT PRIMARY KEY,
+                            review_result TEXT NOT NULL,
+                            created_at INTEGER,
+                            last_hit_at INTEGER,
+                            hit_count INTEGER DEFAULT 0
+                        )
+                    ''')
+                conn.execute('''
+                        CREATE TABLE IF NOT EXISTS review_cache_stats (
+                            name TEXT PRIMARY KEY,
+                            value INTEGER DEFAULT 0
+                        )
+                    ''')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_review_cache_last_hit_at ON review_cache (last_hit_at)')
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"Review cache database initialization failed: {e}")
+            self.enabled = False
+
+    @staticmethod
+    def build_key(diff_text: str, prompt_key: str, style: str, model: str, structured_output: bool = False) -> str:
+        digest = hashlib.sha256()
+        # 开启结构化输出后的审查结果带有 JSON 代码块，与未开启时的结果互不复用
+        for part in (normalize_diff(diff_text), prompt_key, style, model, 'structured' if structured_output else ''):
+            digest.update((part or '').encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get(self, cache_key: str) -> str:
+        """读取缓存，未命中或已过期返回 None"""
+        if not self.enabled:
+            return None
+        now = int(time.time())
+        try:
+            with self._connect() as conn:
+                row = conn.execute('SELECT review_result FROM review_cache WHERE cache_key = ? AND created_at >= ?',
+                                   (cache_key, now - self.ttl)).fetchone()
+                if row:
+                    conn.execute('UPDATE review_cache SET last_hit_at = ?, hit_count = hit_count + 1 '
+                                 'WHERE cache_key = ?', (now, cache_key))
+                self._increase_stat(conn, 'hits' if row else 'misses')
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"Failed to read review cache: {e}")
+            return None
+        if row:
+            logger.info(f"Review cache hit: {cache_key}")
+            return row[0]
+        logger.info(f"Review cache miss: {cache_key}")
+        return None
+
+    def put(self, cache_key: str, review_result: str):
+        """写入缓存，并按 TTL 和最大条目数淘汰旧数据"""
+        if not self.enabled or not review_result:
+            return
+        now = int(time.time())
+        try:
+            with self._connect() as conn:
+                conn.execute('INSERT OR REPLACE INTO review_cache (cache_key, review_result, created_at, last_hit_at) '
+                             'VALUES (?, ?, ?, ?)', (cache_key, review_result, now, now))
+                self._evict(conn, now)
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"Failed to write review cache: {e}")
+
+    def _evict(self, conn: sqlite3.Connection, now: int):
+        cursor = conn.execute('DELETE FROM review_cache WHERE created_at < ?', (now - self.ttl,))
+        evicted = cursor.rowcount
+        if self.max_entries > 0:
+            cursor = conn.execute('''
+                    DELETE FROM review_cache WHERE cache_key IN (
+                        SELECT cache_key FROM review_cache ORDER BY last_hit_at DESC LIMIT -1 OFFSET ?
+                    )''', (self.max_entries,))
+            evicted += cursor.rowcount
+        if evicted > 0:
+            self._increase_stat(conn, 'evictions', evicted)
+
+    @staticmethod
+    def _increase_stat(conn: sqlite3.Connection, name: str, value: int = 1):
+        conn.execute('INSERT INTO review_cache_stats (name, value) VALUES (?, ?) '
+                     'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value', (name, value))
+
+    def stats(self) -> dict:
+        """返回缓存统计：hits、misses、evictions、entries、hit_rate"""
+        result = {'enabled': self.enabled, 'hits': 0, 'misses': 0, 'evictions': 0, 'entries': 0, 'hit_rate': 0.0}
+        if not self.enabled:
+            return result
+        try:
+            with self._connect() as conn:
+                for name, value in conn.execute('SELECT name, value FROM review_cache_stats').fetchall():
+                    result[name] = value
+                result['entries'] = conn.execute('SELECT COUNT(*) FROM review_cache').fetchone()[0]
+        except sqlite3.DatabaseError as e:
+            logger.error(f"Failed to read review cache stats: {e}")
+        total = result['hits'] + result['misses']
+        result['hit_rate'] = round(result['hits'] / total, 4) if total else 0.0
+        return result
+
+
+class FileReviewStore:
+    """
+    MR/PR 文件级审查结果存储：按 (审查范围, 文件路径) 记录文件 diff 哈希及对应的审查结果和评分。
+    MR 更新时，diff 哈希未变化的文件直接复用上次的审查结果，只有变化的文件需要重新审查。
+    与审查结果缓存共用同一个数据库文件。
+    """
+
+    def __init__(self, db_file: str = None):
+        self.db_file = db_file or os.getenv('REVIEW_CACHE_DB_FILE', ReviewCache.DB_FILE)
+        self.ttl = int(os.getenv('REVIEW_CACHE_TTL_DAYS', 30)) * 86400
+        self.init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_file, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def init_db(self):
+        """初始化数据库及表结构"""
+        try:
+            os.makedirs(os.path.dirname(self.db_file) or '.', exist_ok=True)
+            with self._connect() as conn:
+                conn.execute('''
+                        CREATE TABLE IF NOT EXISTS file_review (
+                            review_scope TEXT NOT NULL,
+                            file_path TEXT NOT NULL,
+                            diff_hash TEXT NOT NULL,
+                            review_result TEXT,
+                            score INTEGER DEFAULT 0,
+                            updated_at INTEGER,
+                            PRIMARY KEY (review_scope, file_path)
+                        )
+                    ''')
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"File review database initialization failed: {e}")
+
+    def get_file_reviews(self, review_scope: str) -> dict:
+        """
+        获取审查范围内未过期的文件审查结果
+        :return: {file_path: (diff_hash, review_result, score)}
+        """
+        try:
+            with self._connect() as conn:
+                rows = conn.execute('SELECT file_path, diff_hash, review_result, score FROM file_review '
+                                    'WHERE review_scope = ? AND updated_at >= ?',
+                                    (review_scope, int(time.time()) - self.ttl)).fetchall()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"Failed to read file reviews: {e}")
+            return {}
+        return {file_path: (diff_hash, review_result, score) for file_path, diff_hash, review_result, score in rows}
+
+    def save_file_reviews(self, review_scope: str, file_reviews: dict):
+        """
+        保存本次审查后的文件结果，并删除已不在 MR 中的文件记录
+        :param file_reviews: {file_path: (diff_hash, review_result, score)}
+        """
+        now = int(time.time())
+        try:
+            with self._connect() as conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO file_review '
+                    '(review_scope, file_path, diff_hash, review_result, score, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+                    [(review_scope, file_path, diff_hash, review_result, score, now)
+                     for file_path, (diff_hash, review_result, score) in file_reviews.items()])
+                # 本次的文件路径写入临时表再删除其余记录，大 MR 也不会超出 SQLite 的绑定参数上限
+                conn.execute('CREATE TEMP TABLE IF NOT EXISTS current_file (file_path TEXT PRIMARY KEY)')
+                conn.execute('DELETE FROM current_file')
+                conn.executemany('INSERT OR IGNORE INTO current_file (file_path) VALUES (?)',
+                                 [(file_path,) for file_path in file_reviews])
+                conn.execute('DELETE FROM file_review WHERE review_scope = ? '
+                             'AND file_path NOT IN (SELECT file_path FROM current_file)', (review_scope,))
+                conn.execute('DELETE FROM file_review WHERE updated_at < ?', (now - self.ttl,))
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"Failed to save file reviews: {e}")
@@ -0,0 +1,120 @@
+from dataclasses import dataclass, replace
+from functools import cached_property
+from typing import Optional, Tuple
+
+from src.utils.language_detector import detect_language, detect_language_from_paths
+from src.utils.token_util import count_tokens, count_and_truncate
+
+# 每个文件的 diff 头（diff --git / index / --- / +++）大致占用的 token 数
+DIFF_HEADER_TOKENS = 40
+
+
+def change_to_diff(change) -> Optional[str]:
+    """将单个文件变更转换为标准的diff格式，无法转换时返回 None"""
+    # 处理不同的change格式
+    if isinstance(change, dict):
+        # GitLab API返回的格式
+        if 'diff' in change:
+            diff_text = change['diff']
+            # 如果diff不包含文件路径信息，但有new_path，则添加标准diff头
+            if not diff_text.startswith('diff --git') and 'new_path' in change:
+                diff_text = f"diff --git a/{change['new_path']} b/{change['new_path']}\nindex 0000000..0000000 100644\n--- a/{change['new_path']}\n+++ b/{change['new_path']}\n{diff_text}"
+            return diff_text
+        if 'new_path' in change and 'old_path' in change:
+            # 构建简单的diff格式
+            diff_content = [f"diff --git a/{change['old_path']} b/{change['new_path']}"]
+            if change.get('new_file'):
+                diff_content.append("new file mode 100644")
+            elif change.get('deleted_file'):
+                diff_content.append("deleted file mode 100644")
+            diff_content.append(f"--- a/{change['old_path']}")
+            diff_content.append(f"+++ b/{change['new_path']}")
+            return "\n".join(diff_content)
+    elif isinstance(change, str):
+        # 如果已经是字符串格式，直接使用
+        return change
+    return None
+
+
+def change_tokens(change, file_diff: str = None) -> int:
+    """单个文件变更（含 diff 头）的 token 数，优先使用 filter_changes 预先计算的值"""
+    if isinstance(change, dict) and 'tokens' in change:
+        return change['tokens'] + DIFF_HEADER_TOKENS
+    if file_diff is None:
+        file_diff = change_to_diff(change) or ''
+    return count_tokens(file_diff)
+
+
+@dataclass(frozen=True)
+class ReviewContext:
+    """
+    单次审查的上下文（不可变）：持有变更列表，diff 文本、token 数、截断结果和语言均在首次访问时计算一次，
+    之后审查、缓存、降级等各阶段直接复用，不再重复拼接、编码和检测。
+    """
+    changes: Tuple = ()
+    commits_text: str = ""
+    review_time: str = None
+    max_tokens: int = 800000
+    # 调用方直接传入的 diff 文本；为空时由 changes 拼接
+    raw_diff: str = None
+
+    @cached_property
+    def file_diffs(self) -> Tuple[str, ...]:
+        """每个文件的 diff 文本，与 changes 一一对应（无法转换的变更为空字符串）"""
+        return tuple(change_to_diff(change) or '' for change in self.changes)
+
+    @cached_property
+    def diff_text(self) -> str:
+        if self.raw_diff is not None:
+            return self.raw_diff
+        return "\n".join(diff for diff in self.file_diffs if diff)
+
+    @cached_property
+    def file_tokens(self) -> Tuple[int, ...]:
+        return tuple(change_tokens(change, diff) for change, diff in zip(self.changes, self.file_diffs))
+
+    @cached_property
+    def _counted(self) -> Tuple[int, str]:
+        """(token 数, 截断到 max_tokens 后的文本)；每个文件都有预先计算的 token 数且未超出预算时不编码全文"""
+        if self.raw_diff is None and self.changes and all(
+                isinstance(change, dict) and 'tokens' in change for change in self.changes):
+            tokens_count = sum(self.file_tokens)
+            if tokens_count <= self.max_tokens:
+                return tokens_count, self.diff_text
+        return count_and_truncate(self.diff_text, self.max_tokens)
+
+    @property
+    def tokens_count(self) -> int:
+        return self._counted[0]
+
+    @property
+    def truncated(self) -> bool:
+        return self.tokens_count > self.max_tokens
+
+    @property
+    def review_text(self) -> str:
+        """实际发送给 LLM 的 diff 文本（超出 max_tokens 时为截断后的文本）"""
+        return self._counted[1]
+
+    @cached_property
+    def language(self) -> str:
+        """在完整 diff 上检测主要编程语言，失败时按 changes 中的文件路径检测"""
+        language = detect_language(self.diff_text)
+        if language == 'default' and self.changes:
+            language = detect_language_from_paths(
+                change.get('new_path') or change.get('old_path')
+                for change in self.changes
+                if isinstance(change, dict) and (change.get('new_path') or change.get('old_path'))
+            )
+        return language
+
+    def subset(self, changes) -> 'ReviewContext':
+        """选取部分文件生成新的上下文，复用已拼接的单文件 diff 和检测到的语言"""
+        file_diffs = {id(change): diff for change, diff in zip(self.changes, self.file_diffs)}
+        context = replace(self, changes=tuple(changes), raw_diff=None)
+        context.__dict__['file_diffs'] = tuple(
+            file_diffs[id(change)] if id(change) in file_diffs else change_to_diff(change) or ''
+            for change in context.changes
+        )
+        context.__dict__['language'] = self.language
+        return context
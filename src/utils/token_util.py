@@ -1,18 +1,50 @@
+import functools
+import os
+from typing import Tuple
+
 import tiktoken
 
+# 近似模式的采样长度（字符）：用文本开头的样本估算每个 token 的平均字符数
+APPROXIMATE_SAMPLE_CHARS = 65536
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(encoding_name: str = "cl100k_base") -> tiktoken.Encoding:
+    """获取编码器（进程内缓存，只加载一次）"""
+    return tiktoken.get_encoding(encoding_name)
+
+
+def _encode(text: str, encoding_name: str) -> list:
+    # diff 中可能包含 <|endoftext|> 等特殊 token 文本，按普通文本处理
+    return get_encoding(encoding_name).encode(text, disallowed_special=())
+
 
-def count_tokens(text: str) -> int:
+def _use_approximate(text: str, approximate: bool = None) -> bool:
+    if approximate is not None:
+        return approximate
+    return len(text) > int(os.getenv("TOKEN_APPROXIMATE_THRESHOLD", 2000000))
+
+
+def _chars_per_token(text: str, encoding_name: str) -> float:
+    sample = text[:APPROXIMATE_SAMPLE_CHARS]
+    return len(sample) / max(1, len(_encode(sample, encoding_name)))
+
+
+def count_tokens(text: str, encoding_name: str = "cl100k_base", approximate: bool = None) -> int:
     """
     计算文本的 token 数量。
 
     Args:
         text (str): 输入文本。
+        encoding_name (str): 使用的编码器名称，默认为 "cl100k_base"（适用于 OpenAI GPT 系列）。
+        approximate (bool): 是否使用近似模式，默认超过 TOKEN_APPROXIMATE_THRESHOLD 个字符时自动启用。
 
     Returns:
         int: token 数量。
     """
-    encoding = tiktoken.get_encoding("cl100k_base")  # 适用于 OpenAI GPT 系列
-    return len(encoding.encode(text))
+    if _use_approximate(text, approximate):
+        return int(len(text) / _chars_per_token(text, encoding_name))
+    return len(_encode(text, encoding_name))
 
 
 def truncate_text_by_tokens(text: str, max_tokens: int, encoding_name: str = "cl100k_base") -> str:
@@ -27,21 +59,53 @@ def truncate_text_by_tokens(text: str, max_tokens: int, encoding_name: str = "cl
     Returns:
         str: 截断后的文本。
     """
-    # 获取编码器
-    encoding = tiktoken.get_encoding(encoding_name)
+    return count_and_truncate(text, max_tokens, encoding_name)[1]
+
+
+def count_and_truncate(text: str, max_tokens: int, encoding_name: str = "cl100k_base",
+                       approximate: bool = None) -> Tuple[int, str]:
+    """
+    只编码一次，同时返回原始文本的 token 数量和截断到 max_tokens 后的文本。
 
-    # 将文本编码为 tokens
-    tokens = encoding.encode(text)
+    近似模式（适用于数 MB 的 diff）不编码全文：按样本估算每个 token 的平均字符数，
+    据此估算 token 数量，并在对应的字符位置（尽量在行边界）截断。
 
-    # 如果 tokens 数量超过最大限制，则截断
-    if len(tokens) > max_tokens:
-        truncated_tokens = tokens[:max_tokens]
-        truncated_text = encoding.decode(truncated_tokens)
-        return truncated_text
+    Args:
+        text (str): 原始文本。
+        max_tokens (int): 最大 token 数量。
+        encoding_name (str): 使用的编码器名称，默认为 "cl100k_base"。
+        approximate (bool): 是否使用近似模式，默认超过 TOKEN_APPROXIMATE_THRESHOLD 个字符时自动启用。
+
+    Returns:
+        Tuple[int, str]: (原始文本的 token 数量, 截断后的文本)。
+    """
+    if _use_approximate(text, approximate):
+        chars_per_token = _chars_per_token(text, encoding_name)
+        tokens_count = int(len(text) / chars_per_token)
+        if tokens_count <= max_tokens:
+            return tokens_count, text
+        max_chars = int(max_tokens * chars_per_token)
+        line_end = text.rfind('\n', 0, max_chars)
+        return tokens_count, text[:line_end if line_end > 0 else max_chars]
+
+    tokens = _encode(text, encoding_name)
+    if len(tokens) <= max_tokens:
+        return len(tokens), text
+    return len(tokens), get_encoding(encoding_name).decode(tokens[:max_tokens])
 
-    return text
 
 if __name__ == '__main__':
+    import time
+
     text = "Hello, world! This is a test text for token counting."
     print(count_tokens(text))  # 输出：11
-    print(truncate_text_by_tokens(text, 5))  # 输出："Hello, world!"
\ No newline at end of file
+    print(truncate_text_by_tokens(text, 5))  # 输出："Hello, world!"
+    print(count_and_truncate(text, 5))  # 输出：(11, "Hello, world!")
+
+    # 对比精确模式与近似模式在大 diff 上的耗时
+    big_diff = "\n".join(f"+    value_{i} = compute(value_{i - 1}, '{i}')  # line {i}" for i in range(200000))
+    for mode in (False, True):
+        start = time.perf_counter()
+        tokens_count, truncated = count_and_truncate(big_diff, 100000, approximate=mode)
+        print(f"approximate={mode}: tokens={tokens_count}, truncated_chars={len(truncated)}, "
+              f"cost={time.perf_counter() - start:.3f}s")